@@ -1,19 +1,96 @@
-from typing import Any, Dict, List, Tuple
+import re
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
 from transformers import PreTrainedTokenizerBase
-from model_manager import generate_text
+from model_manager import MAX_INPUT_TOKENS, NEW_TOKENS, CancellationToken, CascadeStage, generate_text, generate_batch, generate_batch_scored
+from prefilter import DEFAULT_THRESHOLD, select_requirement_chunks
+from results import CriterionEvaluation, Screening, Status, evaluation_reason, format_evaluation, parse_evaluation
 from bs4 import BeautifulSoup
 
-def summarize_rfp(model: Any, tokenizer: PreTrainedTokenizerBase, rfp_chunks: List[str]) -> str:
+# Bump when a prompt changes, so results cached from the old wording are not reused
+PROMPT_VERSION = 1
+SECTION_LABEL = "[Section {}]"
+# Every packed section gets the output budget of an unpacked prompt; this caps the tokens one packed call generates
+MAX_PACKED_NEW_TOKENS = 512
+MAX_PACKED_SECTIONS = MAX_PACKED_NEW_TOKENS // NEW_TOKENS
+_SECTION_MARKER = re.compile(r"\[Section (\d+)\]")
+
+SUMMARY_PACKED_PROMPT = """Summarize each of the following sections of a Request for Proposal (RFP) separately. Start each summary with the label of its section.
+
+{sections}
+
+Summaries:
+[Section 1]"""
+
+CRITERIA_PACKED_PROMPT = """Extract key eligibility requirements from each of the following RFP sections. For each, provide:
+1. Description
+2. Importance (Critical, Important, Nice-to-have)
+List the requirements of each section under the label of its section.
+
+{sections}
+
+Eligibility Criteria:
+[Section 1]"""
+
+def pack_sizes(sizes: List[int], budget: int, max_items: int = MAX_PACKED_SECTIONS) -> List[List[int]]:
+    # Next-fit keeps chunks adjacent and in order, and for an ordered sequence it needs the fewest prompts; oversized chunks go alone
+    groups, used = [], 0
+    for i, size in enumerate(sizes):
+        if groups and used + size <= budget and len(groups[-1]) < max_items:
+            groups[-1].append(i); used += size
+        else:
+            groups.append([i]); used = size
+    return groups
+
+def pack_chunks(tokenizer: PreTrainedTokenizerBase, chunks: List[str], template: str) -> List[List[int]]:
+    # Every prompt carries the instructions once, so packing more chunks per prompt saves their tokens too
+    count = lambda text: len(tokenizer(text, add_special_tokens=False)["input_ids"])
+    label_tokens = count("\n\n" + SECTION_LABEL.format(len(chunks)) + "\n")
+    return pack_sizes([count(chunk) + label_tokens for chunk in chunks], MAX_INPUT_TOKENS - count(template.format(sections="")))
+
+def build_packed_prompt(template: str, chunks: List[str]) -> str:
+    return template.format(sections="\n\n".join(f"{SECTION_LABEL.format(i + 1)}\n{chunk}" for i, chunk in enumerate(chunks)))
+
+def split_sections(text: str, count: int) -> List[str]:
+    # The prompt opens the answer with the first label; text under an unknown label stays with the section before it
+    parts = [[] for _ in range(count)]
+    current, position = 0, 0
+    for match in _SECTION_MARKER.finditer(text):
+        parts[current].append(text[position:match.start()])
+        n = int(match.group(1)) - 1
+        if 0 <= n < count: current = n
+        position = match.end()
+    parts[current].append(text[position:])
+    return ["".join(part).strip() for part in parts]
+
+def summarize_rfp(model: Any, tokenizer: PreTrainedTokenizerBase, rfp_chunks: List[str], cancel_token: Optional[CancellationToken] = None, progress: Optional[Callable[[int, int], None]] = None) -> str:
+    # Past the deadline, the chunks summarized so far make up a partial summary
     chunk_summaries = []
-    for chunk in rfp_chunks:
-        prompt = f"""Summarize the following section of a Request for Proposal (RFP):
+    done = 0
+    for group in pack_chunks(tokenizer, rfp_chunks, SUMMARY_PACKED_PROMPT):
+        if cancel_token is not None and cancel_token.check(): break
+        chunk_summaries.extend(s for s in summarize_chunks(model, tokenizer, [rfp_chunks[i] for i in group], cancel_token) if s)
+        done += len(group)
+        if progress is not None: progress(done, len(rfp_chunks))
+    return merge_summaries(model, tokenizer, chunk_summaries, cancel_token)
+
+def summarize_chunks(model: Any, tokenizer: PreTrainedTokenizerBase, chunks: List[str], cancel_token: Optional[CancellationToken] = None) -> List[str]:
+    if len(chunks) == 1:
+        return [summarize_chunk(model, tokenizer, chunks[0], cancel_token)]
+    text = generate_text(model, tokenizer, build_packed_prompt(SUMMARY_PACKED_PROMPT, chunks), max_length=250 * len(chunks), temperature=0.3, cancel_token=cancel_token, max_new_tokens=NEW_TOKENS * len(chunks))
+    return split_sections(text, len(chunks))
+
+def summarize_chunk(model: Any, tokenizer: PreTrainedTokenizerBase, chunk: str, cancel_token: Optional[CancellationToken] = None) -> str:
+    prompt = f"""Summarize the following section of a Request for Proposal (RFP):
 
 {chunk}
 
 Summary:"""
-        summary = generate_text(model, tokenizer, prompt, max_length=250, temperature=0.3)
-        chunk_summaries.append(summary)
-    
+    return generate_text(model, tokenizer, prompt, max_length=250, temperature=0.3, cancel_token=cancel_token)
+
+def merge_summaries(model: Any, tokenizer: PreTrainedTokenizerBase, chunk_summaries: List[str], cancel_token: Optional[CancellationToken] = None) -> str:
+    if cancel_token is not None and cancel_token.check() and chunk_summaries:
+        return "\n\n".join(chunk_summaries)
     if len(chunk_summaries) > 1:
         combined = "\n\n".join(chunk_summaries)
         meta_prompt = f"""Below are summaries of RFP sections. Create a concise overall summary (300-500 words):
@@ -21,16 +98,34 @@ Summary:"""
 {combined}
 
 Overall Summary:"""
-        return generate_text(model, tokenizer, meta_prompt, max_length=600, temperature=0.3)
+        return generate_text(model, tokenizer, meta_prompt, max_length=600, temperature=0.3, cancel_token=cancel_token)
     elif chunk_summaries:
         return chunk_summaries[0]
     else:
         return "No RFP content provided."
 
-def extract_eligibility_criteria(model: Any, tokenizer: PreTrainedTokenizerBase, rfp_chunks: List[str]) -> List[Dict[str, str]]:
+def extract_eligibility_criteria(model: Any, tokenizer: PreTrainedTokenizerBase, rfp_chunks: List[str], min_score: Optional[float] = DEFAULT_THRESHOLD, top_n: Optional[int] = None, cancel_token: Optional[CancellationToken] = None, progress: Optional[Callable[[int, int], None]] = None) -> List[Dict[str, str]]:
+    # Boilerplate, tables of contents and appendices without requirement language never reach the model
     all_criteria = []
-    for chunk in rfp_chunks:
-        prompt = f"""Extract key eligibility requirements from the following RFP section. For each, provide:
+    selected = select_requirement_chunks(rfp_chunks, threshold=min_score, top_n=top_n)
+    done = 0
+    for group in pack_chunks(tokenizer, selected, CRITERIA_PACKED_PROMPT):
+        if cancel_token is not None and cancel_token.check(): break
+        for criteria in extract_chunks_criteria(model, tokenizer, [selected[i] for i in group], cancel_token):
+            all_criteria.extend(criteria)
+        done += len(group)
+        if progress is not None: progress(done, len(selected))
+    return deduplicate_criteria(all_criteria)
+
+def extract_chunks_criteria(model: Any, tokenizer: PreTrainedTokenizerBase, chunks: List[str], cancel_token: Optional[CancellationToken] = None) -> List[List[Dict[str, str]]]:
+    # Criteria of each chunk, in chunk order, so they can be attributed to their source section
+    if len(chunks) == 1:
+        return [extract_chunk_criteria(model, tokenizer, chunks[0], cancel_token)]
+    text = generate_text(model, tokenizer, build_packed_prompt(CRITERIA_PACKED_PROMPT, chunks), max_length=600 * len(chunks), temperature=0.3, cancel_token=cancel_token, max_new_tokens=NEW_TOKENS * len(chunks))
+    return [parse_criteria_text(section) for section in split_sections(text, len(chunks))]
+
+def extract_chunk_criteria(model: Any, tokenizer: PreTrainedTokenizerBase, chunk: str, cancel_token: Optional[CancellationToken] = None) -> List[Dict[str, str]]:
+    prompt = f"""Extract key eligibility requirements from the following RFP section. For each, provide:
 1. Description
 2. Importance (Critical, Important, Nice-to-have)
 
@@ -38,9 +133,8 @@ RFP Section:
 {chunk}
 
 Eligibility Criteria:"""
-        text = generate_text(model, tokenizer, prompt, max_length=600, temperature=0.3)
-        all_criteria.extend(parse_criteria_text(text))
-    return deduplicate_criteria(all_criteria)
+    text = generate_text(model, tokenizer, prompt, max_length=600, temperature=0.3, cancel_token=cancel_token)
+    return parse_criteria_text(text)
 
 def parse_criteria_text(text: str) -> List[Dict[str, str]]:
     lines = text.split('\n')
@@ -97,10 +191,10 @@ def similarity(a: str, b: str) -> float:
     w1, w2 = set(a.split()), set(b.split())
     return len(w1 & w2) / max(len(w1), len(w2))
 
-def evaluate_company_eligibility(model: Any, tokenizer: PreTrainedTokenizerBase, criteria: List[Dict[str, str]], company_chunks: List[str]) -> str:
+def build_evaluation_prompt(criteria: List[Dict[str, str]], company_chunks: List[str]) -> str:
     criteria_text = "\n".join(f"{i+1}. {c['description']} - {c['importance']}" for i, c in enumerate(criteria))
     company_text = "\n\n".join(company_chunks)
-    prompt = f"""Evaluate if the company meets these RFP criteria. Be extremely strict.
+    return f"""Evaluate if the company meets these RFP criteria. Be extremely strict.
 
 Mark:
 - FULLY MEETS: Only if clear, explicit evidence exists
@@ -113,13 +207,119 @@ Company Profile:
 {company_text}
 
 Evaluation (each criterion individually):"""
-    return generate_text(model, tokenizer, prompt, max_length=1024, temperature=0.3)
+
+def evaluate_company_eligibility(model: Any, tokenizer: PreTrainedTokenizerBase, criteria: List[Dict[str, str]], company_chunks: List[str], cancel_token: Optional[CancellationToken] = None) -> str:
+    prompt = build_evaluation_prompt(criteria, company_chunks)
+    return generate_text(model, tokenizer, prompt, max_length=1024, temperature=0.3, cancel_token=cancel_token)
+
+def evaluate_companies_eligibility(model: Any, tokenizer: PreTrainedTokenizerBase, criteria: List[Dict[str, str]], company_profiles: Dict[str, List[str]], batch_size: int = 8, cancel_token: Optional[CancellationToken] = None) -> Dict[str, str]:
+    names = list(company_profiles)
+    prompts = [build_evaluation_prompt(criteria, company_profiles[name]) for name in names]
+    evaluations = generate_batch(model, tokenizer, prompts, max_length=1024, temperature=0.3, batch_size=batch_size, cancel_token=cancel_token)
+    return dict(zip(names, evaluations))
+
+def evaluate_open_criteria(model: Any, tokenizer: PreTrainedTokenizerBase, criteria: List[Dict[str, str]], company_profiles: Dict[str, List[str]], open_criteria: Dict[str, List[int]], batch_size: int = 8, cancel_token: Optional[CancellationToken] = None) -> Dict[str, Dict[int, CriterionEvaluation]]:
+    # Each profile is asked only about the criteria nothing else could answer, all profiles in one batched pass
+    names = [name for name, indices in open_criteria.items() if indices]
+    prompts = [build_evaluation_prompt([criteria[i] for i in open_criteria[name]], company_profiles[name]) for name in names]
+    outputs = generate_batch(model, tokenizer, prompts, max_length=1024, temperature=0.3, batch_size=batch_size, cancel_token=cancel_token)
+    judged = {name: {} for name in open_criteria}
+    for name, output in zip(names, outputs):
+        indices = open_criteria[name]
+        for i, item in zip(indices, parse_evaluation(output, len(indices)).items):
+            judged[name][i] = CriterionEvaluation(item.status, evaluation_reason(item.text))
+    return judged
+
+def line_confidences(scored_lines: List[Tuple[str, float]], criteria_count: int) -> List[float]:
+    # A criterion is as confident as its least confident numbered line; unanswered criteria get 0
+    confidences = [None] * criteria_count
+    for line, confidence in scored_lines:
+        digits = len(line) - len(line.lstrip("0123456789"))
+        n = int(line[:digits]) - 1 if digits else -1
+        if 0 <= n < criteria_count:
+            confidences[n] = confidence if confidences[n] is None else min(confidences[n], confidence)
+    return [c or 0.0 for c in confidences]
+
+def evaluate_with_cascade(stages: List[CascadeStage], criteria: List[Dict[str, str]], company_profiles: Dict[str, List[str]], batch_size: int = 8, cancel_token: Optional[CancellationToken] = None) -> Tuple[Dict[str, str], Dict[str, Any]]:
+    # Each stage judges what earlier stages were unsure about; the last stage's answer is final whatever its confidence
+    open_criteria = {name: list(range(len(criteria))) for name in company_profiles}
+    judged = {name: {} for name in company_profiles}
+    stage_stats = []
+    for depth, stage in enumerate(stages):
+        names = [name for name, indices in open_criteria.items() if indices]
+        if not names or (cancel_token is not None and cancel_token.check()): break
+        last = depth == len(stages) - 1
+        start = time.perf_counter()
+        prompts = [build_evaluation_prompt([criteria[i] for i in open_criteria[name]], company_profiles[name]) for name in names]
+        outputs = generate_batch_scored(stage.model, stage.tokenizer, prompts, batch_size=batch_size, cancel_token=cancel_token)
+        evaluated = accepted = 0
+        for name, scored_lines in zip(names, outputs):
+            indices = open_criteria[name]
+            items = parse_evaluation("\n".join(line for line, _ in scored_lines), len(indices)).items
+            escalated = []
+            for i, item, confidence in zip(indices, items, line_confidences(scored_lines, len(indices))):
+                evaluated += 1
+                if last or (item.status != Status.UNCLEAR and confidence >= stage.threshold):
+                    judged[name][i] = CriterionEvaluation(item.status, evaluation_reason(item.text))
+                    accepted += 1
+                else:
+                    escalated.append(i)
+            open_criteria[name] = escalated
+        stage_stats.append({"name": stage.name or f"stage {depth + 1}", "threshold": stage.threshold, "evaluated": evaluated, "accepted": accepted, "seconds": time.perf_counter() - start})
+
+    evaluations = {name: format_evaluation(criteria, [judged[name].get(i, CriterionEvaluation()) for i in range(len(criteria))]) for name in company_profiles}
+    total = len(criteria) * len(company_profiles)
+    escalated = stage_stats[0]["evaluated"] - stage_stats[0]["accepted"] if stage_stats else 0
+    seconds = sum(s["seconds"] for s in stage_stats)
+    # What sending everything to the last stage would have cost, extrapolated from its per-criterion latency
+    final = stage_stats[-1] if len(stage_stats) == len(stages) and len(stages) > 1 else None
+    seconds_saved = final["seconds"] / final["evaluated"] * total - seconds if final and final["evaluated"] else None
+    stats = {"criteria": total, "stages": stage_stats, "escalated": escalated, "escalation_rate": escalated / total if total else 0.0, "seconds": seconds, "seconds_saved": seconds_saved}
+    return evaluations, stats
+
+IMPORTANCE_ORDER = {"Critical": 0, "Important": 1, "Nice-to-have": 2}
+
+def screening_groups(criteria: List[Dict[str, str]], group_size: int = 4) -> List[List[int]]:
+    # Most important first; a group never mixes importance levels, so all critical criteria are judged before any other
+    order = sorted(range(len(criteria)), key=lambda i: IMPORTANCE_ORDER.get(criteria[i]["importance"], 1))
+    groups = []
+    for i in order:
+        if groups and len(groups[-1]) < group_size and criteria[groups[-1][0]]["importance"] == criteria[i]["importance"]:
+            groups[-1].append(i)
+        else:
+            groups.append([i])
+    return groups
+
+def screen_companies_eligibility(model: Any, tokenizer: PreTrainedTokenizerBase, criteria: List[Dict[str, str]], company_profiles: Dict[str, List[str]], group_size: int = 4, batch_size: int = 8, cancel_token: Optional[CancellationToken] = None) -> Dict[str, Screening]:
+    # A confirmed critical or important failure makes a company NOT ELIGIBLE whatever the rest says, so its evaluation stops there
+    screenings = {name: Screening([None] * len(criteria)) for name in company_profiles}
+    for group in screening_groups(criteria, group_size):
+        active = [name for name, screening in screenings.items() if screening.knockout is None]
+        if not active or (cancel_token is not None and cancel_token.check()): break
+        judged = evaluate_open_criteria(model, tokenizer, criteria, company_profiles, {name: group for name in active}, batch_size, cancel_token)
+        for name in active:
+            screening = screenings[name]
+            for i in group:
+                screening.items[i] = judged[name].get(i, CriterionEvaluation())
+                if screening.knockout is None and screening.items[i].status == Status.DOES_NOT_MEET and criteria[i]["importance"] in ("Critical", "Important"):
+                    screening.knockout = i
+    return screenings
+
+def complete_screenings(model: Any, tokenizer: PreTrainedTokenizerBase, criteria: List[Dict[str, str]], company_profiles: Dict[str, List[str]], screenings: Dict[str, Screening], batch_size: int = 8, cancel_token: Optional[CancellationToken] = None) -> Dict[str, Screening]:
+    open_criteria = {name: [i for i, item in enumerate(screening.items) if item is None] for name, screening in screenings.items()}
+    judged = evaluate_open_criteria(model, tokenizer, criteria, company_profiles, open_criteria, batch_size, cancel_token)
+    for name, screening in screenings.items():
+        for i, item in judged[name].items():
+            screening.items[i] = item
+    return screenings
+
+def screening_evaluation(criteria: List[Dict[str, str]], screening: Screening) -> str:
+    skipped = CriterionEvaluation(Status.UNCLEAR, "not evaluated, screening stopped at a knockout")
+    return format_evaluation(criteria, [item if item is not None else skipped for item in screening.items])
 
 def determine_verdict(model: Any, tokenizer: PreTrainedTokenizerBase, criteria: List[Dict[str, str]], evaluation: str) -> Dict[str, str]:
-    eval_lower = evaluation.lower()
-    critical_fails = sum(1 for line in eval_lower.split('\n') if "critical" in line and "does not meet" in line)
-    important_fails = sum(1 for line in eval_lower.split('\n') if "important" in line and "does not meet" in line)
-    fully_met = sum(1 for line in eval_lower.split('\n') if "fully meets" in line)
+    parsed = parse_evaluation(evaluation, len(criteria))
+    critical_fails, important_fails, fully_met = parsed.critical_fails, parsed.important_fails, parsed.fully_met
     
     if critical_fails > 0:
         return {
@@ -141,3 +341,12 @@ def determine_verdict(model: Any, tokenizer: PreTrainedTokenizerBase, criteria:
             "decision": "ELIGIBLE",
             "reasoning": "Company fully satisfies all eligibility requirements with clear evidence."
         }
+
+def determine_verdicts(model: Any, tokenizer: PreTrainedTokenizerBase, criteria: List[Dict[str, str]], evaluations: Dict[str, str]) -> Dict[str, Dict[str, str]]:
+    return {name: determine_verdict(model, tokenizer, criteria, evaluation) for name, evaluation in evaluations.items()}
+
+def parse_criterion_statuses(criteria: List[Dict[str, str]], evaluation: str) -> List[str]:
+    return [item.status.value for item in parse_evaluation(evaluation, len(criteria)).items]
+
+def build_criteria_matrix(criteria: List[Dict[str, str]], evaluations: Dict[str, str]) -> Dict[str, List[str]]:
+    return {name: parse_criterion_statuses(criteria, evaluation) for name, evaluation in evaluations.items()}
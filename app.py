@@ -1,10 +1,22 @@
 import streamlit as st
 import tempfile
 import os
+import shutil
 import sys
-from document_processor import parse_document, chunk_text
-from utils import format_eligibility_criteria, format_verdict, get_app_info
-from report_generator import generate_report
+from contextlib import nullcontext
+from typing import Any, Callable, ContextManager, Dict, List, Optional, Tuple
+from document_processor import iter_document_chunks, iter_package_chunks, parse_documents, count_pages
+from utils import format_eligibility_criteria, format_verdict, format_criteria_matrix, get_app_info
+from report_generator import generate_report, generate_multi_profile_report
+from incremental import ChunkResultStore, reanalyze_rfp, result_key
+from governor import ArtifactStore, ResourceGovernor, estimate_analysis_cost
+from catalog import CriteriaCatalog, evaluate_with_catalog
+from capability import CapabilityIndex, evaluate_with_rules
+from archive import AnalysisArchive
+from cost_model import CostModel, ProgressTracker, StageEstimate, format_duration
+from autotune import RuntimeProfile, load_profile
+from prefilter import select_requirement_chunks
+from profiler import PipelineProfiler, begin_stage
 
 # Run the Streamlit app with: streamlit run app.py
 import os
@@ -14,7 +26,14 @@ from analyzer import (
     summarize_rfp,
     extract_eligibility_criteria,
     evaluate_company_eligibility,
-    determine_verdict
+    evaluate_companies_eligibility,
+    determine_verdict,
+    determine_verdicts,
+    build_criteria_matrix,
+    screen_companies_eligibility,
+    complete_screenings,
+    screening_evaluation,
+    evaluate_with_cascade
 )
 
 # Set page configuration
@@ -25,20 +44,89 @@ st.set_page_config(
 )
 
 # Initialize model and tokenizer
-from model_manager import load_model, load_tokenizer
+from model_manager import load_model, load_tokenizer, warm_up_model, measure_token_rates, ContinuousBatchingScheduler, CascadeStage, CancellationToken, GenerationCancelled
+from inference_client import InferenceClient
 
+@st.cache_resource
+def get_warm_model(model_name: str) -> Tuple[Any, Dict[str, float]]:
+    # Loaded and warmed up once per process, so the first analysis of the day isn't the slow one
+    model = load_model(model_name)
+    return model, warm_up_model(model, load_tokenizer(model_name))
+
+@st.cache_resource
+def get_shared_scheduler(model_name: str) -> ContinuousBatchingScheduler:
+    # One model per process; concurrent sessions join the same decode batch
+    return ContinuousBatchingScheduler(get_warm_model(model_name)[0], load_tokenizer(model_name)).start()
+
+@st.cache_resource
+def get_cascade_stages(model_name: str, escalation_model_name: str, threshold: float) -> List[CascadeStage]:
+    # The session's model answers first; the larger model only sees what it was unsure about
+    return [
+        CascadeStage(get_warm_model(model_name)[0], load_tokenizer(model_name), threshold, model_name),
+        CascadeStage(get_warm_model(escalation_model_name)[0], load_tokenizer(escalation_model_name), name=escalation_model_name)
+    ]
+
+@st.cache_resource
+def get_catalog() -> CriteriaCatalog:
+    return CriteriaCatalog()
+
+@st.cache_resource
+def get_capability_index() -> CapabilityIndex:
+    return CapabilityIndex()
+
+@st.cache_resource
+def get_archive() -> AnalysisArchive:
+    return AnalysisArchive()
+
+@st.cache_resource
+def get_cost_model(model_name: str, measure: bool) -> CostModel:
+    # Token rates are measured once per machine and model, then refined by every run
+    cost_model = CostModel(model_name)
+    if measure and not cost_model.measured:
+        cost_model.set_rates(measure_token_rates(get_warm_model(model_name)[0], load_tokenizer(model_name)))
+    return cost_model
+
+@st.cache_resource
+def get_runtime_profile(model_name: str) -> Optional[RuntimeProfile]:
+    # Written by load_model when it first tuned the model on this machine
+    return load_profile(model_name)
+
+@st.cache_resource
+def get_governor() -> ResourceGovernor:
+    # Budgets are per process, shared by every session
+    return ResourceGovernor()
+
+model_name = "facebook/opt-125m"  # Using smaller, open-source model
 if 'model' not in st.session_state:
     with st.spinner("Loading model..."):
-        model_name = "facebook/opt-125m"  # Using smaller, open-source model
-        st.session_state.model = load_model(model_name)
+        server_url = os.environ.get("RFP_INFERENCE_SERVER")
+        if server_url:
+            # Share the warm model of the local inference server instead of loading a copy per session
+            st.session_state.model = InferenceClient(server_url)
+        elif os.environ.get("RFP_CONTINUOUS_BATCHING"):
+            st.session_state.model = get_shared_scheduler(model_name)
+            st.session_state.warmup = get_warm_model(model_name)[1]
+        else:
+            st.session_state.model, st.session_state.warmup = get_warm_model(model_name)
         st.session_state.tokenizer = load_tokenizer(model_name)
         st.session_state.model_loaded = True
 
+# Chunk and batch sizes follow this machine's tuned profile, when there is one
+runtime_profile = get_runtime_profile(model_name)
+chunk_size = runtime_profile.chunk_size if runtime_profile else 1000
+batch_size = runtime_profile.batch_size if runtime_profile else 8
+
 # Initialize session state variables if they don't exist
-if 'rfp_text' not in st.session_state:
-    st.session_state.rfp_text = None
-if 'company_text' not in st.session_state:
-    st.session_state.company_text = None
+if 'rfp_chunks' not in st.session_state:
+    st.session_state.rfp_chunks = None
+if 'rfp_name' not in st.session_state:
+    st.session_state.rfp_name = None
+if 'rfp_pages' not in st.session_state:
+    st.session_state.rfp_pages = 0
+if 'rfp_sources' not in st.session_state:
+    st.session_state.rfp_sources = None
+if 'company_texts' not in st.session_state:
+    st.session_state.company_texts = {}
 if 'summary' not in st.session_state:
     st.session_state.summary = None
 if 'criteria' not in st.session_state:
@@ -47,6 +135,19 @@ if 'evaluation' not in st.session_state:
     st.session_state.evaluation = None
 if 'verdict' not in st.session_state:
     st.session_state.verdict = None
+if 'evaluations' not in st.session_state:
+    st.session_state.evaluations = None
+if 'verdicts' not in st.session_state:
+    st.session_state.verdicts = None
+if 'matrix' not in st.session_state:
+    st.session_state.matrix = None
+if 'changes' not in st.session_state:
+    st.session_state.changes = None
+if 'chunk_store' not in st.session_state:
+    st.session_state.chunk_store = ChunkResultStore()
+if 'artifacts' not in st.session_state:
+    # Large RFP chunks, profile texts and reports live on disk; session state keeps handles
+    st.session_state.artifacts = ArtifactStore()
 if 'model_loaded' not in st.session_state:
     st.session_state.model_loaded = False
 if 'model' not in st.session_state:
@@ -55,6 +156,133 @@ if 'tokenizer' not in st.session_state:
     st.session_state.tokenizer = None
 if 'report_html' not in st.session_state:
     st.session_state.report_html = None
+if 'cancel_token' not in st.session_state:
+    st.session_state.cancel_token = None
+# Every interaction reruns the script, and with Streamlit's fast reruns (the default) the
+# new run starts while the previous one may still be generating: abandon that analysis
+if st.session_state.cancel_token is not None:
+    st.session_state.cancel_token.cancel()
+if 'partial' not in st.session_state:
+    st.session_state.partial = False
+if 'evaluation_stats' not in st.session_state:
+    st.session_state.evaluation_stats = None
+if 'screenings' not in st.session_state:
+    st.session_state.screenings = None
+if 'profiler' not in st.session_state:
+    st.session_state.profiler = None
+if 'profile_files' not in st.session_state:
+    st.session_state.profile_files = None
+
+def profiling_enabled() -> bool:
+    return st.session_state.get("profile_analysis", os.environ.get("RFP_PROFILE", "").lower() in ("1", "true", "yes"))
+
+def profile_session(new_profile: bool = False) -> ContextManager:
+    # Uploads are parsed in one script run and analyzed in a later one, so the analysis continues the upload's profile
+    if not profiling_enabled():
+        return nullcontext()
+    if new_profile or st.session_state.profiler is None:
+        st.session_state.profiler = PipelineProfiler()
+    return st.session_state.profiler.session()
+
+def load_rfp_chunks() -> Optional[List[str]]:
+    return st.session_state.artifacts.load_chunks(st.session_state.rfp_chunks)
+
+def session_closed() -> Callable[[], bool]:
+    # A closed tab never reruns the script, so generation polls whether the session still exists;
+    # the session is looked up here because the poll may run on other threads (e.g. a server request's watcher)
+    try:
+        from streamlit.runtime import Runtime
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+        runtime, session_id = Runtime.instance(), get_script_run_ctx().session_id
+    except Exception:
+        return lambda: False
+    return lambda: not runtime.is_active_session(session_id)
+
+def finish_analysis(verdicts: Optional[Dict[str, Dict[str, str]]] = None) -> None:
+    """Determine the verdict(s), unless archived ones are given, and build the report from the evaluations in session state."""
+    st.session_state.artifacts.discard(st.session_state.report_html)
+    begin_stage("verdict")
+    if st.session_state.evaluations is None:
+        # 4. Determine final verdict
+        st.session_state.verdict = next(iter(verdicts.values())) if verdicts else determine_verdict(
+            st.session_state.model,
+            st.session_state.tokenizer,
+            st.session_state.criteria,
+            st.session_state.evaluation
+        )
+        
+        # 5. Generate report HTML
+        begin_stage("report")
+        st.session_state.report_html = st.session_state.artifacts.spill(generate_report(
+            st.session_state.summary,
+            st.session_state.criteria,
+            st.session_state.evaluation,
+            st.session_state.verdict,
+            st.session_state.changes
+        ))
+    else:
+        # 4. Determine a verdict per company
+        st.session_state.verdicts = verdicts or determine_verdicts(
+            st.session_state.model,
+            st.session_state.tokenizer,
+            st.session_state.criteria,
+            st.session_state.evaluations
+        )
+        begin_stage("report")
+        st.session_state.matrix = build_criteria_matrix(
+            st.session_state.criteria,
+            st.session_state.evaluations
+        )
+        
+        # 5. Generate report HTML
+        st.session_state.report_html = st.session_state.artifacts.spill(generate_multi_profile_report(
+            st.session_state.summary,
+            st.session_state.criteria,
+            st.session_state.matrix,
+            st.session_state.verdicts,
+            st.session_state.changes
+        ))
+
+def archive_analysis(company_profiles: Dict[str, List[str]], mode: str, rfp_id: str = "") -> None:
+    """Store the analysis in session state in the archive, so it can be searched and reused."""
+    if st.session_state.evaluations is None:
+        name = next(iter(company_profiles))
+        evaluations = {name: st.session_state.evaluation}
+        verdicts = {name: st.session_state.verdict}
+    else:
+        evaluations = st.session_state.evaluations
+        verdicts = st.session_state.verdicts
+    get_archive().save_analysis(
+        st.session_state.rfp_name,
+        load_rfp_chunks(),
+        st.session_state.summary,
+        st.session_state.criteria,
+        company_profiles,
+        evaluations,
+        verdicts,
+        model_name,
+        mode,
+        rfp_id=rfp_id or None
+    )
+
+def restore_analysis(analysis: Dict[str, Any]) -> None:
+    """Load an archived analysis into session state and rebuild its report."""
+    st.session_state.summary = analysis["summary"]
+    st.session_state.criteria = analysis["criteria"]
+    st.session_state.changes = None
+    st.session_state.evaluation_stats = None
+    st.session_state.screenings = None
+    st.session_state.partial = False
+    if len(analysis["evaluations"]) == 1:
+        st.session_state.evaluation = next(iter(analysis["evaluations"].values()))
+        st.session_state.evaluations = None
+        st.session_state.verdicts = None
+        st.session_state.matrix = None
+    else:
+        st.session_state.evaluation = None
+        st.session_state.verdict = None
+        st.session_state.evaluations = analysis["evaluations"]
+    finish_analysis(analysis["verdicts"])
 
 # App title and introduction
 st.title("RFP Eligibility Analyzer")
@@ -75,7 +303,7 @@ with st.sidebar:
     
     #### How it works:
     1. Upload your RFP document
-    2. Upload your company profile
+    2. Upload one or more company profiles
     3. Click "Analyze Documents"
     4. Review results in the Analysis tab
     5. Download a detailed report
@@ -89,11 +317,18 @@ with st.sidebar:
     # Display app info
     st.code(get_app_info(), language=None)
     
+    if st.session_state.get("warmup"):
+        warmup = st.session_state.warmup
+        st.caption(
+            f"Model warm-up took {warmup['warmup_seconds']:.1f}s: first request "
+            f"{warmup['cold_seconds']:.2f}s cold, {warmup['warm_seconds']:.2f}s warm."
+        )
+    
     # Set model as loaded for demo purposes
     st.session_state.model_loaded = True
 
 # Main content area with tabs
-tab1, tab2, tab3 = st.tabs(["Document Upload", "Analysis", "Report"])
+tab1, tab2, tab3, tab4 = st.tabs(["Document Upload", "Analysis", "Report", "History"])
 
 with tab1:
     st.header("Upload Documents")
@@ -102,128 +337,482 @@ with tab1:
     
     with col1:
         st.subheader("Upload RFP Document")
-        rfp_file = st.file_uploader("Choose an RFP document", type=['pdf', 'docx', 'txt'], key="rfp_upload")
+        rfp_file = st.file_uploader(
+            "Choose an RFP document, or a .zip package with its annexes, forms and addenda",
+            type=['pdf', 'docx', 'txt', 'zip'],
+            key="rfp_upload"
+        )
         
-        if rfp_file:
-            with st.spinner("Processing RFP document..."):
-                # Save uploaded file to a temporary file
+        if rfp_file and rfp_file.name != st.session_state.rfp_name:
+            with st.spinner("Processing RFP document..."), profile_session(new_profile=True):
+                # Stream the upload to a temporary file instead of copying its bytes
                 with tempfile.NamedTemporaryFile(delete=False, suffix=f".{rfp_file.name.split('.')[-1]}") as tmp_file:
-                    tmp_file.write(rfp_file.getvalue())
+                    shutil.copyfileobj(rfp_file, tmp_file)
                     tmp_path = tmp_file.name
                 
                 try:
-                    # Parse the document
-                    rfp_text = parse_document(tmp_path)
-                    st.session_state.rfp_text = rfp_text
-                    st.success(f"✅ RFP document processed: {len(rfp_text)} characters")
+                    # Refuse oversized documents before parsing them
+                    rfp_pages = count_pages(tmp_path)
+                    get_governor().check_pages(rfp_pages)
                     
-                    # Show sample of the text
-                    with st.expander("Preview RFP Text"):
-                        st.text(rfp_text[:1000] + "..." if len(rfp_text) > 1000 else rfp_text)
+                    if rfp_file.name.lower().endswith('.zip'):
+                        # Package members are parsed concurrently and merged in archive order
+                        tagged_chunks = list(iter_package_chunks(tmp_path, max_chunk_size=chunk_size))
+                        rfp_chunks = [chunk for _, chunk in tagged_chunks]
+                        st.session_state.rfp_sources = [source for source, _ in tagged_chunks]
+                    else:
+                        # Parse and chunk the document; text files never exist as one string
+                        rfp_chunks = list(iter_document_chunks(tmp_path, max_chunk_size=chunk_size))
+                        st.session_state.rfp_sources = [rfp_file.name] * len(rfp_chunks)
+                    st.session_state.artifacts.discard(st.session_state.rfp_chunks)
+                    st.session_state.rfp_chunks = st.session_state.artifacts.spill_chunks(rfp_chunks)
+                    st.session_state.rfp_name = rfp_file.name
+                    st.session_state.rfp_pages = rfp_pages
                 except Exception as e:
+                    st.session_state.artifacts.discard(st.session_state.rfp_chunks)
+                    st.session_state.rfp_chunks = None
                     st.error(f"❌ Error processing document: {str(e)}")
                 
                 # Clean up the temporary file
                 os.unlink(tmp_path)
+        elif not rfp_file:
+            st.session_state.artifacts.discard(st.session_state.rfp_chunks)
+            st.session_state.rfp_chunks = None
+            st.session_state.rfp_name = None
+        
+        if st.session_state.rfp_chunks:
+            rfp_chunks = load_rfp_chunks()
+            rfp_length = sum(len(chunk) for chunk in rfp_chunks)
+            sources = list(dict.fromkeys(st.session_state.rfp_sources))
+            st.success(
+                f"✅ RFP document processed: {rfp_length} characters in {len(rfp_chunks)} chunks"
+                + (f" from {len(sources)} files" if len(sources) > 1 else "")
+            )
+            
+            # Show sample of the text
+            with st.expander("Preview RFP Text"):
+                if len(sources) > 1:
+                    st.caption("Files: " + ", ".join(sources))
+                preview = rfp_chunks[0]
+                st.text(preview[:1000] + "..." if rfp_length > 1000 else preview)
     
     with col2:
-        st.subheader("Upload Company Profile")
-        company_file = st.file_uploader("Choose a company profile document", type=['pdf', 'docx', 'txt'], key="company_upload")
-        
-        if company_file:
-            with st.spinner("Processing company profile..."):
-                # Save uploaded file to a temporary file
-                with tempfile.NamedTemporaryFile(delete=False, suffix=f".{company_file.name.split('.')[-1]}") as tmp_file:
-                    tmp_file.write(company_file.getvalue())
-                    tmp_path = tmp_file.name
+        st.subheader("Upload Company Profiles")
+        company_files = st.file_uploader("Choose one or more company profile documents", type=['pdf', 'docx', 'txt'], key="company_upload", accept_multiple_files=True)
+        
+        # Forget profiles that were removed from the uploader
+        uploaded_names = {company_file.name for company_file in company_files}
+        for name in list(st.session_state.company_texts):
+            if name not in uploaded_names:
+                st.session_state.artifacts.discard(st.session_state.company_texts.pop(name))
+        
+        new_files = [company_file for company_file in company_files if company_file.name not in st.session_state.company_texts]
+        if new_files:
+            with st.spinner(f"Processing {len(new_files)} company profile(s)..."):
+                tmp_paths = {}
+                for company_file in new_files:
+                    # Save uploaded file to a temporary file
+                    with tempfile.NamedTemporaryFile(delete=False, suffix=f".{company_file.name.split('.')[-1]}") as tmp_file:
+                        shutil.copyfileobj(company_file, tmp_file)
+                        tmp_paths[company_file.name] = tmp_file.name
                 
                 try:
-                    # Parse the document
-                    company_text = parse_document(tmp_path)
-                    st.session_state.company_text = company_text
-                    st.success(f"✅ Company profile processed: {len(company_text)} characters")
+                    for name, tmp_path in tmp_paths.items():
+                        get_governor().check_pages(count_pages(tmp_path))
                     
-                    # Show sample of the text
-                    with st.expander("Preview Company Profile Text"):
-                        st.text(company_text[:1000] + "..." if len(company_text) > 1000 else company_text)
+                    # Parse all new profiles concurrently
+                    company_texts = parse_documents(list(tmp_paths.values()))
+                    for name, company_text in zip(tmp_paths, company_texts):
+                        st.session_state.company_texts[name] = st.session_state.artifacts.spill(company_text)
                 except Exception as e:
-                    st.error(f"❌ Error processing document: {str(e)}")
+                    st.error(f"❌ Error processing company profiles: {str(e)}")
                 
-                # Clean up the temporary file
-                os.unlink(tmp_path)
+                # Clean up the temporary files
+                for tmp_path in tmp_paths.values():
+                    os.unlink(tmp_path)
+        
+        for name, company_text in st.session_state.company_texts.items():
+            st.success(f"✅ Company profile {name} processed: {len(company_text)} characters")
+            
+            # Show sample of the text
+            with st.expander(f"Preview {name}"):
+                preview = st.session_state.artifacts.load(company_text, limit=1000)
+                st.text(preview + "..." if len(company_text) > 1000 else preview)
+    
+    # Amended RFPs reuse the results of unchanged sections from the previous analysis
+    incremental = st.checkbox("Reuse results from previous versions of this RFP (amendments/addenda)", value=True)
+    rfp_id = st.text_input(
+        "RFP identifier",
+        value=os.path.splitext(rfp_file.name)[0] if rfp_file else "",
+        help="Use the same identifier for every amendment of an RFP to see what changed."
+    )
+    # Recurring requirements are judged once per company profile and reused across RFPs
+    use_catalog = st.checkbox("Reuse evaluations of recurring criteria from earlier RFPs", value=True)
+    use_rules = st.checkbox("Answer experience, headcount, turnover and certification criteria from profile facts", value=True)
+    # Bid/no-bid triage: most companies fail on a knockout criterion, so stop evaluating there
+    fast_screening = st.checkbox("Fast screening: evaluate critical criteria first and stop at the first knockout failure", value=False)
+    # The cascade needs token log-probabilities, so it only runs with a model loaded in this process
+    cascade_model = os.environ.get("RFP_CASCADE_MODEL")
+    use_cascade = st.checkbox(
+        f"Escalate low-confidence judgments to {cascade_model}" if cascade_model else "Escalate low-confidence judgments to a larger model",
+        value=False,
+        disabled=not cascade_model or os.environ.get("RFP_INFERENCE_SERVER") is not None,
+        help="Set RFP_CASCADE_MODEL to the larger model and RFP_CASCADE_THRESHOLD to the confidence below which a judgment is escalated."
+    )
+    # Archived analyses are only reused when made the same way, so name the evaluation path taken below
+    if fast_screening:
+        evaluation_mode = "screening"
+    elif use_cascade:
+        evaluation_mode = f"cascade:{cascade_model}"
+    elif use_catalog:
+        evaluation_mode = "catalog+rules" if use_rules else "catalog"
+    elif use_rules:
+        evaluation_mode = "rules"
+    else:
+        evaluation_mode = "model"
+    # Analyses are archived by document hash, so rerunning the same documents costs nothing
+    reuse_archive = st.checkbox("Reuse the archived analysis if these documents were analyzed before", value=True)
+    # Read back at upload time, so parsing and chunking of the next RFP are profiled too
+    st.checkbox(
+        "Profile the analysis (flamegraph and Chrome trace)",
+        value=os.environ.get("RFP_PROFILE", "").lower() in ("1", "true", "yes"),
+        key="profile_analysis",
+        help="Samples where the time goes, from parsing to the report, and traces model.generate with the torch profiler. The files are offered for download on the Report tab."
+    )
+    time_limit = st.number_input(
+        "Time limit (minutes, 0 for none)",
+        min_value=0.0,
+        value=0.0,
+        step=1.0,
+        help="When the limit is reached, generation stops and the results produced so far are shown."
+    )
+    
+    # Predict each stage from chunk counts, prompt lengths and this machine's measured token rates
+    cost_model = get_cost_model(model_name, os.environ.get("RFP_INFERENCE_SERVER") is None)
+    stage_estimates = []
+    if st.session_state.rfp_chunks and st.session_state.company_texts:
+        pending_chunks = load_rfp_chunks()
+        if incremental and rfp_id:
+            pending_chunks = [c for c in pending_chunks if st.session_state.chunk_store.get_chunk(result_key(c, model_name)) is None]
+        stage_estimates = cost_model.predict_analysis(
+            [len(c) for c in pending_chunks],
+            [len(c) for c in select_requirement_chunks(pending_chunks)],
+            [len(text) for text in st.session_state.company_texts.values()],
+            batch_size=batch_size
+        )
+        if incremental and rfp_id:
+            # Reanalysis interleaves summarizing and extracting packed group by group, then merges
+            summarize, extract, merge, evaluate = stage_estimates
+            stage_estimates = [
+                StageEstimate(
+                    "chunks",
+                    summarize.calls + extract.calls + merge.calls,
+                    summarize.prompt_tokens + extract.prompt_tokens + merge.prompt_tokens,
+                    summarize.new_tokens + extract.new_tokens + merge.new_tokens,
+                    summarize.seconds + extract.seconds + merge.seconds
+                ),
+                evaluate
+            ]
+        st.caption(f"Estimated analysis time: about {format_duration(sum(e.seconds for e in stage_estimates))}.")
     
     # Analyze button
-    if st.button("Analyze Documents", disabled=not (st.session_state.model_loaded and st.session_state.rfp_text and st.session_state.company_text)):
-        with st.spinner("Analyzing documents... This may take several minutes."):
-            try:
-                # Use simple string chunks for the mock functions
-                rfp_chunks = [st.session_state.rfp_text] if st.session_state.rfp_text else []
-                company_chunks = [st.session_state.company_text] if st.session_state.company_text else []
-                
-                # Analysis steps using real functions
-                # 1. Summarize RFP
-                st.session_state.summary = summarize_rfp(
-                    st.session_state.model,
-                    st.session_state.tokenizer,
-                    rfp_chunks
-                )
-                
-                # 2. Extract eligibility criteria
-                st.session_state.criteria = extract_eligibility_criteria(
-                    st.session_state.model,
-                    st.session_state.tokenizer,
-                    rfp_chunks
-                )
-                
-                # 3. Evaluate company against criteria
-                st.session_state.evaluation = evaluate_company_eligibility(
-                    st.session_state.model,
-                    st.session_state.tokenizer,
-                    st.session_state.criteria,
-                    company_chunks
-                )
-                
-                # 4. Determine final verdict
-                st.session_state.verdict = determine_verdict(
-                    st.session_state.model,
-                    st.session_state.tokenizer,
-                    st.session_state.criteria,
-                    st.session_state.evaluation
-                )
-                
-                # 5. Generate report HTML
-                st.session_state.report_html = generate_report(
-                    st.session_state.summary,
-                    st.session_state.criteria,
-                    st.session_state.evaluation,
-                    st.session_state.verdict
-                )
-                
-                st.success("✅ Analysis complete! Switch to the Analysis tab to view results.")
-                
-                # Auto-switch to Analysis tab
-                st.info("Please click on the 'Analysis' tab to view the results.")
-                
-            except Exception as e:
-                st.error(f"❌ Error during analysis: {str(e)}")
+    if st.button("Analyze Documents", disabled=not (st.session_state.model_loaded and st.session_state.rfp_chunks and st.session_state.company_texts)):
+        # The next script run of this session cancels this token
+        cancel_token = CancellationToken(timeout=time_limit * 60 if time_limit else None, poll=session_closed())
+        st.session_state.cancel_token = cancel_token
+        
+        rfp_chunks = load_rfp_chunks()
+        company_profiles = {name: [st.session_state.artifacts.load(text)] for name, text in st.session_state.company_texts.items()}
+        archived = get_archive().find_analysis(rfp_chunks, company_profiles, model_name, evaluation_mode) if reuse_archive else None
+        if archived is not None:
+            restore_analysis(archived)
+            st.success("✅ These documents were analyzed before; loaded the archived results.")
+        else:
+            # Estimate the cost up front and wait for, or refuse, budget held by other sessions
+            estimate = estimate_analysis_cost(
+                st.session_state.rfp_pages,
+                len(rfp_chunks),
+                profiles=len(st.session_state.company_texts),
+                profile_chars=sum(len(text) for text in st.session_state.company_texts.values())
+            )
+            admission = get_governor().decide(estimate)
+            if admission == "queue":
+                st.info("Other analyses are using the available resources; this one will start when they finish.")
+            
+            reservation = None
+            progress_bar = st.progress(0.0, text="Waiting to start...")
+            
+            def show_progress(fraction: float, eta: float, message: str) -> None:
+                progress_bar.progress(fraction, text=f"{message} (about {format_duration(eta)} left)" if message else f"About {format_duration(eta)} left")
+            
+            with st.spinner("Analyzing documents..."), profile_session():
+                try:
+                    reservation = get_governor().reserve(estimate, cancel_token=cancel_token)
+                    tracker = ProgressTracker(cost_model, stage_estimates, show_progress)
+                    
+                    st.session_state.artifacts.discard(st.session_state.report_html)
+                    st.session_state.report_html = None
+                    
+                    if incremental and rfp_id:
+                        # 1-2. Summarize and extract criteria, generating only for new or changed chunks
+                        tracker.start_stage("chunks", "Analyzing new and changed sections")
+                        begin_stage("reanalyze")
+                        result = reanalyze_rfp(
+                            st.session_state.model,
+                            st.session_state.tokenizer,
+                            rfp_id,
+                            rfp_chunks,
+                            st.session_state.chunk_store,
+                            model_name,
+                            cancel_token=cancel_token,
+                            progress=lambda done, total: tracker.advance(done, total, f"Analyzed section {done} of {total}")
+                        )
+                        tracker.finish_stage(observe=False)
+                        st.session_state.summary = result["summary"]
+                        st.session_state.criteria = result["criteria"]
+                        st.session_state.changes = result["changes"]
+                    else:
+                        st.session_state.changes = None
+                        
+                        def summarize_progress(done: int, total: int) -> None:
+                            tracker.advance(done, total, f"Summarized section {done} of {total}")
+                            if done == total:
+                                tracker.finish_stage()
+                                tracker.start_stage("merge", "Merging section summaries")
+                                begin_stage("merge")
+                        
+                        # 1. Summarize RFP
+                        tracker.start_stage("summarize", "Summarizing sections")
+                        begin_stage("summarize")
+                        st.session_state.summary = summarize_rfp(
+                            st.session_state.model,
+                            st.session_state.tokenizer,
+                            rfp_chunks,
+                            cancel_token=cancel_token,
+                            progress=summarize_progress
+                        )
+                        tracker.finish_stage(observe=not cancel_token.expired)
+                        
+                        # 2. Extract eligibility criteria
+                        tracker.start_stage("extract", "Extracting eligibility criteria")
+                        begin_stage("extract")
+                        st.session_state.criteria = extract_eligibility_criteria(
+                            st.session_state.model,
+                            st.session_state.tokenizer,
+                            rfp_chunks,
+                            cancel_token=cancel_token,
+                            progress=lambda done, total: tracker.advance(done, total, f"Extracted criteria from section {done} of {total}")
+                        )
+                        tracker.finish_stage(observe=not cancel_token.expired)
+                    
+                    tracker.start_stage("evaluate", "Evaluating company profiles")
+                    begin_stage("evaluate")
+                    st.session_state.evaluation_stats = None
+                    st.session_state.screenings = None
+                    precomputed_evaluations = None
+                    if fast_screening:
+                        # 3a. Critical criteria first, in groups, until a knockout failure is confirmed
+                        st.session_state.screenings = screen_companies_eligibility(
+                            st.session_state.model,
+                            st.session_state.tokenizer,
+                            st.session_state.criteria,
+                            company_profiles,
+                            cancel_token=cancel_token
+                        )
+                        precomputed_evaluations = {
+                            name: screening_evaluation(st.session_state.criteria, screening)
+                            for name, screening in st.session_state.screenings.items()
+                        }
+                    elif use_cascade:
+                        # 3a. The small model judges every criterion; only low-confidence judgments reach the large model
+                        precomputed_evaluations, st.session_state.evaluation_stats = evaluate_with_cascade(
+                            get_cascade_stages(model_name, cascade_model, float(os.environ.get("RFP_CASCADE_THRESHOLD", 0.6))),
+                            st.session_state.criteria,
+                            company_profiles,
+                            cancel_token=cancel_token
+                        )
+                    elif use_catalog:
+                        # 3a. Only criteria a profile has not been judged against reach the model
+                        precomputed_evaluations, st.session_state.evaluation_stats = evaluate_with_catalog(
+                            st.session_state.model,
+                            st.session_state.tokenizer,
+                            st.session_state.criteria,
+                            company_profiles,
+                            get_catalog(),
+                            cancel_token=cancel_token,
+                            capabilities=get_capability_index() if use_rules else None
+                        )
+                    elif use_rules:
+                        # 3a. Quantitative criteria are checked against extracted profile facts
+                        precomputed_evaluations, st.session_state.evaluation_stats = evaluate_with_rules(
+                            st.session_state.model,
+                            st.session_state.tokenizer,
+                            st.session_state.criteria,
+                            company_profiles,
+                            get_capability_index(),
+                            cancel_token=cancel_token
+                        )
+                    
+                    if len(company_profiles) == 1:
+                        company_chunks = next(iter(company_profiles.values()))
+                        st.session_state.evaluations = None
+                        st.session_state.verdicts = None
+                        st.session_state.matrix = None
+                        
+                        # 3. Evaluate company against criteria
+                        if precomputed_evaluations is not None:
+                            st.session_state.evaluation = next(iter(precomputed_evaluations.values()))
+                        else:
+                            st.session_state.evaluation = evaluate_company_eligibility(
+                                st.session_state.model,
+                                st.session_state.tokenizer,
+                                st.session_state.criteria,
+                                company_chunks,
+                                cancel_token=cancel_token
+                            )
+                    else:
+                        st.session_state.evaluation = None
+                        st.session_state.verdict = None
+                        
+                        # 3. Evaluate every company profile in batches, reusing the extracted criteria
+                        if precomputed_evaluations is not None:
+                            st.session_state.evaluations = precomputed_evaluations
+                        else:
+                            st.session_state.evaluations = evaluate_companies_eligibility(
+                                st.session_state.model,
+                                st.session_state.tokenizer,
+                                st.session_state.criteria,
+                                company_profiles,
+                                batch_size=batch_size,
+                                cancel_token=cancel_token
+                            )
+                    
+                    # Only the plain evaluation matches the predicted prompts; caches and rules skip some of them
+                    tracker.finish_stage(observe=precomputed_evaluations is None and not cancel_token.expired)
+                    
+                    finish_analysis()
+                    
+                    st.session_state.partial = cancel_token.expired
+                    screenings = st.session_state.screenings
+                    if not st.session_state.partial and not (screenings and not all(screening.complete for screening in screenings.values())):
+                        begin_stage("archive")
+                        archive_analysis(company_profiles, evaluation_mode, rfp_id)
+                    if st.session_state.partial:
+                        st.warning("⏱️ The time limit was reached. Results below are partial.")
+                    else:
+                        st.success("✅ Analysis complete! Switch to the Analysis tab to view results.")
+                    
+                    # Auto-switch to Analysis tab
+                    st.info("Please click on the 'Analysis' tab to view the results.")
+                    
+                except GenerationCancelled:
+                    st.info("Analysis was cancelled.")
+                except Exception as e:
+                    st.error(f"❌ Error during analysis: {str(e)}")
+                finally:
+                    if reservation is not None:
+                        reservation.release()
+            
+            if profiling_enabled() and st.session_state.profiler is not None:
+                # Written even for failed or cancelled runs, which are often the ones worth profiling
+                st.session_state.profile_files = st.session_state.profiler.write()
+                st.session_state.profile_files["stages"] = st.session_state.profiler.stage_seconds()
+                st.session_state.profiler = None
 
 with tab2:
     st.header("RFP Analysis Results")
     
     if st.session_state.summary:
+        if st.session_state.partial:
+            st.warning("These results are partial: the analysis stopped at its time limit.")
+        
         st.subheader("RFP Summary")
         st.write(st.session_state.summary)
         
+        if st.session_state.evaluation_stats:
+            stats = st.session_state.evaluation_stats
+            if "hit_rate" in stats:
+                st.caption(
+                    f"Criteria catalog: {stats['hit_rate']:.0%} hit rate, {stats['cached']} of {stats['criteria']} "
+                    f"judgments reused, {stats['new_canonical']} new canonical criteria."
+                )
+            if "rule_resolved" in stats:
+                st.caption(
+                    f"{stats['rule_resolved']} judgments answered from profile facts, {stats['evaluated']} sent to the model."
+                )
+            if "escalation_rate" in stats:
+                saved = stats["seconds_saved"]
+                st.caption(
+                    f"Model cascade: {stats['escalated']} of {stats['criteria']} judgments escalated "
+                    f"({stats['escalation_rate']:.0%}), {stats['seconds']:.1f}s in total"
+                    + (f", about {saved:.1f}s saved over the large model alone." if saved is not None else ".")
+                )
+        
+        screenings = st.session_state.screenings
+        if screenings and not all(screening.complete for screening in screenings.values()):
+            skipped = sum(item is None for screening in screenings.values() for item in screening.items)
+            total = sum(len(screening.items) for screening in screenings.values())
+            st.info(f"Fast screening stopped at knockout failures and skipped {skipped} of {total} criterion evaluations.")
+            
+            if st.button("Complete the evaluation", disabled=not set(screenings) <= set(st.session_state.company_texts)):
+                with st.spinner("Evaluating the remaining criteria..."):
+                    try:
+                        company_profiles = {name: [st.session_state.artifacts.load(st.session_state.company_texts[name])] for name in screenings}
+                        complete_screenings(
+                            st.session_state.model,
+                            st.session_state.tokenizer,
+                            st.session_state.criteria,
+                            company_profiles,
+                            screenings
+                        )
+                        evaluations = {name: screening_evaluation(st.session_state.criteria, screening) for name, screening in screenings.items()}
+                        if st.session_state.evaluations is None:
+                            st.session_state.evaluation = next(iter(evaluations.values()))
+                        else:
+                            st.session_state.evaluations = evaluations
+                        finish_analysis()
+                        if not st.session_state.partial:
+                            archive_analysis(company_profiles, evaluation_mode, rfp_id)
+                        st.success("✅ Every criterion has now been evaluated.")
+                    except Exception as e:
+                        st.error(f"❌ Error during evaluation: {str(e)}")
+        
+        if st.session_state.changes:
+            changes = st.session_state.changes
+            st.subheader("Changes Since Previous Version")
+            st.write(
+                f"{changes['added_chunks']} new or changed sections, {changes['removed_chunks']} removed, "
+                f"{changes['unchanged_chunks']} unchanged ({changes['generated_chunks']} sent to the model)."
+            )
+            for criterion in changes["added_criteria"]:
+                st.markdown(f"- 🆕 {criterion['description']} ({criterion['importance']})")
+            for criterion in changes["removed_criteria"]:
+                st.markdown(f"- ~~{criterion['description']} ({criterion['importance']})~~")
+        
         st.subheader("Eligibility Criteria")
         criteria_formatted = format_eligibility_criteria(st.session_state.criteria)
         st.markdown(criteria_formatted, unsafe_allow_html=True)
         
-        st.subheader("Company Evaluation")
-        st.write(st.session_state.evaluation)
-        
-        st.subheader("Final Verdict")
-        verdict_html = format_verdict(st.session_state.verdict)
-        st.markdown(verdict_html, unsafe_allow_html=True)
+        if st.session_state.matrix:
+            st.subheader("Eligibility Matrix")
+            matrix_formatted = format_criteria_matrix(st.session_state.criteria, st.session_state.matrix)
+            st.markdown(matrix_formatted, unsafe_allow_html=True)
+            
+            st.subheader("Final Verdicts")
+            for name, verdict in st.session_state.verdicts.items():
+                st.markdown(f"**{name}**")
+                verdict_html = format_verdict(verdict)
+                st.markdown(verdict_html, unsafe_allow_html=True)
+                
+                with st.expander(f"Evaluation details for {name}"):
+                    st.write(st.session_state.evaluations[name])
+        else:
+            st.subheader("Company Evaluation")
+            st.write(st.session_state.evaluation)
+            
+            st.subheader("Final Verdict")
+            verdict_html = format_verdict(st.session_state.verdict)
+            st.markdown(verdict_html, unsafe_allow_html=True)
     else:
         st.info("No analysis results yet. Please upload and analyze documents first.")
 
@@ -231,17 +820,66 @@ with tab3:
     st.header("Eligibility Report")
     
     if st.session_state.report_html:
+        report_html = st.session_state.artifacts.load(st.session_state.report_html)
         st.download_button(
             label="Download Report as HTML",
-            data=st.session_state.report_html,
+            data=report_html,
             file_name="rfp_eligibility_report.html",
             mime="text/html"
         )
         
         st.subheader("Report Preview")
-        st.components.v1.html(st.session_state.report_html, height=600, scrolling=True)
+        st.components.v1.html(report_html, height=600, scrolling=True)
     else:
         st.info("No report generated yet. Please complete the analysis first.")
+    
+    if st.session_state.profile_files:
+        st.subheader("Performance Profile")
+        st.caption(" · ".join(f"{stage} {seconds:.1f}s" for stage, seconds in st.session_state.profile_files["stages"].items()))
+        col1, col2 = st.columns(2)
+        with col1:
+            with open(st.session_state.profile_files["flamegraph"], "rb") as file:
+                st.download_button(
+                    label="Download flamegraph stacks",
+                    data=file.read(),
+                    file_name=os.path.basename(st.session_state.profile_files["flamegraph"]),
+                    mime="text/plain",
+                    help="Collapsed stacks; open in speedscope.app or render with flamegraph.pl"
+                )
+        with col2:
+            with open(st.session_state.profile_files["trace"], "rb") as file:
+                st.download_button(
+                    label="Download Chrome trace",
+                    data=file.read(),
+                    file_name=os.path.basename(st.session_state.profile_files["trace"]),
+                    mime="application/json",
+                    help="Open in ui.perfetto.dev or chrome://tracing"
+                )
+
+with tab4:
+    st.header("Analysis History")
+    
+    query = st.text_input("Search archived RFPs and criteria", placeholder="e.g. ISO 27001 data centre")
+    if query:
+        documents = get_archive().search_documents(query)
+        criteria = get_archive().search_criteria(query)
+        if not documents and not criteria:
+            st.info("No archived RFP or criterion matches this search.")
+        
+        if documents:
+            st.subheader("RFPs")
+            for i, result in enumerate(documents):
+                st.markdown(f"**{result['rfp_name']}**: {result['snippet']}")
+                if result["analysis_id"] is not None and st.button("Open analysis", key=f"open_document_{i}"):
+                    restore_analysis(get_archive().get_analysis(result["analysis_id"]))
+                    st.success("✅ Loaded the archived analysis. Switch to the Analysis tab to view it.")
+        
+        if criteria:
+            st.subheader("Criteria")
+            for result in criteria:
+                st.markdown(f"- {result['description']} ({result['importance']}), from *{result['rfp_name']}*")
+    else:
+        st.info("Every completed analysis is archived. Search past RFPs by their text or eligibility criteria.")
 
 # Footer
 st.markdown("---")
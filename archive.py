@@ -0,0 +1,328 @@
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+from incremental import DEFAULT_CACHE_DIR, chunk_hash
+
+DEFAULT_ARCHIVE_PATH = os.environ.get("RFP_ARCHIVE_PATH", os.path.join(DEFAULT_CACHE_DIR, "archive.db"))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    id INTEGER PRIMARY KEY,
+    hash TEXT NOT NULL UNIQUE,
+    name TEXT,
+    kind TEXT NOT NULL,
+    created REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS chunks (
+    id INTEGER PRIMARY KEY,
+    document_id INTEGER NOT NULL REFERENCES documents(id),
+    position INTEGER NOT NULL,
+    text TEXT NOT NULL,
+    UNIQUE (document_id, position)
+);
+CREATE TABLE IF NOT EXISTS analyses (
+    id INTEGER PRIMARY KEY,
+    document_id INTEGER NOT NULL REFERENCES documents(id),
+    rfp_id TEXT,
+    model TEXT,
+    mode TEXT,
+    summary TEXT,
+    created REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS analyses_match ON analyses (document_id, model, mode, created);
+CREATE TABLE IF NOT EXISTS criteria (
+    id INTEGER PRIMARY KEY,
+    analysis_id INTEGER NOT NULL REFERENCES analyses(id),
+    position INTEGER NOT NULL,
+    description TEXT NOT NULL,
+    importance TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS criteria_analysis ON criteria (analysis_id, position);
+CREATE TABLE IF NOT EXISTS evaluations (
+    analysis_id INTEGER NOT NULL REFERENCES analyses(id),
+    profile_id INTEGER NOT NULL REFERENCES documents(id),
+    profile_name TEXT NOT NULL,
+    evaluation TEXT NOT NULL,
+    decision TEXT,
+    reasoning TEXT,
+    PRIMARY KEY (analysis_id, profile_id)
+);
+CREATE INDEX IF NOT EXISTS evaluations_profile ON evaluations (profile_id);
+CREATE VIRTUAL TABLE IF NOT EXISTS chunks_fts USING fts5 (text, content='chunks', content_rowid='id');
+CREATE VIRTUAL TABLE IF NOT EXISTS criteria_fts USING fts5 (description, content='criteria', content_rowid='id');
+"""
+
+def _fts_query(query: str) -> str:
+    # Quote every term so user input like "ISO-9001" or "24/7" is never parsed as FTS5 syntax
+    return " ".join('"' + term.replace('"', '""') + '"' for term in query.split())
+
+class AnalysisArchive:
+    """
+    SQLite archive of completed analyses with full-text search.
+
+    Documents (RFPs and company profiles) are stored once per content hash
+    together with their chunks. Each analysis records the summary, the
+    extracted criteria and every profile's evaluation and verdict. FTS5
+    indexes over the RFP chunks and the criteria make the history
+    searchable, and an analysis of the same RFP against the same profiles,
+    by the same model and evaluation mode, can be reused instead of
+    recomputed.
+
+    The database runs in WAL mode, so searches from other sessions are not
+    blocked while an analysis is written, and each analysis is written in
+    one transaction with batched inserts.
+    """
+
+    def __init__(self, path: str = DEFAULT_ARCHIVE_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        # Streamlit sessions run on different threads; the lock serializes access to the shared connection
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.row_factory = sqlite3.Row
+        try:
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("PRAGMA synchronous=NORMAL")
+            self.connection.executescript(_SCHEMA)
+        except sqlite3.OperationalError as e:
+            self.connection.close()
+            raise RuntimeError(f"Unable to open the analysis archive: {str(e)}")
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def _document(self, chunks: List[str], name: str, kind: str) -> int:
+        digest = chunk_hash("\n\n".join(chunks))
+        row = self.connection.execute("SELECT id FROM documents WHERE hash = ?", (digest,)).fetchone()
+        if row is not None:
+            return row["id"]
+
+        document_id = self.connection.execute(
+            "INSERT INTO documents (hash, name, kind, created) VALUES (?, ?, ?, ?)",
+            (digest, name, kind, time.time())
+        ).lastrowid
+        self.connection.executemany(
+            "INSERT INTO chunks (document_id, position, text) VALUES (?, ?, ?)",
+            ((document_id, position, text) for position, text in enumerate(chunks))
+        )
+        self.connection.execute(
+            "INSERT INTO chunks_fts (rowid, text) SELECT id, text FROM chunks WHERE document_id = ?",
+            (document_id,)
+        )
+        return document_id
+
+    def save_analysis(
+        self,
+        rfp_name: str,
+        rfp_chunks: List[str],
+        summary: str,
+        criteria: List[Dict[str, str]],
+        company_profiles: Dict[str, List[str]],
+        evaluations: Dict[str, str],
+        verdicts: Dict[str, Dict[str, str]],
+        model_name: str,
+        mode: str,
+        rfp_id: Optional[str] = None
+    ) -> int:
+        """
+        Archive a completed analysis.
+
+        Args:
+            rfp_name: File name of the RFP
+            rfp_chunks: RFP chunks that were analyzed
+            summary: RFP summary
+            criteria: Extracted eligibility criteria
+            company_profiles: Company profile chunks keyed by profile name
+            evaluations: Evaluation text keyed by profile name
+            verdicts: Verdict ("decision" and "reasoning") keyed by profile name
+            model_name: Model that generated the analysis
+            mode: How the profiles were evaluated (e.g. "model", "rules",
+                "catalog" or "screening")
+            rfp_id: Identifier shared by the versions of an RFP, if any
+
+        Returns:
+            int: Id of the archived analysis
+        """
+        with self.lock, self.connection:
+            document_id = self._document(rfp_chunks, rfp_name, "rfp")
+            analysis_id = self.connection.execute(
+                "INSERT INTO analyses (document_id, rfp_id, model, mode, summary, created) VALUES (?, ?, ?, ?, ?, ?)",
+                (document_id, rfp_id, model_name, mode, summary, time.time())
+            ).lastrowid
+            self.connection.executemany(
+                "INSERT INTO criteria (analysis_id, position, description, importance) VALUES (?, ?, ?, ?)",
+                ((analysis_id, i, c["description"], c["importance"]) for i, c in enumerate(criteria))
+            )
+            self.connection.execute(
+                "INSERT INTO criteria_fts (rowid, description) SELECT id, description FROM criteria WHERE analysis_id = ?",
+                (analysis_id,)
+            )
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO evaluations (analysis_id, profile_id, profile_name, evaluation, decision, reasoning) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (
+                        analysis_id, self._document(company_profiles[name], name, "profile"), name, evaluation,
+                        verdicts.get(name, {}).get("decision"), verdicts.get(name, {}).get("reasoning")
+                    )
+                    for name, evaluation in evaluations.items()
+                ]
+            )
+        return analysis_id
+
+    def get_analysis(self, analysis_id: int) -> Optional[Dict[str, Any]]:
+        """
+        Load an archived analysis.
+
+        Args:
+            analysis_id: Id returned by save_analysis or a search
+
+        Returns:
+            Dict with "analysis_id", "rfp_name", "rfp_id", "model", "mode",
+            "created", "summary", "criteria", "evaluations" and "verdicts"
+            (keyed by profile name), or None
+        """
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT a.id, a.rfp_id, a.model, a.mode, a.summary, a.created, d.name FROM analyses a "
+                "JOIN documents d ON d.id = a.document_id WHERE a.id = ?",
+                (analysis_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            criteria = self.connection.execute(
+                "SELECT description, importance FROM criteria WHERE analysis_id = ? ORDER BY position",
+                (analysis_id,)
+            ).fetchall()
+            evaluations = self.connection.execute(
+                "SELECT profile_name, evaluation, decision, reasoning FROM evaluations WHERE analysis_id = ?",
+                (analysis_id,)
+            ).fetchall()
+
+        return {
+            "analysis_id": row["id"],
+            "rfp_name": row["name"],
+            "rfp_id": row["rfp_id"],
+            "model": row["model"],
+            "mode": row["mode"],
+            "created": row["created"],
+            "summary": row["summary"],
+            "criteria": [{"description": c["description"], "importance": c["importance"]} for c in criteria],
+            "evaluations": {e["profile_name"]: e["evaluation"] for e in evaluations},
+            "verdicts": {e["profile_name"]: {"decision": e["decision"], "reasoning": e["reasoning"]} for e in evaluations}
+        }
+
+    def find_analysis(
+        self,
+        rfp_chunks: List[str],
+        company_profiles: Dict[str, List[str]],
+        model_name: str,
+        mode: str
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Find the latest analysis of the same RFP that covers the same company
+        profiles and was made by the same model in the same evaluation mode.
+
+        Documents are matched by content hash, so renamed files still match.
+
+        Args:
+            rfp_chunks: RFP chunks about to be analyzed
+            company_profiles: Company profile chunks keyed by profile name
+            model_name: Model about to analyze them
+            mode: Evaluation mode about to be used, as passed to save_analysis
+
+        Returns:
+            The archived analysis as returned by get_analysis, with evaluations
+            and verdicts keyed by the current profile names, or None
+        """
+        hashes = {name: chunk_hash("\n\n".join(chunks)) for name, chunks in company_profiles.items()}
+        with self.lock:
+            placeholders = ", ".join("?" * len(hashes))
+            row = self.connection.execute(
+                f"""SELECT a.id FROM analyses a JOIN documents d ON d.id = a.document_id
+                WHERE d.hash = ? AND a.model = ? AND a.mode = ? AND (
+                    SELECT COUNT(DISTINCT p.hash) FROM evaluations e JOIN documents p ON p.id = e.profile_id
+                    WHERE e.analysis_id = a.id AND p.hash IN ({placeholders})
+                ) = ?
+                ORDER BY a.created DESC LIMIT 1""",
+                (chunk_hash("\n\n".join(rfp_chunks)), model_name, mode, *set(hashes.values()), len(set(hashes.values())))
+            ).fetchone()
+            if row is None:
+                return None
+            names = dict(self.connection.execute(
+                "SELECT p.hash, e.profile_name FROM evaluations e JOIN documents p ON p.id = e.profile_id WHERE e.analysis_id = ?",
+                (row["id"],)
+            ).fetchall())
+
+        analysis = self.get_analysis(row["id"])
+        # The same profile may have been uploaded under another file name
+        analysis["evaluations"] = {name: analysis["evaluations"][names[digest]] for name, digest in hashes.items()}
+        analysis["verdicts"] = {name: analysis["verdicts"][names[digest]] for name, digest in hashes.items()}
+        return analysis
+
+    def search_documents(self, query: str, limit: int = 20) -> List[Dict[str, Any]]:
+        """
+        Search the text of archived RFPs.
+
+        Args:
+            query: Words to search for; every word must occur in the same chunk
+            limit: Maximum number of RFPs to return
+
+        Returns:
+            Best-ranked RFPs first, each with "document_id", "rfp_name",
+            "snippet" and "analysis_id" (its latest analysis)
+        """
+        if not query.strip():
+            return []
+        results = {}
+        with self.lock:
+            rows = self.connection.execute(
+                """SELECT c.document_id, d.name, snippet(chunks_fts, 0, '[', ']', '…', 12) AS snippet,
+                    (SELECT a.id FROM analyses a WHERE a.document_id = c.document_id ORDER BY a.created DESC LIMIT 1) AS analysis_id
+                FROM chunks_fts JOIN chunks c ON c.id = chunks_fts.rowid JOIN documents d ON d.id = c.document_id
+                WHERE chunks_fts MATCH ? AND d.kind = 'rfp'
+                ORDER BY bm25(chunks_fts)""",
+                (_fts_query(query),)
+            )
+            # Keep the best-ranked chunk of each RFP
+            for row in rows:
+                if row["document_id"] not in results:
+                    results[row["document_id"]] = {
+                        "document_id": row["document_id"],
+                        "rfp_name": row["name"],
+                        "snippet": row["snippet"],
+                        "analysis_id": row["analysis_id"]
+                    }
+                    if len(results) >= limit:
+                        break
+        return list(results.values())
+
+    def search_criteria(self, query: str, limit: int = 50) -> List[Dict[str, Any]]:
+        """
+        Search the eligibility criteria of archived analyses.
+
+        Args:
+            query: Words to search for; every word must occur in the criterion
+            limit: Maximum number of criteria to return
+
+        Returns:
+            Best-ranked criteria first, each with "description", "importance",
+            "analysis_id" and "rfp_name"
+        """
+        if not query.strip():
+            return []
+        with self.lock:
+            rows = self.connection.execute(
+                """SELECT c.description, c.importance, c.analysis_id, d.name
+                FROM criteria_fts JOIN criteria c ON c.id = criteria_fts.rowid
+                JOIN analyses a ON a.id = c.analysis_id JOIN documents d ON d.id = a.document_id
+                WHERE criteria_fts MATCH ?
+                ORDER BY bm25(criteria_fts) LIMIT ?""",
+                (_fts_query(query), limit)
+            ).fetchall()
+        return [
+            {"description": row["description"], "importance": row["importance"], "analysis_id": row["analysis_id"], "rfp_name": row["name"]}
+            for row in rows
+        ]
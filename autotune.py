@@ -0,0 +1,372 @@
+import copy
+import hashlib
+import json
+import os
+import platform
+import re
+import socket
+import tempfile
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+import torch
+from transformers import PreTrainedTokenizerBase
+from cost_model import CHARS_PER_TOKEN, NEW_TOKENS, CostModel, choose_sizes
+from model_manager import MAX_INPUT_TOKENS, measure_token_rates
+
+DEFAULT_TUNING_DIR = os.environ.get(
+    "RFP_TUNING_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "rfp-analyzer", "tuning")
+)
+# Latency the chunk and batch sizes are chosen for, on a typical 40-page RFP against one profile
+DEFAULT_TARGET_SECONDS = float(os.environ.get("RFP_TARGET_SECONDS", 600))
+_TYPICAL_RFP_CHARS = 40 * 3000
+_TYPICAL_PROFILE_CHARS = 3000
+_EXTRACT_TEMPLATE_CHARS = 200
+# Prompt length of a typical call, used to compare candidates by the time of one call
+_TYPICAL_PROMPT_TOKENS = 300
+# Lower precision must be this much faster than float32 to be worth its accuracy cost
+_PRECISION_MARGIN = {"float32": 1.0, "bfloat16": 1.1, "float16": 1.0, "int8": 1.25}
+# Share of memory the KV cache of a batch may use
+_BATCH_MEMORY_SHARE = 0.25
+_SIMD_FLAGS = ("avx2", "avx512f", "avx512_bf16", "avx512_vnni", "avx_vnni", "amx_tile", "amx_bf16", "amx_int8")
+
+@dataclass(slots=True)
+class HardwareInfo:
+    cpu_model: str
+    logical_cores: int
+    physical_cores: int
+    memory_mb: int
+    simd: List[str] = field(default_factory=list)
+    cuda: bool = False
+
+    @property
+    def machine_key(self) -> str:
+        # Profiles follow the machine: a resized VM or another host gets tuned again
+        identity = f"{socket.gethostname()}|{self.cpu_model}|{self.logical_cores}|{self.memory_mb // 1024}|{self.cuda}"
+        return hashlib.sha256(identity.encode("utf-8")).hexdigest()[:16]
+
+@dataclass(slots=True)
+class RuntimeProfile:
+    """Runtime settings chosen for one model on one machine."""
+    device: str
+    threads: int
+    precision: str
+    batch_size: int
+    chunk_size: int
+    prefill_tokens_per_second: float
+    decode_tokens_per_second: float
+    # Wall time of the benchmark that chose these settings
+    tuning_seconds: float = 0.0
+    hardware: Dict[str, Any] = field(default_factory=dict)
+    benchmarks: List[Dict[str, Any]] = field(default_factory=list)
+
+    @classmethod
+    def from_dict(cls, item: Dict[str, Any]) -> "RuntimeProfile":
+        return cls(**item)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+def _read_proc(path: str) -> str:
+    try:
+        with open(path, "r", encoding="utf-8", errors="replace") as file:
+            return file.read()
+    except OSError:
+        return ""
+
+def detect_hardware() -> HardwareInfo:
+    """
+    Inspect the cores, memory and vector extensions of this machine.
+
+    Linux details come from /proc; elsewhere torch's CPU capability and
+    os.cpu_count stand in.
+
+    Returns:
+        HardwareInfo: CPU model, core counts, memory in MB, SIMD extensions and CUDA availability
+    """
+    cpuinfo = _read_proc("/proc/cpuinfo")
+    logical = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else (os.cpu_count() or 1)
+
+    # Hyper-threads share execution units, so physical cores bound the useful thread count
+    cores = set(re.findall(r"physical id\s*:\s*(\d+)\s*\n(?:.*\n)*?core id\s*:\s*(\d+)", cpuinfo))
+    physical = min(len(cores), logical) if cores else logical
+
+    model = re.search(r"model name\s*:\s*(.+)", cpuinfo)
+    flags = re.search(r"flags\s*:\s*(.+)", cpuinfo)
+    if flags:
+        available = set(flags.group(1).split())
+        simd = [flag for flag in _SIMD_FLAGS if flag in available]
+    else:
+        capability = getattr(getattr(torch.backends, "cpu", None), "get_cpu_capability", lambda: "")()
+        simd = {"AVX2": ["avx2"], "AVX512": ["avx2", "avx512f"]}.get(capability, [])
+
+    try:
+        memory_mb = os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") // 2**20
+    except (AttributeError, ValueError, OSError):
+        memory_mb = 4096
+
+    return HardwareInfo(
+        cpu_model=model.group(1).strip() if model else platform.processor() or platform.machine(),
+        logical_cores=logical,
+        physical_cores=physical,
+        memory_mb=memory_mb,
+        simd=simd,
+        cuda=torch.cuda.is_available()
+    )
+
+def _weight_bytes(model: Any) -> int:
+    return sum(p.numel() * p.element_size() for p in model.parameters()) if hasattr(model, "parameters") else 0
+
+def candidate_settings(hardware: HardwareInfo, model_bytes: int = 0, lower_precision: bool = False) -> List[Tuple[int, str]]:
+    """
+    List the thread counts and precisions worth benchmarking on this machine.
+
+    Args:
+        hardware: Detected hardware
+        model_bytes: Size of the model's weights; lower precisions are
+            benchmarked on a copy, so they are skipped when a copy would not fit
+        lower_precision: Also offer precisions below float32, which can
+            change the model's answers
+
+    Returns:
+        (threads, precision) pairs
+    """
+    precisions = ["float32"]
+    if not lower_precision or model_bytes * 2 > hardware.memory_mb * 2**20 * 0.5:
+        return [(hardware.physical_cores, precision) for precision in precisions]
+    if hardware.cuda:
+        return [(hardware.physical_cores, precision) for precision in precisions + ["float16"]]
+
+    # Only offered where the CPU has native instructions; emulated they are slower than float32
+    if "avx512_bf16" in hardware.simd or "amx_bf16" in hardware.simd:
+        precisions.append("bfloat16")
+    if {"avx512_vnni", "avx_vnni", "amx_int8"} & set(hardware.simd):
+        precisions.append("int8")
+
+    threads = sorted({hardware.physical_cores, hardware.logical_cores})
+    return [(count, precision) for count in threads for precision in precisions]
+
+def with_precision(model: Any, precision: str, inplace: bool = False) -> Any:
+    """
+    Convert a float32 torch model to another precision.
+
+    Args:
+        model: The torch language model
+        precision: "float32", "bfloat16", "float16" or "int8" (dynamic
+            quantization of the linear layers)
+        inplace: Convert the model itself instead of a copy
+
+    Returns:
+        The converted model
+    """
+    if precision == "float32":
+        return model
+    if precision == "int8":
+        return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=inplace)
+    target = model if inplace else copy.deepcopy(model)
+    return target.to(getattr(torch, precision))
+
+def max_batch_size(model: Any, hardware: HardwareInfo, precision: str) -> int:
+    """
+    Bound the batch size by the memory the KV cache of a full batch needs.
+
+    Args:
+        model: The torch language model
+        hardware: Detected hardware
+        precision: Precision the model runs in
+
+    Returns:
+        int: Largest power of two batch size that fits, between 1 and 32
+    """
+    config = getattr(model, "config", None)
+    layers = getattr(config, "num_hidden_layers", 12)
+    hidden = getattr(config, "hidden_size", 768)
+    element_bytes = 4 if precision == "float32" else 2
+    per_sequence = 2 * layers * hidden * (MAX_INPUT_TOKENS + NEW_TOKENS) * element_bytes
+    budget = hardware.memory_mb * 2**20 * _BATCH_MEMORY_SHARE - _weight_bytes(model)
+    batch_size = 1
+    while batch_size < 32 and (batch_size * 2) * per_sequence <= budget:
+        batch_size *= 2
+    return batch_size
+
+def benchmark_settings(model: Any, tokenizer: PreTrainedTokenizerBase, threads: int, precision: str) -> Dict[str, Any]:
+    """
+    Time a typical call with the given thread count and precision.
+
+    Args:
+        model: The float32 torch language model
+        tokenizer: The tokenizer for the model
+        threads: Intra-op thread count
+        precision: Precision to convert a copy of the model to
+
+    Returns:
+        Dict with "threads", "precision", the measured token rates and "seconds" per typical call
+    """
+    torch.set_num_threads(threads)
+    variant = with_precision(model, precision)
+    # The first run initializes kernels for this configuration and is not counted
+    measure_token_rates(variant, tokenizer, prompt_tokens=64, new_tokens=4)
+    rates = measure_token_rates(variant, tokenizer, prompt_tokens=128, new_tokens=16)
+    del variant
+    seconds = _TYPICAL_PROMPT_TOKENS / rates["prefill_tokens_per_second"] + NEW_TOKENS / rates["decode_tokens_per_second"]
+    return {"threads": threads, "precision": precision, **rates, "seconds": seconds}
+
+def profile_path(model_name: str, hardware: HardwareInfo, directory: str = DEFAULT_TUNING_DIR) -> str:
+    return os.path.join(directory, f"{hardware.machine_key}-{re.sub(r'[^A-Za-z0-9_.-]+', '--', model_name)}.json")
+
+def load_profile(model_name: str, hardware: Optional[HardwareInfo] = None, directory: str = DEFAULT_TUNING_DIR) -> Optional[RuntimeProfile]:
+    """
+    Load the persisted runtime profile of a model on this machine.
+
+    Args:
+        model_name: Name or path of the model
+        hardware: Detected hardware (detected again if not given)
+        directory: Directory of persisted profiles
+
+    Returns:
+        The profile, or None if the model has not been tuned on this machine
+    """
+    try:
+        with open(profile_path(model_name, hardware or detect_hardware(), directory), "r", encoding="utf-8") as file:
+            return RuntimeProfile.from_dict(json.load(file))
+    except (FileNotFoundError, json.JSONDecodeError, TypeError):
+        return None
+
+def tune_model(
+    model_name: str,
+    model: Any,
+    tokenizer: PreTrainedTokenizerBase,
+    directory: str = DEFAULT_TUNING_DIR,
+    target_seconds: float = DEFAULT_TARGET_SECONDS,
+    lower_precision: bool = False
+) -> RuntimeProfile:
+    """
+    Choose threads, precision, batch size and chunk size for a model on this machine.
+
+    Each candidate thread count and precision is validated with a short
+    micro-benchmark on the loaded model; chunk and batch sizes are then
+    chosen by the cost model from the winner's measured token rates, within
+    the batch size the machine's memory allows. The profile is persisted
+    per machine and model, so later starts skip the benchmark.
+
+    Args:
+        model_name: Name or path of the model
+        model: The loaded float32 torch model
+        tokenizer: The tokenizer for the model
+        directory: Directory of persisted profiles
+        target_seconds: Latency target for a typical RFP
+        lower_precision: Also benchmark precisions below float32
+
+    Returns:
+        RuntimeProfile: The chosen settings and the benchmark results
+    """
+    start = time.perf_counter()
+    hardware = detect_hardware()
+    default_threads = torch.get_num_threads()
+    benchmarks = []
+    try:
+        for threads, precision in candidate_settings(hardware, _weight_bytes(model), lower_precision):
+            try:
+                benchmarks.append(benchmark_settings(model, tokenizer, threads, precision))
+            except Exception as e:
+                # A precision the build cannot run is skipped, not fatal
+                benchmarks.append({"threads": threads, "precision": precision, "error": str(e)})
+    finally:
+        torch.set_num_threads(default_threads)
+
+    measured = [b for b in benchmarks if "seconds" in b]
+    if not measured:
+        raise RuntimeError(f"Auto-tuning failed: {benchmarks[0]['error'] if benchmarks else 'no candidate settings'}")
+    best = min(measured, key=lambda b: b["seconds"] * _PRECISION_MARGIN[b["precision"]])
+
+    cost_model = CostModel(model_name)
+    cost_model.set_rates(best)
+    batch_sizes = [size for size in (1, 2, 4, 8, 16, 32) if size <= max_batch_size(model, hardware, best["precision"])]
+    # A chunk and the extraction instructions must fit the input window together
+    chunk_sizes = [size for size in (500, 1000, 1500, 2000) if size + _EXTRACT_TEMPLATE_CHARS <= MAX_INPUT_TOKENS * CHARS_PER_TOKEN]
+    sizes = choose_sizes(cost_model, _TYPICAL_RFP_CHARS, [_TYPICAL_PROFILE_CHARS], target_seconds, chunk_sizes, batch_sizes)
+
+    profile = RuntimeProfile(
+        device="cuda" if hardware.cuda else "cpu",
+        threads=best["threads"],
+        precision=best["precision"],
+        batch_size=sizes["batch_size"],
+        chunk_size=sizes["chunk_size"],
+        prefill_tokens_per_second=best["prefill_tokens_per_second"],
+        decode_tokens_per_second=best["decode_tokens_per_second"],
+        tuning_seconds=time.perf_counter() - start,
+        hardware=asdict(hardware),
+        benchmarks=benchmarks
+    )
+
+    os.makedirs(directory, exist_ok=True)
+    # Write to a temporary file first so readers never see a partial profile
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as file:
+        json.dump(profile.to_dict(), file, indent=2)
+    os.replace(tmp_path, profile_path(model_name, hardware, directory))
+    return profile
+
+def apply_profile(model: Any, profile: RuntimeProfile, lower_precision: bool = False) -> Any:
+    """
+    Apply a runtime profile to a freshly loaded float32 model.
+
+    Args:
+        model: The torch language model
+        profile: Settings from tune_model or load_profile
+        lower_precision: Convert the model to the profile's precision;
+            otherwise it stays in float32
+
+    Returns:
+        The model, with torch's thread count set
+    """
+    torch.set_num_threads(profile.threads)
+    return with_precision(model, profile.precision, inplace=True) if lower_precision else model
+
+def tuned_model(model_name: str, model: Any, tokenizer: PreTrainedTokenizerBase, lower_precision: bool = False) -> Tuple[Any, RuntimeProfile]:
+    """
+    Apply this machine's profile for a model, tuning it on first start.
+
+    Args:
+        model_name: Name or path of the model
+        model: The loaded float32 torch model
+        tokenizer: The tokenizer for the model
+        lower_precision: Allow a precision below float32, both when tuning
+            and when applying a stored profile
+
+    Returns:
+        The configured model and its runtime profile; the profile's
+        tuning_seconds tells how long the first start spent tuning
+    """
+    profile = load_profile(model_name)
+    if profile is None:
+        profile = tune_model(model_name, model, tokenizer, lower_precision=lower_precision)
+    return apply_profile(model, profile, lower_precision), profile
+
+def main() -> None:
+    import argparse
+    from model_manager import load_model, load_tokenizer
+
+    parser = argparse.ArgumentParser(description="Tune runtime settings for a model on this machine.")
+    parser.add_argument("--model", default="facebook/opt-125m")
+    parser.add_argument("--target-seconds", type=float, default=DEFAULT_TARGET_SECONDS)
+    parser.add_argument("--lower-precision", action="store_true",
+                        help="Also benchmark bfloat16, float16 and int8; load_model only applies them with RFP_AUTO_TUNE_PRECISION=1")
+    args = parser.parse_args()
+
+    print(json.dumps(asdict(detect_hardware()), indent=2))
+    profile = tune_model(
+        args.model, load_model(args.model, auto_tune=False), load_tokenizer(args.model),
+        target_seconds=args.target_seconds, lower_precision=args.lower_precision
+    )
+    for result in profile.benchmarks:
+        if "seconds" in result:
+            print(f"{result['threads']:>3} threads {result['precision']:<9}{result['seconds']:>8.2f}s per call")
+        else:
+            print(f"{result['threads']:>3} threads {result['precision']:<9} failed: {result['error']}")
+    print(f"Chosen in {profile.tuning_seconds:.1f}s: {profile.threads} threads, {profile.precision}, "
+          f"batch size {profile.batch_size}, chunk size {profile.chunk_size}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+import argparse
+import time
+from typing import Any, Dict, List
+from model_manager import load_model, load_tokenizer, warm_up_model, generate_text
+
+# Prompt shaped like the analyzer's chunk prompts
+SAMPLE_PROMPT = """Extract key eligibility requirements from the following RFP section. For each, provide:
+1. Description
+2. Importance (Critical, Important, Nice-to-have)
+
+RFP Section:
+The bidder must hold a valid ISO 9001 certification and have at least five years of experience delivering
+similar projects. The bidder shall have an average annual turnover above 2 million over the last three
+years and a team of at least 10 qualified professionals.
+
+Eligibility Criteria:"""
+
+def measure_throughput(model: Any, tokenizer: Any, prompts: List[str]) -> Dict[str, float]:
+    """
+    Measure generation throughput of a loaded model.
+
+    Args:
+        model: The language model
+        tokenizer: The tokenizer for the model
+        prompts: Prompts to generate from, run one after the other
+
+    Returns:
+        Dict with "seconds", "tokens" and "tokens_per_second"
+    """
+    # One untimed call so lazy initialization doesn't count against the backend
+    generate_text(model, tokenizer, prompts[0], temperature=0.3)
+
+    tokens = 0
+    start = time.perf_counter()
+    for prompt in prompts:
+        text = generate_text(model, tokenizer, prompt, temperature=0.3)
+        tokens += len(tokenizer(text)["input_ids"])
+    seconds = time.perf_counter() - start
+    return {"seconds": seconds, "tokens": tokens, "tokens_per_second": tokens / seconds if seconds else 0.0}
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare generation throughput of the inference backends.")
+    parser.add_argument("--model", default="facebook/opt-125m")
+    parser.add_argument("--backends", nargs="+", default=["torch", "onnx"])
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--compile", action="store_true", help="Compile torch models with torch.compile")
+    args = parser.parse_args()
+
+    tokenizer = load_tokenizer(args.model)
+    prompts = [SAMPLE_PROMPT] * args.runs
+
+    print(f"{'backend':<10}{'cold s':>10}{'warm s':>10}{'seconds':>10}{'tokens':>10}{'tokens/s':>12}")
+    for backend in args.backends:
+        # Backends are compared at their defaults; a tuned thread count or precision would skew the comparison
+        model = load_model(args.model, backend=backend, compile_graph=args.compile and backend == "torch", auto_tune=False)
+        warmup = warm_up_model(model, tokenizer)
+        result = measure_throughput(model, tokenizer, prompts)
+        print(
+            f"{backend:<10}{warmup['cold_seconds']:>10.2f}{warmup['warm_seconds']:>10.2f}"
+            f"{result['seconds']:>10.2f}{result['tokens']:>10}{result['tokens_per_second']:>12.1f}"
+        )
+        del model
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,434 @@
+import datetime
+import json
+import os
+import re
+import tempfile
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Set, Tuple
+from transformers import PreTrainedTokenizerBase
+from analyzer import evaluate_open_criteria
+from incremental import DEFAULT_CACHE_DIR, chunk_hash
+from model_manager import CancellationToken
+from results import CriterionEvaluation, Status, format_evaluation
+
+# Multipliers of the amount suffixes used in profiles and RFPs
+_SCALES = {
+    "k": 1e3, "thousand": 1e3, "lakh": 1e5, "lakhs": 1e5, "m": 1e6, "mn": 1e6, "million": 1e6,
+    "crore": 1e7, "crores": 1e7, "b": 1e9, "bn": 1e9, "billion": 1e9
+}
+# Lakhs and crores are only used for rupees
+_INDIAN_SCALES = frozenset(("lakh", "lakhs", "crore", "crores"))
+_CURRENCIES = {
+    "$": "usd", "usd": "usd", "dollars": "usd", "€": "eur", "eur": "eur", "euros": "eur",
+    "£": "gbp", "gbp": "gbp", "₹": "inr", "inr": "inr", "rs": "inr", "rs.": "inr", "rupees": "inr"
+}
+_NUMBER = r"(\d[\d,]*(?:\.\d+)?)"
+# An amount with its optional currency before or after it; percentages are matched so they can be skipped
+_AMOUNT = re.compile(
+    r"(?:([$€£₹]|\b(?:usd|eur|gbp|inr|rs\.?|rupees)(?![a-z]))\s*)?" + _NUMBER
+    + r"\s*(%|percent\b|thousand\b|lakhs?\b|million\b|mn\b|m\b|crores?\b|billion\b|bn\b|b\b|k\b)?"
+    + r"(?:\s*\b(usd|eur|gbp|inr|rupees|dollars|euros)\b)?",
+    re.IGNORECASE
+)
+# Comparison words a criterion's threshold must follow. Negated comparisons come first, so
+# "not more than 5" is never read as "more than 5"
+_COMPARISON = (
+    r"\b(not more than|no more than|not (?:to )?exceed(?:ing)?|not in excess of|not less than|no less than|"
+    r"at least|minimum(?: of)?|min\.|more than|greater than|in excess of|over|above|exceed(?:s|ing)?|"
+    r"up to|maximum(?: of)?|max\.|at most|less than|fewer than|below)\s+(?:of\s+|than\s+)?"
+)
+# Comparisons that bound from above, and the ones that exclude the threshold itself
+_UPPER = re.compile(r"\b(?:up to|max\.|maximum|at most|less|fewer|below)\b", re.IGNORECASE)
+_STRICT = re.compile(r"more|greater|excess|over|above|exceed|less|fewer|below", re.IGNORECASE)
+# "must not be more than 50", where the negation is separate from the comparison
+_NEGATION = re.compile(r"\b(?:not|never)(?:\s+be)?\s+$", re.IGNORECASE)
+# "in the last 3 years" is a time window, not a length of experience
+_TIME_WINDOW = re.compile(r"\b(?:last|past|previous|preceding|recent)\s*$", re.IGNORECASE)
+
+_EXPERIENCE = r"\b(?:experience|business|operations?|industry|track record)"
+_YEARS = re.compile(_NUMBER + r"\+?\s*(?:years|yrs)\b[^.;\n]{0,40}?" + _EXPERIENCE, re.IGNORECASE)
+_YEARS_RULE = re.compile(
+    r"(?:" + _COMPARISON + r")?" + _NUMBER + r"(\+)?\s*(?:years|yrs)\b(\s+or\s+(?:more|less|fewer))?([^.;\n]{0,40}?)" + _EXPERIENCE,
+    re.IGNORECASE
+)
+_FOUNDED = re.compile(r"\b(?:founded|established|incorporated|operating since|in business since)\s+(?:in\s+)?((?:19|20)\d\d)\b", re.IGNORECASE)
+_STAFF = (
+    r"\+?\s+(?:full[- ]time\s+|qualified\s+|certified\s+|skilled\s+)?"
+    r"(?:employees|staff|professionals|people|engineers|consultants|developers|team members|experts)\b"
+)
+_HEADCOUNT = re.compile(r"(?:team of\s+" + _NUMBER + r")|(?:" + _NUMBER + _STAFF + r")", re.IGNORECASE)
+_HEADCOUNT_RULE = re.compile(r"(?:" + _COMPARISON + r")?" + _NUMBER + r"(\+)?" + _STAFF + r"(\s+or\s+(?:more|less|fewer))?", re.IGNORECASE)
+# Words between "years" and "experience" that do not narrow it down ("10 years of total experience")
+_GENERAL_EXPERIENCE = re.compile(r"(?:\s*\b(?:of|in|the|total|overall|continuous|professional|work|working)\b)*\s*", re.IGNORECASE)
+# Staff counts of a specific role or skill are not the company's headcount
+_SPECIFIC_STAFF = re.compile(r"\b(?:qualified|certified|skilled|professionals|engineers|consultants|developers|experts)\b", re.IGNORECASE)
+# A phrase after the threshold that narrows it to a domain, place or skill ("in healthcare projects")
+_QUALIFIER = re.compile(
+    r"\s*(?:experience\s+)?(?:in|of|with|on|for|within|across|as|related|relevant|having|holding|trained|"
+    r"specialized|experienced|providing|delivering|executing|implementing|supplying|handling|working)\b",
+    re.IGNORECASE
+)
+_REVENUE = re.compile(r"\b(?:revenue|turnover|sales)\b", re.IGNORECASE)
+_COMPARISON_WORDS = re.compile(_COMPARISON, re.IGNORECASE)
+# A full stop that is not a decimal point or the end of "Rs." / "min."
+_CLAUSE_END = re.compile(r"(?<![Rr]s)(?<!min)[.;\n](?!\d)")
+_YEAR = re.compile(r"(?:19|20)\d\d")
+_CERTIFICATIONS = [
+    (re.compile(r"\bISO(?:/IEC)?[\s-]*(\d{4,5})\b", re.IGNORECASE), lambda m: f"iso {m.group(1)}"),
+    (re.compile(r"\bCMMI(?:[\s-]+(?:dev|svc))?(?:[\s-]+(?:maturity[\s-]+)?level)?[\s-]*(\d)\b", re.IGNORECASE), lambda m: f"cmmi level {m.group(1)}"),
+    (re.compile(r"\bSOC[\s-]*([123])\b", re.IGNORECASE), lambda m: f"soc {m.group(1)}"),
+    (re.compile(r"\bPCI[\s-]*DSS\b", re.IGNORECASE), lambda m: "pci dss"),
+]
+_LOCATIONS = re.compile(
+    r"\b(?i:offices?|located|headquartered|based|presence|operations|branches)\s+(?:\w+\s+){0,2}?(?i:in)\s+"
+    r"([A-Z][\w-]*(?:(?:, *| +and +| +)[A-Z][\w-]*)*)"
+)
+_LOCATION_SPLIT = re.compile(r",\s*|\s+and\s+")
+_ALTERNATIVE = re.compile(r"\b(?:or|either)\b|/", re.IGNORECASE)
+_FACT_LABELS = {"years_experience": "years of experience", "headcount": "headcount", "revenue": "revenue"}
+# Bumped whenever extraction changes, so facts cached by an older version are extracted again
+_FACTS_VERSION = 2
+
+@dataclass(slots=True)
+class CompanyFacts:
+    """Quantitative facts and capability sets extracted from one company profile."""
+    years_experience: Optional[float] = None
+    headcount: Optional[int] = None
+    revenue: Optional[float] = None
+    revenue_currency: Optional[str] = None
+    certifications: Set[str] = field(default_factory=set)
+    locations: Set[str] = field(default_factory=set)
+
+    @classmethod
+    def from_dict(cls, item: Dict[str, Any]) -> "CompanyFacts":
+        return cls(
+            item["years_experience"], item["headcount"], item["revenue"], item["revenue_currency"],
+            set(item["certifications"]), set(item["locations"])
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "years_experience": self.years_experience,
+            "headcount": self.headcount,
+            "revenue": self.revenue,
+            "revenue_currency": self.revenue_currency,
+            "certifications": sorted(self.certifications),
+            "locations": sorted(self.locations)
+        }
+
+@dataclass(slots=True)
+class Rule:
+    """A criterion the fact store can answer: a numeric bound or required members."""
+    fact: str
+    minimum: Optional[float] = None
+    maximum: Optional[float] = None
+    strict: bool = False
+    members: Tuple[str, ...] = ()
+    currency: Optional[str] = None
+
+def _number(text: str) -> float:
+    return float(text.replace(",", ""))
+
+def _amount(number: str, scale: Optional[str]) -> float:
+    return _number(number) * _SCALES.get((scale or "").lower(), 1)
+
+def _parse_amount(match: re.Match) -> Optional[Tuple[float, Optional[str]]]:
+    # Percentages and bare years ("the 2023 financial year") are not amounts
+    currency, number, scale, suffix = match.groups()
+    scale = (scale or "").lower()
+    if scale in ("%", "percent") or (not (scale or currency or suffix) and _YEAR.fullmatch(number)):
+        return None
+    code = _CURRENCIES.get((currency or suffix or "").lower()) or ("inr" if scale in _INDIAN_SCALES else None)
+    return _amount(number, scale), code
+
+def _clause_end(text: str, pos: int) -> int:
+    match = _CLAUSE_END.search(text, pos)
+    return match.start() if match else len(text)
+
+def _time_window(text: str, pos: int) -> bool:
+    return _TIME_WINDOW.search(text, max(pos - 20, 0), pos) is not None
+
+def _bound(description: str, comparison: str, start: int) -> Tuple[bool, bool]:
+    # Whether a comparison is an upper bound and whether it is strict; a negated one is the
+    # inclusive bound on the other side ("not more than 5" is "at most 5")
+    words = comparison.lower()
+    negated = words.startswith(("not ", "no "))
+    if negated:
+        words = words.split(" ", 1)[1]
+    else:
+        negated = _NEGATION.search(description, max(start - 12, 0), start) is not None
+    upper = _UPPER.search(words) is not None
+    if negated:
+        return not upper, False
+    return upper, _STRICT.search(words) is not None
+
+def _qualified(match: re.Match, description: str) -> bool:
+    # "5 years of experience in healthcare projects" is not the same fact as years in business
+    if match.re is _YEARS_RULE and not _GENERAL_EXPERIENCE.fullmatch(match.group(5)):
+        return True
+    if match.re is _HEADCOUNT_RULE and _SPECIFIC_STAFF.search(match.group(0)):
+        return True
+    return _QUALIFIER.match(description, match.end(), _clause_end(description, match.end())) is not None
+
+def _thresholds(pattern: re.Pattern, description: str) -> Optional[Set[Tuple[float, bool, bool]]]:
+    # Only numbers tied to a comparison ("at least 5", "5+", "5 or more") are thresholds;
+    # None if one of them is qualified
+    thresholds = set()
+    for match in pattern.finditer(description):
+        comparison, number, plus, or_more = match.groups()[:4]
+        if not (comparison or plus or or_more) or _time_window(description, match.start()):
+            continue
+        if _qualified(match, description):
+            return None
+        if comparison:
+            upper, strict = _bound(description, comparison, match.start(1))
+        else:
+            upper, strict = bool(or_more and not or_more.rstrip().lower().endswith("more")), False
+        thresholds.add((_number(number), upper, strict))
+    return thresholds
+
+def _bounded_rule(fact: str, value: float, upper: bool, strict: bool, currency: Optional[str] = None) -> Rule:
+    if upper:
+        return Rule(fact, maximum=value, strict=strict, currency=currency)
+    return Rule(fact, minimum=value, strict=strict, currency=currency)
+
+def extract_company_facts(text: str, today: Optional[datetime.date] = None) -> CompanyFacts:
+    """
+    Extract the facts quantitative criteria are usually about from a company profile.
+
+    Where a profile states a fact several times (e.g. turnover per year),
+    the largest value is kept. Revenue is only kept with its currency; if
+    the profile states it in several currencies, it is left for the model.
+
+    Args:
+        text: Company profile text
+        today: Reference date for "founded in <year>" statements
+
+    Returns:
+        CompanyFacts: Years of experience, headcount, revenue, certifications and locations
+    """
+    facts = CompanyFacts()
+    year = (today or datetime.date.today()).year
+
+    years = [_number(m.group(1)) for m in _YEARS.finditer(text) if not _time_window(text, m.start())]
+    years += [year - int(m.group(1)) for m in _FOUNDED.finditer(text) if int(m.group(1)) <= year]
+    if years:
+        facts.years_experience = max(years)
+
+    headcounts = [int(_number(m.group(1) or m.group(2))) for m in _HEADCOUNT.finditer(text)]
+    if headcounts:
+        facts.headcount = max(headcounts)
+
+    # The first amount in the revenue keyword's clause, skipping growth rates and years
+    revenues = []
+    for keyword in _REVENUE.finditer(text):
+        end = _clause_end(text, keyword.end())
+        amount = next(filter(None, map(_parse_amount, _AMOUNT.finditer(text, keyword.end(), end))), None)
+        if amount is not None:
+            revenues.append(amount)
+    currencies = {currency for _, currency in revenues if currency}
+    if len(currencies) == 1:
+        facts.revenue_currency = currencies.pop()
+        facts.revenue = max(value for value, currency in revenues if currency == facts.revenue_currency)
+    elif revenues and not currencies:
+        facts.revenue = max(value for value, _ in revenues)
+
+    for pattern, name in _CERTIFICATIONS:
+        facts.certifications.update(name(m) for m in pattern.finditer(text))
+
+    for m in _LOCATIONS.finditer(text):
+        facts.locations.update(place.strip().lower() for place in _LOCATION_SPLIT.split(m.group(1)) if place.strip())
+
+    return facts
+
+def parse_rule(description: str) -> Optional[Rule]:
+    """
+    Recognize criteria that can be checked against extracted facts.
+
+    Thresholds must follow a comparison: a minimum ("at least", "exceed",
+    "5+", "or more") or a maximum ("not more than", "up to", "below");
+    criteria with no such threshold, with several different ones, or with
+    a qualifier ("in healthcare projects", "certified engineers") are left
+    to the model. Certification criteria require every certification they
+    name.
+
+    Args:
+        description: Criterion description
+
+    Returns:
+        The rule expressed by the criterion, or None if it needs the model
+    """
+    certifications = sorted(
+        (match.start(), match.end(), name(match)) for pattern, name in _CERTIFICATIONS for match in pattern.finditer(description)
+    )
+    if certifications:
+        # "ISO 9001 or ISO 27001" accepts either, which a set of required members cannot express
+        if _ALTERNATIVE.search(description, certifications[0][1], certifications[-1][0]):
+            return None
+        return Rule("certifications", members=tuple(dict.fromkeys(name for _, _, name in certifications)))
+
+    for fact, pattern in (("years_experience", _YEARS_RULE), ("headcount", _HEADCOUNT_RULE)):
+        thresholds = _thresholds(pattern, description)
+        if thresholds is not None and len(thresholds) == 1:
+            return _bounded_rule(fact, *thresholds.pop())
+        if thresholds is None or thresholds or pattern.search(description):
+            return None
+
+    keyword = _REVENUE.search(description)
+    if keyword:
+        end = _clause_end(description, keyword.end())
+        amounts = set()
+        for comparison in _COMPARISON_WORDS.finditer(description, keyword.end(), end):
+            match = _AMOUNT.match(description, comparison.end(), end)
+            amount = _parse_amount(match) if match else None
+            if amount is not None:
+                amounts.add((*amount, *_bound(description, comparison.group(1), comparison.start(1))))
+        if len(amounts) != 1:
+            return None
+        value, currency, upper, strict = amounts.pop()
+        return _bounded_rule("revenue", value, upper, strict, currency)
+
+    match = _LOCATIONS.search(description)
+    if match and not _LOCATION_SPLIT.search(match.group(1)):
+        return Rule("locations", members=(match.group(1).strip().lower(),))
+
+    return None
+
+def evaluate_rule(rule: Rule, facts: CompanyFacts) -> Optional[CriterionEvaluation]:
+    """
+    Answer a rule from the facts of a profile.
+
+    A missing required member is not treated as a failure, since the
+    profile may describe it in words the extraction does not recognize.
+    Revenue is only compared when the criterion and the profile state the
+    same currency.
+
+    Args:
+        rule: Rule parsed from a criterion
+        facts: Facts extracted from the company profile
+
+    Returns:
+        The judgment, or None if the facts cannot settle the rule
+    """
+    if rule.members:
+        if set(rule.members) <= getattr(facts, rule.fact):
+            return CriterionEvaluation(Status.FULLY_MEETS, f"profile lists {', '.join(rule.members)}")
+        return None
+
+    value = getattr(facts, rule.fact)
+    if value is None:
+        return None
+    if rule.fact == "revenue" and (rule.currency is None or rule.currency != facts.revenue_currency):
+        return None
+    if rule.maximum is not None:
+        meets = value < rule.maximum if rule.strict else value <= rule.maximum
+        required = f"{'less than' if rule.strict else 'at most'} {rule.maximum:,.12g}"
+    else:
+        meets = value > rule.minimum if rule.strict else value >= rule.minimum
+        required = f"{'more than' if rule.strict else 'at least'} {rule.minimum:,.12g}"
+    unit = f" {rule.currency.upper()}" if rule.currency else ""
+    return CriterionEvaluation(
+        Status.FULLY_MEETS if meets else Status.DOES_NOT_MEET,
+        f"profile states {_FACT_LABELS[rule.fact]} of {value:,.12g}{unit}, required {required}{unit}"
+    )
+
+class CapabilityIndex:
+    """
+    On-disk index of the facts extracted from each company profile.
+
+    Facts are extracted once per profile text and stored under
+    ``<hash>-v<version>.json``, so later evaluations of the same profile
+    only parse the criteria.
+    """
+
+    def __init__(self, directory: str = os.path.join(DEFAULT_CACHE_DIR, "capabilities")):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def facts_for(self, company_chunks: List[str]) -> CompanyFacts:
+        """
+        Get the facts of a profile, extracting them on first use.
+
+        Args:
+            company_chunks: Company profile chunks
+
+        Returns:
+            CompanyFacts: Facts of the profile
+        """
+        text = "\n\n".join(company_chunks)
+        path = os.path.join(self.directory, f"{chunk_hash(text)}-v{_FACTS_VERSION}.json")
+        try:
+            with open(path, "r", encoding="utf-8") as file:
+                return CompanyFacts.from_dict(json.load(file))
+        except (FileNotFoundError, json.JSONDecodeError, KeyError):
+            pass
+
+        facts = extract_company_facts(text)
+        # Write to a temporary file first so readers never see a partial result
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as file:
+            json.dump(facts.to_dict(), file)
+        os.replace(tmp_path, path)
+        return facts
+
+    def resolve(self, criteria: List[Dict[str, str]], company_chunks: List[str], indices: Optional[List[int]] = None) -> Dict[int, CriterionEvaluation]:
+        """
+        Answer the criteria the rules can settle for one profile.
+
+        Args:
+            criteria: Eligibility criteria
+            company_chunks: Company profile chunks
+            indices: Criteria to consider (defaults to all)
+
+        Returns:
+            Judgments keyed by criterion index
+        """
+        facts = self.facts_for(company_chunks)
+        resolved = {}
+        for i in range(len(criteria)) if indices is None else indices:
+            rule = parse_rule(criteria[i]["description"])
+            judgment = evaluate_rule(rule, facts) if rule else None
+            if judgment is not None:
+                resolved[i] = judgment
+        return resolved
+
+def evaluate_with_rules(
+    model: Any,
+    tokenizer: PreTrainedTokenizerBase,
+    criteria: List[Dict[str, str]],
+    company_profiles: Dict[str, List[str]],
+    index: CapabilityIndex,
+    batch_size: int = 8,
+    cancel_token: Optional[CancellationToken] = None
+) -> Tuple[Dict[str, str], Dict[str, Any]]:
+    """
+    Evaluate company profiles, answering quantitative criteria from extracted facts.
+
+    Only criteria the rules cannot settle are sent to the model, in one
+    batched pass over all profiles.
+
+    Args:
+        model: The language model
+        tokenizer: The tokenizer for the model
+        criteria: Eligibility criteria of the current RFP
+        company_profiles: Company profile chunks keyed by profile name
+        index: Index of extracted company facts
+        batch_size: Number of profiles evaluated in one batched pass
+        cancel_token: Cancels the evaluation or sets its deadline
+
+    Returns:
+        Evaluations keyed by profile name, and run statistics with "criteria",
+        "rule_resolved" and "evaluated"
+    """
+    resolved = {name: index.resolve(criteria, chunks) for name, chunks in company_profiles.items()}
+    open_criteria = {name: [i for i in range(len(criteria)) if i not in resolved[name]] for name in company_profiles}
+    judged = evaluate_open_criteria(model, tokenizer, criteria, company_profiles, open_criteria, batch_size, cancel_token)
+
+    evaluations = {}
+    for name in company_profiles:
+        items = {**judged[name], **resolved[name]}
+        evaluations[name] = format_evaluation(criteria, [items.get(i, CriterionEvaluation()) for i in range(len(criteria))])
+
+    total = len(criteria) * len(company_profiles)
+    rule_resolved = sum(len(items) for items in resolved.values())
+    return evaluations, {"criteria": total, "rule_resolved": rule_resolved, "evaluated": total - rule_resolved}
@@ -0,0 +1,265 @@
+import json
+import os
+import re
+import tempfile
+import threading
+from typing import Any, Dict, FrozenSet, List, Optional, Set, Tuple
+from transformers import PreTrainedTokenizerBase
+from analyzer import evaluate_open_criteria, similarity
+from capability import CapabilityIndex
+from incremental import DEFAULT_CACHE_DIR, chunk_hash
+from model_manager import CancellationToken
+from results import CriterionEvaluation, Status, format_evaluation
+
+# Words too common in requirements to narrow down the candidate entries
+_STOPWORDS = frozenset(
+    "a an and any are as at be by for from has have in is least must of on or shall should "
+    "the their to with within".split()
+)
+_WORD = re.compile(r"[a-z0-9]+")
+# A number and the unit word after it; "5 years" and "10 years" are different requirements
+_QUANTITY = re.compile(r"(\d+(?:[.,]\d+)*)\s*(%|[a-z]+)?")
+_UNITS = {
+    "year": "years", "years": "years", "yr": "years", "yrs": "years",
+    "month": "months", "months": "months",
+    "%": "percent", "percent": "percent",
+    "thousand": "thousand", "k": "thousand",
+    "lakh": "lakh", "lakhs": "lakh", "lac": "lakh", "lacs": "lakh",
+    "million": "million", "millions": "million", "mn": "million",
+    "crore": "crore", "crores": "crore", "cr": "crore",
+    "billion": "billion", "billions": "billion", "bn": "billion"
+}
+_CURRENCY = re.compile(r"[$€£₹]|\b(?:usd|eur|gbp|inr|rs|rupees?|dollars?|euros?|pounds?)\b")
+_CURRENCIES = {"$": "usd", "dollar": "usd", "€": "eur", "euro": "eur", "£": "gbp", "pound": "gbp", "₹": "inr", "rs": "inr", "rupee": "inr"}
+# Standard and scheme identifiers: ISO, IEC, CMMI, SOC, ITIL, GST...
+_IDENTIFIER = re.compile(r"\b[A-Z][A-Z0-9/-]{1,}\b")
+# Places, agencies and other names: "an office in Delhi" is not "an office in Mumbai"
+_PROPER_NOUN = re.compile(r"\b[A-Z][a-z][\w-]*")
+_SENTENCE_END = (".", "!", "?", ":", ";")
+# "must not be blacklisted" and "must be blacklisted" differ in one word
+_NEGATION = re.compile(r"\b(?:not|no|never|non|without|neither|nor|cannot)\b|n't\b")
+
+def _proper_nouns(description: str) -> FrozenSet[str]:
+    # A capitalized word that does not open a sentence
+    return frozenset(
+        match.group(0).lower() for match in _PROPER_NOUN.finditer(description)
+        if description[:match.start()].strip() and not description[:match.start()].rstrip().endswith(_SENTENCE_END)
+        and match.group(0).lower() not in _STOPWORDS
+    )
+
+def criterion_signature(description: str) -> Tuple[FrozenSet[Tuple[str, str]], FrozenSet[str], FrozenSet[str], FrozenSet[str], bool]:
+    """
+    Extract the numbers, units, currencies, identifiers, names and negation of a criterion.
+
+    Word overlap cannot tell "ISO 9001" from "ISO 14001", "5 years" from
+    "10 years", "in Delhi" from "in Mumbai" or "must not be" from "must be";
+    two criteria are only the same requirement if these agree.
+
+    Args:
+        description: Criterion description
+
+    Returns:
+        The (number, unit) pairs, currencies, identifiers and proper nouns of
+        the description, and whether it is negated
+    """
+    lowered = description.lower()
+    quantities = frozenset(
+        (number.replace(",", ""), _UNITS.get(unit or "", ""))
+        for number, unit in _QUANTITY.findall(lowered)
+    )
+    currencies = frozenset(
+        _CURRENCIES.get(match, _CURRENCIES.get(match.rstrip("s"), match)) for match in _CURRENCY.findall(lowered)
+    )
+    identifiers = frozenset(
+        word.lower() for word in _IDENTIFIER.findall(description)
+        if word.lower() not in _STOPWORDS and not word.isdigit()
+    )
+    return quantities, currencies, identifiers, _proper_nouns(description), _NEGATION.search(lowered) is not None
+
+class CriteriaCatalog:
+    """
+    Persistent catalog of canonical eligibility criteria and their cached evaluations.
+
+    Requirements like "ISO 9001 certification" recur across RFPs in slightly
+    different words. Each extracted criterion is mapped to a canonical entry
+    through an inverted word index and the analyzer's similarity measure,
+    provided both state the same numbers, units, currencies, standard
+    identifiers and names, and both or neither are negated; unmatched
+    criteria become new entries. Evaluations are cached per company
+    profile (keyed by the hash of its text) and canonical entry, so a profile
+    is only asked about criteria it has not been judged against before.
+    """
+
+    def __init__(self, directory: str = os.path.join(DEFAULT_CACHE_DIR, "catalog"), threshold: float = 0.7):
+        self.directory = directory
+        self.threshold = threshold
+        self.lock = threading.Lock()
+        os.makedirs(os.path.join(directory, "evaluations"), exist_ok=True)
+
+        self.entries = self._read(os.path.join(directory, "catalog.json")) or {}
+        self.index = {}
+        for entry_id, entry in self.entries.items():
+            self._index(entry_id, entry["description"])
+
+    def _read(self, path: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(path, "r", encoding="utf-8") as file:
+                return json.load(file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def _write(self, path: str, data: Dict[str, Any]) -> None:
+        # Write to a temporary file first so readers never see a partial catalog
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as file:
+            json.dump(data, file)
+        os.replace(tmp_path, path)
+
+    def _keywords(self, description: str) -> Set[str]:
+        return {word for word in _WORD.findall(description.lower()) if word not in _STOPWORDS}
+
+    def _index(self, entry_id: str, description: str) -> None:
+        for word in self._keywords(description):
+            self.index.setdefault(word, set()).add(entry_id)
+
+    def find(self, description: str) -> Optional[str]:
+        """
+        Find the canonical entry of a criterion.
+
+        Args:
+            description: Criterion description
+
+        Returns:
+            The id of the most similar entry above the threshold with the same
+            signature, or None
+        """
+        desc = description.lower()
+        signature = criterion_signature(description)
+        candidates = set()
+        for word in self._keywords(desc):
+            candidates |= self.index.get(word, set())
+
+        best_id, best_score = None, self.threshold
+        for entry_id in candidates:
+            if criterion_signature(self.entries[entry_id]["description"]) != signature:
+                continue
+            score = similarity(desc, self.entries[entry_id]["description"].lower())
+            if score > best_score:
+                best_id, best_score = entry_id, score
+        return best_id
+
+    def canonicalize(self, criteria: List[Dict[str, str]]) -> Tuple[List[str], int]:
+        """
+        Map criteria to canonical entries, adding entries for novel criteria.
+
+        Args:
+            criteria: Extracted eligibility criteria
+
+        Returns:
+            The canonical id of each criterion and the number of entries added
+        """
+        ids = []
+        added = 0
+        with self.lock:
+            for criterion in criteria:
+                entry_id = self.find(criterion["description"])
+                if entry_id is None:
+                    entry_id = chunk_hash(criterion["description"].lower())[:16]
+                    self.entries[entry_id] = {"description": criterion["description"], "importance": criterion["importance"]}
+                    self._index(entry_id, criterion["description"])
+                    added += 1
+                ids.append(entry_id)
+            if added:
+                self._write(os.path.join(self.directory, "catalog.json"), self.entries)
+        return ids, added
+
+    def get_evaluations(self, profile_hash: str) -> Dict[str, Dict[str, str]]:
+        return self._read(os.path.join(self.directory, "evaluations", f"{profile_hash}.json")) or {}
+
+    def put_evaluations(self, profile_hash: str, evaluations: Dict[str, Dict[str, str]]) -> None:
+        with self.lock:
+            cached = self.get_evaluations(profile_hash)
+            cached.update(evaluations)
+            self._write(os.path.join(self.directory, "evaluations", f"{profile_hash}.json"), cached)
+
+def evaluate_with_catalog(
+    model: Any,
+    tokenizer: PreTrainedTokenizerBase,
+    criteria: List[Dict[str, str]],
+    company_profiles: Dict[str, List[str]],
+    catalog: CriteriaCatalog,
+    batch_size: int = 8,
+    cancel_token: Optional[CancellationToken] = None,
+    capabilities: Optional[CapabilityIndex] = None
+) -> Tuple[Dict[str, str], Dict[str, Any]]:
+    """
+    Evaluate company profiles, sending only criteria without a cached evaluation to the model.
+
+    Cached and new judgments are combined into one evaluation per profile,
+    numbered like the criteria list, so determine_verdict and
+    build_criteria_matrix work on it unchanged.
+
+    Args:
+        model: The language model
+        tokenizer: The tokenizer for the model
+        criteria: Eligibility criteria of the current RFP
+        company_profiles: Company profile chunks keyed by profile name
+        catalog: Catalog holding canonical criteria and cached evaluations
+        batch_size: Number of profiles evaluated in one batched pass
+        cancel_token: Cancels the evaluation or sets its deadline
+        capabilities: Index of company facts used to answer quantitative
+            criteria that are not cached before asking the model
+
+    Returns:
+        Evaluations keyed by profile name, and run statistics with "criteria",
+        "cached", "rule_resolved", "evaluated", "new_canonical" and "hit_rate"
+    """
+    canonical_ids, added = catalog.canonicalize(criteria)
+
+    cached_by_profile = {}
+    resolved = {}
+    open_criteria = {}
+    for name, chunks in company_profiles.items():
+        profile_hash = chunk_hash("\n\n".join(chunks))
+        cached = catalog.get_evaluations(profile_hash)
+        cached_by_profile[name] = (profile_hash, cached)
+        missing = [i for i, entry_id in enumerate(canonical_ids) if entry_id not in cached]
+        # Rules answer quantitative criteria without the model; their results are cheap to recompute
+        resolved[name] = capabilities.resolve(criteria, chunks, missing) if capabilities else {}
+        open_criteria[name] = [i for i in missing if i not in resolved[name]]
+
+    judged = evaluate_open_criteria(model, tokenizer, criteria, company_profiles, open_criteria, batch_size, cancel_token)
+    # Judgments cut short by the deadline are used for this run but never cached
+    cacheable = cancel_token is None or not cancel_token.expired
+
+    evaluations = {}
+    hits = 0
+    for name in company_profiles:
+        profile_hash, cached = cached_by_profile[name]
+        fresh = {
+            canonical_ids[i]: {"status": item.status.value, "text": item.text}
+            for i, item in judged[name].items() if item.status != Status.UNCLEAR
+        }
+        if fresh and cacheable:
+            catalog.put_evaluations(profile_hash, fresh)
+
+        items = []
+        for i, entry_id in enumerate(canonical_ids):
+            if entry_id in cached:
+                items.append(CriterionEvaluation(Status(cached[entry_id]["status"]), cached[entry_id]["text"]))
+                hits += 1
+            else:
+                items.append(resolved[name].get(i) or judged[name].get(i) or CriterionEvaluation())
+        evaluations[name] = format_evaluation(criteria, items)
+
+    total = len(criteria) * len(company_profiles)
+    rule_resolved = sum(len(items) for items in resolved.values())
+    stats = {
+        "criteria": total,
+        "cached": hits,
+        "rule_resolved": rule_resolved,
+        "evaluated": total - hits - rule_resolved,
+        "new_canonical": added,
+        "hit_rate": hits / total if total else 0.0
+    }
+    return evaluations, stats
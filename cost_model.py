@@ -0,0 +1,343 @@
+import argparse
+import json
+import math
+import os
+import tempfile
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+from analyzer import pack_sizes
+from incremental import DEFAULT_CACHE_DIR
+from model_manager import MAX_INPUT_TOKENS, NEW_TOKENS
+
+DEFAULT_COST_MODEL_PATH = os.environ.get("RFP_COST_MODEL_PATH", os.path.join(DEFAULT_CACHE_DIR, "cost_model.json"))
+
+CHARS_PER_TOKEN = 4
+# Conservative CPU defaults for a small model, used until the machine has been measured
+DEFAULT_PREFILL_TOKENS_PER_SECOND = 400.0
+DEFAULT_DECODE_TOKENS_PER_SECOND = 15.0
+# Instruction preamble of each stage's prompt, in characters
+_TEMPLATE_CHARS = {"summarize": 80, "extract": 190, "merge": 110, "evaluate": 330}
+_CRITERION_CHARS = 80
+# Section label and separator around each chunk of a packed prompt
+_SECTION_LABEL_TOKENS = 6
+# Criteria per RFP assumed before they have been extracted
+_EXPECTED_CRITERIA = 12
+# Weight of the latest run when calibrating a stage
+_CALIBRATION_RATE = 0.3
+
+@dataclass(slots=True)
+class StageEstimate:
+    stage: str
+    calls: int
+    prompt_tokens: int
+    new_tokens: int
+    seconds: float
+
+class CostModel:
+    """
+    Predicts the token count and wall time of each analysis stage.
+
+    A stage's time is its prompt tokens over the prefill rate plus its
+    generated tokens over the decode rate, where a batched call decodes its
+    prompts together. The rates are measured per model on this machine (see
+    model_manager.measure_token_rates). Every finished stage then updates a
+    per-stage correction factor from the ratio of actual to predicted time,
+    so predictions converge on this machine's behaviour over past runs.
+    """
+
+    def __init__(self, model_name: str, path: str = DEFAULT_COST_MODEL_PATH):
+        self.model_name = model_name
+        self.path = path
+        self.lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+        profile = self._read().get(model_name, {})
+        self.prefill_tokens_per_second = profile.get("prefill_tokens_per_second", DEFAULT_PREFILL_TOKENS_PER_SECOND)
+        self.decode_tokens_per_second = profile.get("decode_tokens_per_second", DEFAULT_DECODE_TOKENS_PER_SECOND)
+        self.scales = profile.get("scales", {})
+        self.runs = profile.get("runs", 0)
+        self.measured = "prefill_tokens_per_second" in profile
+
+    def _read(self) -> Dict[str, Any]:
+        try:
+            with open(self.path, "r", encoding="utf-8") as file:
+                return json.load(file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _save(self) -> None:
+        data = self._read()
+        data[self.model_name] = {
+            "prefill_tokens_per_second": self.prefill_tokens_per_second,
+            "decode_tokens_per_second": self.decode_tokens_per_second,
+            "scales": self.scales,
+            "runs": self.runs
+        }
+        # Write to a temporary file first so readers never see a partial profile
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(self.path) or ".", suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as file:
+            json.dump(data, file)
+        os.replace(tmp_path, self.path)
+
+    def set_rates(self, rates: Dict[str, float]) -> None:
+        """
+        Store measured throughput for this model.
+
+        Args:
+            rates: Result of model_manager.measure_token_rates
+        """
+        with self.lock:
+            self.prefill_tokens_per_second = rates["prefill_tokens_per_second"]
+            self.decode_tokens_per_second = rates["decode_tokens_per_second"]
+            self.measured = True
+            self._save()
+
+    def predict(self, stage: str, prompt_chars: Sequence[int], batch_size: int = 1, sections: Optional[Sequence[int]] = None) -> StageEstimate:
+        """
+        Predict the cost of one stage.
+
+        Args:
+            stage: Stage name ("summarize", "extract", "merge", "evaluate", or any
+                other name calibrated through observe)
+            prompt_chars: Characters of variable content in each prompt
+            batch_size: Prompts generated together in one call
+            sections: Chunks packed into each prompt, each with its own output
+                budget (defaults to one per prompt)
+
+        Returns:
+            StageEstimate: Calls, tokens and seconds of the stage
+        """
+        template_tokens = _TEMPLATE_CHARS.get(stage, 0) // CHARS_PER_TOKEN
+        prompt_tokens = sum(min(chars // CHARS_PER_TOKEN + template_tokens, MAX_INPUT_TOKENS) for chars in prompt_chars)
+        sections = list(sections) if sections is not None else [1] * len(prompt_chars)
+        calls = math.ceil(len(prompt_chars) / batch_size)
+        # A batched call decodes its prompts together, for as long as its largest output budget
+        decode_steps = sum(max(sections[i:i + batch_size]) * NEW_TOKENS for i in range(0, len(sections), batch_size))
+        seconds = prompt_tokens / self.prefill_tokens_per_second + decode_steps / self.decode_tokens_per_second
+        return StageEstimate(
+            stage=stage,
+            calls=calls,
+            prompt_tokens=prompt_tokens,
+            new_tokens=sum(sections) * NEW_TOKENS,
+            seconds=seconds * self.scales.get(stage, 1.0)
+        )
+
+    def predict_analysis(
+        self,
+        chunk_chars: Sequence[int],
+        extract_chunk_chars: Sequence[int],
+        profile_chars: Sequence[int],
+        batch_size: int = 8,
+        criteria_count: Optional[int] = None,
+        packed: bool = True
+    ) -> List[StageEstimate]:
+        """
+        Predict every stage of an analysis.
+
+        Args:
+            chunk_chars: Characters of each RFP chunk to summarize
+            extract_chunk_chars: Characters of each chunk criteria are extracted from
+            profile_chars: Characters of each company profile
+            batch_size: Profiles evaluated in one batched call
+            criteria_count: Number of criteria, if already known
+            packed: Whether adjacent small chunks share a prompt, as in
+                analyzer.summarize_rfp and analyzer.extract_eligibility_criteria
+
+        Returns:
+            Estimates of the "summarize", "extract", "merge" and "evaluate" stages
+        """
+        criteria_chars = (criteria_count if criteria_count is not None else _EXPECTED_CRITERIA) * _CRITERION_CHARS
+        merge_chars = [len(chunk_chars) * NEW_TOKENS * CHARS_PER_TOKEN] if len(chunk_chars) > 1 else []
+        summarize_sections = extract_sections = None
+        if packed:
+            chunk_chars, summarize_sections = self._pack("summarize", chunk_chars)
+            extract_chunk_chars, extract_sections = self._pack("extract", extract_chunk_chars)
+        return [
+            self.predict("summarize", chunk_chars, sections=summarize_sections),
+            self.predict("extract", extract_chunk_chars, sections=extract_sections),
+            self.predict("merge", merge_chars),
+            self.predict("evaluate", [chars + criteria_chars for chars in profile_chars], batch_size)
+        ]
+
+    def _pack(self, stage: str, chunk_chars: Sequence[int]) -> Tuple[List[int], List[int]]:
+        budget = MAX_INPUT_TOKENS - _TEMPLATE_CHARS[stage] // CHARS_PER_TOKEN
+        groups = pack_sizes([chars // CHARS_PER_TOKEN + _SECTION_LABEL_TOKENS for chars in chunk_chars], budget)
+        return [sum(chunk_chars[i] for i in group) for group in groups], [len(group) for group in groups]
+
+    def observe(self, estimate: StageEstimate, seconds: float) -> None:
+        """
+        Calibrate a stage from the measured time of a completed run.
+
+        Args:
+            estimate: The estimate made for the run, with the scale at the time
+            seconds: Measured wall time of the stage
+        """
+        if estimate.calls == 0 or estimate.seconds <= 0:
+            return
+        with self.lock:
+            scale = self.scales.get(estimate.stage, 1.0)
+            ratio = seconds / (estimate.seconds / scale)
+            self.scales[estimate.stage] = (1 - _CALIBRATION_RATE) * scale + _CALIBRATION_RATE * ratio
+            self.runs += 1
+            self._save()
+
+def choose_sizes(
+    cost_model: CostModel,
+    text_chars: int,
+    profile_chars: Sequence[int],
+    target_seconds: float,
+    chunk_sizes: Sequence[int] = (500, 1000, 1500, 2000),
+    batch_sizes: Sequence[int] = (1, 2, 4, 8, 16)
+) -> Dict[str, Any]:
+    """
+    Choose chunk and batch sizes for a document to finish within a target latency.
+
+    Smaller chunks and batches are preferred, since they keep prompts within
+    the input window and memory low; the smallest combination predicted to
+    meet the target wins. If none does, the fastest combination is returned.
+
+    Args:
+        cost_model: Calibrated cost model of the model in use
+        text_chars: Characters of the RFP text
+        profile_chars: Characters of each company profile
+        target_seconds: Target wall time of the whole analysis
+        chunk_sizes: Candidate maximum chunk sizes, in characters
+        batch_sizes: Candidate evaluation batch sizes
+
+    Returns:
+        Dict with "chunk_size", "batch_size", "seconds" and "meets_target"
+    """
+    best = None
+    for chunk_size in sorted(chunk_sizes):
+        chunks = max(math.ceil(text_chars / chunk_size), 1)
+        chunk_chars = [min(chunk_size, text_chars)] * chunks
+        for batch_size in sorted(batch_sizes):
+            seconds = sum(e.seconds for e in cost_model.predict_analysis(chunk_chars, chunk_chars, profile_chars, batch_size))
+            if seconds <= target_seconds:
+                return {"chunk_size": chunk_size, "batch_size": batch_size, "seconds": seconds, "meets_target": True}
+            if best is None or seconds < best["seconds"]:
+                best = {"chunk_size": chunk_size, "batch_size": batch_size, "seconds": seconds, "meets_target": False}
+    return best
+
+class ProgressTracker:
+    """
+    Reports progress and ETA of an analysis across its stages.
+
+    Progress is weighted by each stage's predicted time. The ETA rescales
+    the remaining predicted time by how fast the run has been so far
+    relative to its prediction. Completed stages calibrate the cost model.
+    """
+
+    def __init__(
+        self,
+        cost_model: CostModel,
+        estimates: List[StageEstimate],
+        on_update: Callable[[float, float, str], None]
+    ):
+        self.cost_model = cost_model
+        self.estimates = {e.stage: e for e in estimates}
+        self.total = sum(e.seconds for e in estimates) or 1.0
+        self.on_update = on_update
+        self.start = time.perf_counter()
+        self.done_seconds = 0.0
+        self.stage = None
+        self.stage_start = 0.0
+
+    def start_stage(self, stage: str, message: str = "") -> None:
+        self.stage = stage
+        self.stage_start = time.perf_counter()
+        self._report(0.0, message or stage.capitalize())
+
+    def advance(self, done: int, total: int, message: str = "") -> None:
+        """
+        Report completion within the current stage.
+
+        Args:
+            done: Items of the stage completed, e.g. chunks
+            total: Items in the stage
+            message: Progress text, e.g. "Summarizing chunk 3 of 20"
+        """
+        self._report(done / total if total else 1.0, message)
+
+    def finish_stage(self, observe: bool = True) -> None:
+        """
+        Mark the current stage complete.
+
+        Args:
+            observe: Calibrate the cost model from the stage's measured time;
+                disable for stages cut short or served from caches
+        """
+        estimate = self.estimates.get(self.stage)
+        if estimate is not None:
+            if observe:
+                self.cost_model.observe(estimate, time.perf_counter() - self.stage_start)
+            self.done_seconds += estimate.seconds
+        self.stage = None
+        self._report(0.0, "")
+
+    def _report(self, stage_fraction: float, message: str) -> None:
+        estimate = self.estimates.get(self.stage)
+        predicted_done = self.done_seconds + (estimate.seconds * stage_fraction if estimate else 0.0)
+        elapsed = time.perf_counter() - self.start
+        remaining = max(self.total - predicted_done, 0.0)
+        # Once some predicted work is done, correct the rest by the observed speed
+        eta = remaining * elapsed / predicted_done if predicted_done > 0 else remaining
+        self.on_update(min(predicted_done / self.total, 1.0), eta, message)
+
+def format_duration(seconds: float) -> str:
+    """
+    Format a duration for progress messages.
+
+    Args:
+        seconds: Duration in seconds
+
+    Returns:
+        str: E.g. "45s", "3m 20s" or "1h 05m"
+    """
+    seconds = int(round(seconds))
+    if seconds < 60:
+        return f"{seconds}s"
+    if seconds < 3600:
+        return f"{seconds // 60}m {seconds % 60:02d}s"
+    return f"{seconds // 3600}h {seconds % 3600 // 60:02d}m"
+
+def main() -> None:
+    from document_processor import parse_document
+    from model_manager import load_model, load_tokenizer, measure_token_rates
+
+    parser = argparse.ArgumentParser(description="Predict analysis time and choose chunk and batch sizes for a target latency.")
+    parser.add_argument("rfp", help="RFP document")
+    parser.add_argument("profiles", nargs="*", help="Company profile documents")
+    parser.add_argument("--model", default="facebook/opt-125m")
+    parser.add_argument("--target-seconds", type=float, default=600.0)
+    parser.add_argument("--measure", action="store_true", help="Measure this machine's token rates first (loads the model)")
+    args = parser.parse_args()
+
+    cost_model = CostModel(args.model)
+    if args.measure or not cost_model.measured:
+        model = load_model(args.model)
+        cost_model.set_rates(measure_token_rates(model, load_tokenizer(args.model)))
+        del model
+    print(
+        f"Rates: {cost_model.prefill_tokens_per_second:.0f} prefill tokens/s, "
+        f"{cost_model.decode_tokens_per_second:.1f} decode tokens/s, calibrated over {cost_model.runs} stage runs"
+    )
+
+    text_chars = len(parse_document(args.rfp))
+    profile_chars = [len(parse_document(path)) for path in args.profiles] or [0]
+    choice = choose_sizes(cost_model, text_chars, profile_chars, args.target_seconds)
+    chunk_chars = [choice["chunk_size"]] * max(math.ceil(text_chars / choice["chunk_size"]), 1)
+
+    print(f"{'stage':<12}{'calls':>8}{'prompt tok':>12}{'new tok':>10}{'seconds':>10}")
+    for estimate in cost_model.predict_analysis(chunk_chars, chunk_chars, profile_chars, choice["batch_size"]):
+        print(f"{estimate.stage:<12}{estimate.calls:>8}{estimate.prompt_tokens:>12}{estimate.new_tokens:>10}{estimate.seconds:>10.1f}")
+    status = "meets" if choice["meets_target"] else "misses"
+    print(
+        f"Chunk size {choice['chunk_size']}, batch size {choice['batch_size']}: "
+        f"{format_duration(choice['seconds'])}, {status} the {format_duration(args.target_seconds)} target"
+    )
+
+if __name__ == "__main__":
+    main()
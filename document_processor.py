@@ -1,6 +1,19 @@
+import codecs
+from array import array
+from dataclasses import dataclass
+import io
+import mmap
+import multiprocessing
 import os
 import re
-from typing import List, Optional
+import sys
+import types
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from typing import BinaryIO, Iterable, Iterator, List, Optional, Tuple, Union
+from xml.etree import ElementTree
+from profiler import begin_stage
 
 def parse_document(file_path: str) -> str:
     """
@@ -23,84 +36,607 @@ def parse_document(file_path: str) -> str:
     else:
         raise ValueError(f"Unsupported file format: {file_extension}")
 
-def parse_pdf(file_path: str) -> str:
+def parse_pdf(file_path: str, normalize: bool = True) -> str:
     """
     Extract text from PDF files.
     
     Args:
         file_path: Path to the PDF file
+        normalize: Whether to collapse whitespace; chunk_text normalizes
+            the raw text itself
         
     Returns:
         str: Extracted text from the PDF
     """
+    with open(file_path, 'rb') as file:
+        return _extract_pdf_text(file, normalize)
+
+def _extract_pdf_text(file: BinaryIO, normalize: bool = True) -> str:
     try:
         import PyPDF2
         
-        extracted_text = ""
-        
-        with open(file_path, 'rb') as file:
-            pdf_reader = PyPDF2.PdfReader(file)
-            num_pages = len(pdf_reader.pages)
-            
-            for page_num in range(num_pages):
-                page = pdf_reader.pages[page_num]
-                extracted_text += page.extract_text() + "\n\n"
+        pdf_reader = PyPDF2.PdfReader(file)
+        extracted_text = "\n\n".join(page.extract_text() for page in pdf_reader.pages)
+        if not normalize:
+            return extracted_text
         
-        # Clean up text: remove excessive whitespace
-        cleaned_text = re.sub(r'\s+', ' ', extracted_text).strip()
-        return cleaned_text
+        # Clean up text: remove excessive whitespace and words hyphenated across lines
+        return normalize_whitespace(extracted_text).strip()
     
     except ImportError:
         raise ImportError("Unable to process PDF files. Please install PyPDF2.")
 
+def parse_document_bytes(data: bytes, name: str, normalize: bool = True) -> str:
+    """
+    Parse a document held in memory, e.g. a member of an archive.
+    
+    Args:
+        data: Raw bytes of the document
+        name: File name, used to determine the format
+        normalize: Whether to collapse the whitespace of PDF text; chunk_text
+            normalizes the raw text itself
+        
+    Returns:
+        str: Extracted text from the document
+    """
+    file_extension = os.path.splitext(name)[1].lower()
+    
+    if file_extension == '.pdf':
+        return _extract_pdf_text(io.BytesIO(data), normalize)
+    elif file_extension == '.docx':
+        return '\n'.join(iter_docx_blocks(io.BytesIO(data)))
+    elif file_extension == '.txt':
+        return data.decode(detect_encoding(data[:1 << 16]), errors='replace')
+    else:
+        raise ValueError(f"Unsupported file format: {file_extension}")
+
 def parse_docx(file_path: str) -> str:
     """
     Extract text from DOCX files.
     
+    Paragraphs and table rows are returned in document order, one per line.
+    
     Args:
         file_path: Path to the DOCX file
         
     Returns:
         str: Extracted text from the DOCX
     """
-    try:
-        import docx
+    return '\n'.join(iter_docx_blocks(file_path))
+
+# Rough characters per page, used when a format carries no page count
+CHARS_PER_PAGE = 3000
+# word/document.xml holds several times more markup than text
+_DOCX_XML_BYTES_PER_PAGE = 8 * CHARS_PER_PAGE
+
+def count_pages(file_path: str) -> int:
+    """
+    Count or estimate the pages of a document without extracting its text.
+    
+    PDFs report their page tree, DOCX files the page count Word stored in
+    ``docProps/app.xml`` (estimated from the body size when missing), and
+    text files are estimated from their size. Zip packages count the pages
+    of every document they contain.
+    
+    Args:
+        file_path: Path to the document file
         
-        document = docx.Document(file_path)
+    Returns:
+        int: Number of pages (at least 1)
+    """
+    file_extension = os.path.splitext(file_path)[1].lower()
+    
+    if file_extension == '.zip':
+        with zipfile.ZipFile(file_path) as archive:
+            pages = 0
+            for info in list_package_members(archive):
+                with archive.open(info) as member:
+                    pages += _count_pages(member, os.path.splitext(info.filename)[1].lower(), info.file_size)
+            return max(pages, 1)
+    
+    with open(file_path, 'rb') as file:
+        return _count_pages(file, file_extension, os.fstat(file.fileno()).st_size)
+
+def _count_pages(file: BinaryIO, file_extension: str, size: int) -> int:
+    if file_extension == '.pdf':
+        try:
+            import PyPDF2
+        except ImportError:
+            raise ImportError("Unable to process PDF files. Please install PyPDF2.")
+        return max(len(PyPDF2.PdfReader(file).pages), 1)
+    elif file_extension == '.docx':
+        with zipfile.ZipFile(file) as archive:
+            try:
+                with archive.open('docProps/app.xml') as app_file:
+                    for _, elem in ElementTree.iterparse(app_file):
+                        if elem.tag.endswith('}Pages') and (elem.text or '').strip().isdigit():
+                            return max(int(elem.text), 1)
+            except (KeyError, ElementTree.ParseError):
+                pass
+            body_size = archive.getinfo('word/document.xml').file_size
+        return max(-(-body_size // _DOCX_XML_BYTES_PER_PAGE), 1)
+    elif file_extension == '.txt':
+        return max(-(-size // CHARS_PER_PAGE), 1)
+    else:
+        raise ValueError(f"Unsupported file format: {file_extension}")
+
+# WordprocessingML namespace used by word/document.xml
+_W = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+
+def iter_docx_blocks(source: Union[str, BinaryIO]) -> Iterator[str]:
+    """
+    Stream the text blocks of a DOCX file in body order.
+    
+    ``word/document.xml`` is read with incremental XML parsing straight from the
+    archive, and every element is discarded as soon as its text has been
+    emitted, so memory stays bounded regardless of the document size.
+    Horizontally merged cells (``gridSpan``) appear once in the XML and
+    vertically merged continuation cells (``vMerge``) are skipped, so merged
+    cell text is emitted only once.
+    
+    Args:
+        source: Path to the DOCX file or a binary file object
         
-        # Extract text from paragraphs
-        full_text = []
-        for para in document.paragraphs:
-            full_text.append(para.text)
+    Yields:
+        str: Non-empty paragraphs and table rows (cells joined with " | ")
+    """
+    with zipfile.ZipFile(source) as archive:
+        with archive.open('word/document.xml') as xml_file:
+            # Elements currently open, used to drop finished blocks from their parent
+            open_elements = []
+            paragraph = []
+            # One entry per open table: the cells of its current row
+            rows = []
+            # One entry per open cell: its paragraphs, or None for a merge continuation
+            cells = []
+            
+            for event, elem in ElementTree.iterparse(xml_file, events=('start', 'end')):
+                tag = elem.tag
+                
+                if event == 'start':
+                    open_elements.append(elem)
+                    if tag == _W + 'tr':
+                        rows.append([])
+                    elif tag == _W + 'tc':
+                        cells.append([])
+                    elif tag == _W + 'vMerge' and cells:
+                        # A vMerge without "restart" continues the cell above
+                        if elem.get(_W + 'val', 'continue') != 'restart':
+                            cells[-1] = None
+                    continue
+                
+                open_elements.pop()
+                block = None
+                
+                if tag == _W + 't':
+                    paragraph.append(elem.text or '')
+                elif tag == _W + 'tab':
+                    paragraph.append('\t')
+                elif tag in (_W + 'br', _W + 'cr'):
+                    paragraph.append('\n')
+                elif tag == _W + 'p':
+                    text = ''.join(paragraph).strip()
+                    paragraph = []
+                    if cells:
+                        if text and cells[-1] is not None:
+                            cells[-1].append(text)
+                    else:
+                        block = text
+                elif tag == _W + 'tc':
+                    cell = cells.pop()
+                    if cell is not None and rows:
+                        rows[-1].append(' '.join(cell))
+                elif tag == _W + 'tr':
+                    row = [text for text in rows.pop() if text]
+                    text = ' | '.join(row)
+                    if cells:
+                        # Nested table: its rows become part of the enclosing cell
+                        if text and cells[-1] is not None:
+                            cells[-1].append(text)
+                    else:
+                        block = text
+                
+                if tag in (_W + 'p', _W + 'tr', _W + 'tbl'):
+                    elem.clear()
+                    if open_elements:
+                        open_elements[-1].remove(elem)
+                
+                if block:
+                    yield block
+
+def parse_txt(file_path: str) -> str:
+    """
+    Extract text from plain text files.
+    
+    Args:
+        file_path: Path to the text file
         
-        # Extract text from tables
-        for table in document.tables:
-            for row in table.rows:
-                for cell in row.cells:
-                    full_text.append(cell.text)
+    Returns:
+        str: Contents of the text file
+    """
+    return ''.join(iter_text_segments(file_path, normalize=False))
+
+# Byte order marks checked before falling back to content sniffing
+_BOMS = [
+    (codecs.BOM_UTF32_LE, 'utf-32'),
+    (codecs.BOM_UTF32_BE, 'utf-32'),
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+]
+
+def detect_encoding(sample: bytes) -> str:
+    """
+    Detect the text encoding of a file from a prefix sample.
+    
+    Args:
+        sample: First bytes of the file
         
-        return '\n'.join(full_text)
+    Returns:
+        str: Name of a Python codec able to decode the file
+    """
+    for bom, encoding in _BOMS:
+        if sample.startswith(bom):
+            return encoding
     
+    try:
+        # The sample may end in the middle of a multi-byte character
+        codecs.getincrementaldecoder('utf-8')().decode(sample, final=False)
+        return 'utf-8'
+    except UnicodeDecodeError:
+        pass
+    
+    try:
+        from charset_normalizer import from_bytes
+        match = from_bytes(sample).best()
+        if match is not None:
+            return match.encoding
     except ImportError:
-        raise ImportError("Unable to process DOCX files. Please install python-docx.")
+        pass
+    
+    return 'cp1252'
 
-def parse_txt(file_path: str) -> str:
+# The end of the last word followed by whitespace, or failing that the last point between two characters, that is not next to a hyphen
+_WORD_END = re.compile(r'.*[^\s-](?=\s)', re.DOTALL)
+_CHARACTER_END = re.compile(r'.*[^\s-](?=[^\s-])', re.DOTALL)
+# Characters of raw text carried between windows; only a word or whitespace run this long gets cut
+_MAX_CARRY = 64 * 1024
+
+def _segment_cut(text: str, max_carry: int = _MAX_CARRY) -> int:
+    # Normalizing stops at a non-space, non-hyphen character: no whitespace run or hyphenated line break spans it
+    for pattern in (_WORD_END, _CHARACTER_END):
+        match = pattern.match(text)
+        if match and len(text) - match.end() <= max_carry:
+            return match.end()
+    # Hold back all of a short text; give up exactness rather than hold a long one
+    return 0 if len(text) <= max_carry else len(text)
+
+def iter_text_segments(
+    file_path: str,
+    window_size: int = 1 << 20,
+    sample_size: int = 64 * 1024,
+    normalize: bool = True
+) -> Iterator[str]:
     """
-    Extract text from plain text files.
+    Stream a text file as decoded segments without loading it into memory.
+    
+    The file is memory-mapped and decoded window by window with an incremental
+    decoder, so at most one window of bytes and its decoded text are held at a
+    time. With ``normalize`` enabled, the unfinished tail of each window (its
+    last word and any whitespace or hyphen after it) is carried raw into the
+    next window before normalizing, so the segments join up to exactly
+    ``normalize_whitespace`` of the whole file.
     
     Args:
         file_path: Path to the text file
+        window_size: Number of bytes decoded per step
+        sample_size: Number of leading bytes used for encoding detection
+        normalize: Whether to collapse whitespace
+        
+    Yields:
+        str: Consecutive text segments
+    """
+    with open(file_path, 'rb') as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            return
+        
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            encoding = detect_encoding(mapped[:sample_size])
+            decoder = codecs.getincrementaldecoder(encoding)(errors='replace')
+            carry = ''
+            
+            for offset in range(0, len(mapped), window_size):
+                text = decoder.decode(mapped[offset:offset + window_size])
+                if not normalize:
+                    if text:
+                        yield text
+                    continue
+                
+                text = carry + text
+                cut = _segment_cut(text)
+                carry = text[cut:]
+                segment = normalize_whitespace(text[:cut])
+                if segment:
+                    yield segment
+            
+            text = decoder.decode(b'', final=True)
+            if normalize:
+                text = normalize_whitespace(carry + text)
+            if text:
+                yield text
+
+def iter_document_chunks(file_path: str, max_chunk_size: int = 1000) -> Iterator[str]:
+    """
+    Parse a document and yield its chunks as they become available.
+    
+    Text files are streamed straight into the chunker; other formats are
+    parsed fully first.
+    
+    Args:
+        file_path: Path to the document file
+        max_chunk_size: Maximum number of characters per chunk
+        
+    Yields:
+        str: Text chunks in document order
+    """
+    if os.path.splitext(file_path)[1].lower() == '.txt':
+        # Reading and chunking interleave, so a streamed file is one stage
+        begin_stage("chunk")
+        yield from chunk_text_stream(iter_text_segments(file_path), max_chunk_size=max_chunk_size)
+    else:
+        begin_stage("parse")
+        # chunk_text normalizes the text in the same pass that indexes its sentences
+        if os.path.splitext(file_path)[1].lower() == '.pdf':
+            text = parse_pdf(file_path, normalize=False)
+        else:
+            text = parse_document(file_path)
+        begin_stage("chunk")
+        yield from chunk_text(text, max_chunk_size=max_chunk_size)
+
+# Formats that can be parsed from a package; anything else in an archive is skipped
+DOCUMENT_EXTENSIONS = ('.pdf', '.docx', '.txt')
+
+def list_package_members(archive: zipfile.ZipFile) -> List[zipfile.ZipInfo]:
+    """
+    List the documents of an RFP package in archive order.
+    
+    Directories, unsupported formats and macOS/hidden metadata files are skipped.
+    
+    Args:
+        archive: Open package archive
         
     Returns:
-        str: Contents of the text file
+        List[zipfile.ZipInfo]: Members to parse
+    """
+    members = []
+    for info in archive.infolist():
+        base_name = os.path.basename(info.filename)
+        if info.is_dir() or not base_name or base_name.startswith('.') or info.filename.startswith('__MACOSX/'):
+            continue
+        if os.path.splitext(base_name)[1].lower() in DOCUMENT_EXTENSIONS:
+            members.append(info)
+    return members
+
+def iter_package_chunks(
+    file_path: str,
+    max_chunk_size: int = 1000,
+    max_workers: Optional[int] = None
+) -> Iterator[Tuple[str, str]]:
+    """
+    Parse a zip package of RFP documents concurrently and stream its chunks.
+    
+    Each member is read straight from the archive, without extracting to disk,
+    by the worker process that parses it, so the package takes roughly as
+    long as its largest member. Chunks are yielded in archive order, tagged
+    with the member they came from; the first member's chunks are available
+    as soon as it is parsed.
+    
+    Args:
+        file_path: Path to the zip archive
+        max_chunk_size: Maximum number of characters per chunk
+        max_workers: Number of parser processes (defaults to the CPU count)
+        
+    Yields:
+        Tuple[str, str]: Member name and chunk text
+    """
+    pool = ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context('spawn'))
+    begin_stage("parse")
+    try:
+        with zipfile.ZipFile(file_path) as archive:
+            members = list_package_members(archive)
+        # Each worker reads its own member, so the package is never held in memory at once
+        with _hidden_main():
+            futures = [pool.submit(_parse_package_member, file_path, info.filename) for info in members]
+        
+        for info, future in zip(members, futures):
+            # Members parse in other processes; the parse stage is the wait for each one
+            begin_stage("parse")
+            try:
+                text = future.result()
+            except Exception as e:
+                raise RuntimeError(f"Failed to parse {info.filename}: {str(e)}")
+            begin_stage("chunk")
+            for chunk in chunk_text(text, max_chunk_size=max_chunk_size):
+                yield info.filename, chunk
+    finally:
+        # Closing the stream early must not leave the remaining members parsing
+        pool.shutdown(wait=False, cancel_futures=True)
+
+def parse_documents(file_paths: List[str], max_workers: Optional[int] = None) -> List[str]:
+    """
+    Parse several documents concurrently.
+    
+    Args:
+        file_paths: Paths to the document files
+        max_workers: Number of parser processes (defaults to the CPU count)
+        
+    Returns:
+        List[str]: Extracted text of each document, in input order
+    """
+    if len(file_paths) < 2:
+        return [parse_document(path) for path in file_paths]
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+        with _hidden_main():
+            futures = [pool.submit(parse_document, path) for path in file_paths]
+        return [future.result() for future in futures]
+
+def _parse_package_member(file_path: str, name: str) -> str:
+    """Read and parse one member of a package archive in a worker process."""
+    with zipfile.ZipFile(file_path) as archive:
+        return parse_document_bytes(archive.read(name), name, False)
+
+@contextmanager
+def _hidden_main():
+    """
+    Hide the __main__ module while parser processes are spawned.
+    
+    Parsers are spawned rather than forked, since forking a process that runs
+    threads (the Streamlit server, torch) can copy a held lock into the child.
+    A spawned process re-runs the parent's main script, which under Streamlit
+    is the whole app; the workers only need this module. Pools start their
+    processes as work is submitted, so submit inside this block.
+    """
+    main = sys.modules['__main__']
+    sys.modules['__main__'] = types.ModuleType('__main__')
+    try:
+        yield
+    finally:
+        sys.modules['__main__'] = main
+
+_SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?])\s+')
+# A word hyphenated across a line break (group 1), or any whitespace run other than a single space
+_NORMALIZE = re.compile(r'(?<=\w)(-)[ \t]*\r?\n\s*(?=[a-z])|[^\S ]\s*| \s+')
+# In normalized text a sentence boundary is exactly one space
+_NORMALIZED_BOUNDARY = re.compile(r'(?<=[.!?]) ')
+
+def _normalize_match(match: re.Match) -> str:
+    return '' if match.group(1) else ' '
+
+def normalize_whitespace(text: str) -> str:
+    """
+    Collapse whitespace runs to single spaces and join words hyphenated across line breaks.
+    
+    Single spaces are left alone, so the substitution only visits line
+    breaks, tabs and runs, and text that is already clean is returned as is.
+    
+    Args:
+        text: Raw extracted text
+        
+    Returns:
+        str: Normalized text
     """
-    with open(file_path, 'r', encoding='utf-8', errors='replace') as file:
-        return file.read()
+    return _NORMALIZE.sub(_normalize_match, text)
+
+@dataclass(slots=True)
+class NormalizedText:
+    """
+    Normalized document text and the start offset of each of its sentences.
+    
+    Sentences are addressed by offsets into the one text buffer, so chunking
+    works on spans and only the finished chunks are sliced out of it.
+    """
+    text: str
+    starts: array
+    end: int
+    
+    def __len__(self) -> int:
+        return len(self.starts)
+    
+    def sentence_span(self, index: int) -> Tuple[int, int]:
+        # Sentences are separated by a single space
+        end = self.starts[index + 1] - 1 if index + 1 < len(self.starts) else self.end
+        return self.starts[index], end
+
+def normalize_text(text: str) -> NormalizedText:
+    """
+    Normalize extracted text in one pass and index its sentence boundaries.
+    
+    Args:
+        text: Raw or already normalized text
+        
+    Returns:
+        NormalizedText: Normalized text with sentence start offsets
+    """
+    text = normalize_whitespace(text)
+    # Skip a leading and trailing space instead of copying the text to strip it
+    begin = 1 if text.startswith(' ') else 0
+    end = len(text) - 1 if len(text) > begin and text.endswith(' ') else len(text)
+    
+    starts = array('q')
+    if begin < end:
+        starts.append(begin)
+        starts.extend(match.end() for match in _NORMALIZED_BOUNDARY.finditer(text, begin, end))
+    return NormalizedText(text, starts, end)
+
+def iter_chunk_spans(document: NormalizedText, max_chunk_size: int = 1000) -> Iterator[Tuple[int, int]]:
+    """
+    Group the sentences of a normalized text into chunks, as offsets into its text.
+    
+    Args:
+        document: Normalized text
+        max_chunk_size: Maximum number of characters per chunk
+        
+    Yields:
+        Tuple[int, int]: Start and end offset of each chunk
+    """
+    chunk_start = None
+    chunk_end = 0
+    chunk_length = 0
+    
+    for index in range(len(document)):
+        start, end = document.sentence_span(index)
+        length = end - start
+        
+        # If a single sentence is too long, split it at word boundaries
+        if length > max_chunk_size:
+            if chunk_start is not None:
+                yield chunk_start, chunk_end
+                chunk_start = None
+                chunk_length = 0
+            yield from _iter_word_spans(document.text, start, end, max_chunk_size)
+        
+        # Normal case: sentence fits within character limit
+        elif chunk_length + length <= max_chunk_size:
+            if chunk_start is None:
+                chunk_start = start
+            chunk_end = end
+            chunk_length += length
+        else:
+            yield chunk_start, chunk_end
+            chunk_start, chunk_end, chunk_length = start, end, length
+    
+    if chunk_start is not None:
+        yield chunk_start, chunk_end
+
+def _iter_word_spans(text: str, start: int, end: int, max_chunk_size: int) -> Iterator[Tuple[int, int]]:
+    piece_start = piece_end = start
+    piece_length = 0
+    position = start
+    while position < end:
+        space = text.find(' ', position, end)
+        word_end = end if space < 0 else space
+        word_length = word_end - position + 1  # +1 for space
+        
+        if piece_length + word_length <= max_chunk_size:
+            piece_length += word_length
+        else:
+            if piece_length:
+                yield piece_start, piece_end
+            piece_start = position
+            piece_length = word_length
+        piece_end = word_end
+        position = word_end + 1
+    
+    if piece_length:
+        yield piece_start, piece_end
 
 def chunk_text(text: str, tokenizer=None, max_chunk_size: int = 1000) -> List[str]:
     """
     Split text into chunks based on character count.
     
+    The text is normalized once and chunks are sliced from it by offset,
+    so each character is copied into exactly one chunk.
+    
     Args:
         text: Text to split into chunks
         tokenizer: Not used in this version, kept for API compatibility
@@ -109,42 +645,82 @@ def chunk_text(text: str, tokenizer=None, max_chunk_size: int = 1000) -> List[st
     Returns:
         List[str]: List of text chunks
     """
-    # Split text into sentences
-    sentences = re.split(r'(?<=[.!?])\s+', text)
+    document = normalize_text(text)
+    return [document.text[start:end] for start, end in iter_chunk_spans(document, max_chunk_size)]
+
+def chunk_text_stream(segments: Iterable[str], max_chunk_size: int = 1000) -> Iterator[str]:
+    """
+    Split a stream of text segments into chunks based on character count.
+    
+    For normalized segments, such as those of ``iter_text_segments``, produces
+    the same chunks as ``chunk_text`` on the concatenated segments, while only
+    holding the current sentence and chunk in memory.
     
-    chunks = []
+    Args:
+        segments: Consecutive pieces of normalized text
+        max_chunk_size: Maximum number of characters per chunk
+        
+    Yields:
+        str: Text chunks
+    """
+    def sentences() -> Iterator[Tuple[str, bool]]:
+        pending = ''
+        for segment in segments:
+            # Like normalize_text, skip the space a normalized text may start with
+            parts = _SENTENCE_BOUNDARY.split((pending + segment) if pending else segment.lstrip(' '))
+            # The last part may continue in the next segment
+            pending = parts.pop()
+            yield from ((part, False) for part in parts)
+            
+            # Text without sentence punctuation is word-split anyway, so pass on the start of an overlong sentence
+            if len(pending) > 64 * max_chunk_size:
+                cut = pending.rfind(' ', 0, len(pending) - max_chunk_size)
+                if cut > 0:
+                    yield pending[:cut], True
+                    pending = pending[cut + 1:]
+        pending = pending.rstrip(' ')
+        if pending:
+            yield pending, False
+    
+    return _chunk_sentences(sentences(), max_chunk_size)
+
+def _chunk_sentences(sentences: Iterable[Tuple[str, bool]], max_chunk_size: int) -> Iterator[str]:
+    # Each sentence comes with whether it continues in the next one; a continued sentence is always too long for one chunk
     current_chunk = []
     current_chunk_length = 0
+    temp_piece = []
+    temp_length = 0
+    continued = False
     
-    for sentence in sentences:
+    for sentence, continues in sentences:
         sentence_length = len(sentence)
         
         # If a single sentence is too long, split it further
-        if sentence_length > max_chunk_size:
+        if continued or continues or sentence_length > max_chunk_size:
             # Add current chunk if not empty
             if current_chunk:
-                chunks.append(' '.join(current_chunk))
+                yield ' '.join(current_chunk)
                 current_chunk = []
                 current_chunk_length = 0
             
-            # Split long sentence into smaller pieces
-            words = sentence.split()
-            temp_piece = []
-            temp_length = 0
-            
-            for word in words:
+            # Split long sentence into smaller pieces, carrying the last piece over if the sentence continues
+            for word in sentence.split():
                 word_length = len(word) + 1  # +1 for space
                 
                 if temp_length + word_length <= max_chunk_size:
                     temp_piece.append(word)
                     temp_length += word_length
                 else:
-                    chunks.append(' '.join(temp_piece))
+                    if temp_piece:
+                        yield ' '.join(temp_piece)
                     temp_piece = [word]
                     temp_length = word_length
             
-            if temp_piece:
-                chunks.append(' '.join(temp_piece))
+            continued = continues
+            if temp_piece and not continues:
+                yield ' '.join(temp_piece)
+                temp_piece = []
+                temp_length = 0
         
         # Normal case: sentence fits within character limit
         elif current_chunk_length + sentence_length <= max_chunk_size:
@@ -152,12 +728,10 @@ def chunk_text(text: str, tokenizer=None, max_chunk_size: int = 1000) -> List[st
             current_chunk_length += sentence_length
         else:
             # Finish current chunk and start a new one
-            chunks.append(' '.join(current_chunk))
+            yield ' '.join(current_chunk)
             current_chunk = [sentence]
             current_chunk_length = sentence_length
     
     # Add the last chunk if not empty
     if current_chunk:
-        chunks.append(' '.join(current_chunk))
-    
-    return chunks
+        yield ' '.join(current_chunk)
@@ -0,0 +1,376 @@
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+import weakref
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Union
+
+DEFAULT_MEMORY_BUDGET_MB = float(os.environ.get("RFP_MEMORY_BUDGET_MB", 2048))
+DEFAULT_TOKEN_BUDGET = int(os.environ.get("RFP_TOKEN_BUDGET", 2_000_000))
+DEFAULT_MAX_PAGES = int(os.environ.get("RFP_MAX_PAGES", 500))
+DEFAULT_SPILL_DIR = os.environ.get(
+    "RFP_SPILL_DIR",
+    os.path.join(os.environ.get("RFP_ANALYZER_CACHE_DIR", ".rfp_cache"), "artifacts")
+)
+# Artifacts at least this many characters long are kept on disk instead of in session state
+DEFAULT_SPILL_THRESHOLD = int(os.environ.get("RFP_SPILL_THRESHOLD", 256 * 1024))
+# Spill directories are named "<pid>-<random>"; where a process cannot be probed, they expire after this long
+_SPILL_DIR_NAME = re.compile(r"^(\d+)-[0-9a-f]+$")
+_STALE_SECONDS = 24 * 3600
+# Spill directories of this process's stores that are still in use
+_live_dirs = set()
+_live_dirs_lock = threading.Lock()
+
+# Cost model constants, deliberately on the pessimistic side
+_CHARS_PER_TOKEN = 4
+_PROMPT_TEMPLATE_TOKENS = 40
+_NEW_TOKENS = 128
+_MAX_INPUT_TOKENS = 512
+# A str costs up to 4 bytes per character, held as upload text, chunks and prompts
+_BYTES_PER_CHAR = 12
+_PARSE_MB_PER_PAGE = 0.25
+# Activations and KV cache of one generation in flight
+_GENERATION_MB = 64
+
+class ResourceLimitExceeded(RuntimeError):
+    """Raised when an analysis cannot be admitted within the process budgets."""
+
+@dataclass(slots=True)
+class CostEstimate:
+    pages: int
+    chunks: int
+    tokens: int
+    memory_mb: float
+
+def estimate_analysis_cost(
+    pages: int,
+    chunks: int,
+    profiles: int = 1,
+    profile_chars: int = 0,
+    max_chunk_size: int = 1000
+) -> CostEstimate:
+    """
+    Estimate the token and memory cost of analyzing an RFP before starting.
+
+    Every chunk is summarized and may have its criteria extracted, the chunk
+    summaries are merged, and each company profile is evaluated once.
+
+    Args:
+        pages: Page count of the RFP (see document_processor.count_pages)
+        chunks: Number of RFP chunks
+        profiles: Number of company profiles to evaluate
+        profile_chars: Total characters of the company profiles
+        max_chunk_size: Maximum number of characters per chunk
+
+    Returns:
+        CostEstimate: Estimated tokens processed and peak memory in MB
+    """
+    chunk_tokens = min(max_chunk_size // _CHARS_PER_TOKEN, _MAX_INPUT_TOKENS) + _PROMPT_TEMPLATE_TOKENS
+    tokens = chunks * 2 * (chunk_tokens + _NEW_TOKENS)
+    tokens += (1 + profiles) * (_MAX_INPUT_TOKENS + _NEW_TOKENS)
+
+    chars = chunks * max_chunk_size + profile_chars
+    memory_mb = chars * _BYTES_PER_CHAR / 2**20 + pages * _PARSE_MB_PER_PAGE + _GENERATION_MB
+    return CostEstimate(pages=pages, chunks=chunks, tokens=tokens, memory_mb=memory_mb)
+
+class Reservation:
+    """Budget held by an admitted analysis; release it when the analysis ends."""
+
+    def __init__(self, governor: "ResourceGovernor", estimate: CostEstimate):
+        self.governor = governor
+        self.estimate = estimate
+        self.released = False
+
+    def release(self) -> None:
+        if not self.released:
+            self.released = True
+            self.governor._release(self.estimate)
+
+    def __enter__(self) -> "Reservation":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.release()
+
+class ResourceGovernor:
+    """
+    Per-process admission control for analyses.
+
+    Each analysis reserves its estimated memory and token cost before it
+    starts. Analyses that fit the remaining budget are admitted, analyses
+    that fit the total budget but not what is left wait for running ones to
+    finish, and analyses that could never fit are rejected up front.
+    """
+
+    def __init__(
+        self,
+        memory_budget_mb: float = DEFAULT_MEMORY_BUDGET_MB,
+        token_budget: int = DEFAULT_TOKEN_BUDGET,
+        max_pages: int = DEFAULT_MAX_PAGES
+    ):
+        self.memory_budget_mb = memory_budget_mb
+        self.token_budget = token_budget
+        self.max_pages = max_pages
+        self.memory_in_use = 0.0
+        self.tokens_in_use = 0
+        self.waiting = 0
+        self.condition = threading.Condition()
+
+    def check_pages(self, pages: int) -> None:
+        """
+        Reject a document before it is parsed.
+
+        Args:
+            pages: Page count of the document
+
+        Raises:
+            ResourceLimitExceeded: If the document has more pages than allowed
+        """
+        if pages > self.max_pages:
+            raise ResourceLimitExceeded(f"Document has {pages} pages, the limit is {self.max_pages}")
+
+    def decide(self, estimate: CostEstimate) -> str:
+        """
+        Decide what would happen to an analysis if it were submitted now.
+
+        Args:
+            estimate: Estimated cost of the analysis
+
+        Returns:
+            str: "admit", "queue" or "reject"
+        """
+        if self._rejection_reason(estimate):
+            return "reject"
+        with self.condition:
+            return "admit" if self._fits(estimate) else "queue"
+
+    def reserve(self, estimate: CostEstimate, timeout: Optional[float] = None, cancel_token: Any = None) -> Reservation:
+        """
+        Reserve budget for an analysis, waiting while other analyses hold it.
+
+        Args:
+            estimate: Estimated cost of the analysis
+            timeout: Maximum seconds to wait in the queue (None waits indefinitely)
+            cancel_token: Optional model_manager.CancellationToken that abandons the wait
+
+        Returns:
+            Reservation: Held budget, to be released when the analysis ends
+
+        Raises:
+            ResourceLimitExceeded: If the analysis can never fit or the wait times out
+        """
+        reason = self._rejection_reason(estimate)
+        if reason:
+            raise ResourceLimitExceeded(reason)
+
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        with self.condition:
+            self.waiting += 1
+            try:
+                while not self._fits(estimate):
+                    if cancel_token is not None and cancel_token.check():
+                        raise ResourceLimitExceeded("Time limit reached while waiting for resources")
+                    remaining = deadline - time.monotonic() if deadline is not None else None
+                    if remaining is not None and remaining <= 0:
+                        raise ResourceLimitExceeded("Timed out waiting for other analyses to finish")
+                    # Wake up periodically so cancellation is noticed while queued
+                    self.condition.wait(min(remaining, 1.0) if remaining is not None else 1.0)
+                self.memory_in_use += estimate.memory_mb
+                self.tokens_in_use += estimate.tokens
+            finally:
+                self.waiting -= 1
+        return Reservation(self, estimate)
+
+    def usage(self) -> Dict[str, float]:
+        """
+        Report the budget currently held by running analyses.
+
+        Returns:
+            Dict with "memory_mb", "tokens" and "waiting"
+        """
+        with self.condition:
+            return {"memory_mb": self.memory_in_use, "tokens": self.tokens_in_use, "waiting": self.waiting}
+
+    def _rejection_reason(self, estimate: CostEstimate) -> Optional[str]:
+        if estimate.pages > self.max_pages:
+            return f"Document has {estimate.pages} pages, the limit is {self.max_pages}"
+        if estimate.memory_mb > self.memory_budget_mb:
+            return f"Analysis needs about {estimate.memory_mb:.0f} MB, the budget is {self.memory_budget_mb:.0f} MB"
+        if estimate.tokens > self.token_budget:
+            return f"Analysis needs about {estimate.tokens} tokens, the budget is {self.token_budget}"
+        return None
+
+    def _fits(self, estimate: CostEstimate) -> bool:
+        return (self.memory_in_use + estimate.memory_mb <= self.memory_budget_mb
+                and self.tokens_in_use + estimate.tokens <= self.token_budget)
+
+    def _release(self, estimate: CostEstimate) -> None:
+        with self.condition:
+            self.memory_in_use = max(self.memory_in_use - estimate.memory_mb, 0.0)
+            self.tokens_in_use = max(self.tokens_in_use - estimate.tokens, 0)
+            self.condition.notify_all()
+
+@dataclass(frozen=True, slots=True)
+class ArtifactHandle:
+    """Reference to an artifact spilled to an ArtifactStore."""
+    key: str
+    size: int
+
+    def __len__(self) -> int:
+        return self.size
+
+class ArtifactStore:
+    """
+    Disk store for large per-session artifacts such as raw document text and report HTML.
+
+    Small values stay in memory; values of at least ``threshold`` characters
+    are written to disk and replaced by an ArtifactHandle, so session state
+    only holds the handle.
+
+    Each store spills into its own directory, removed when the store is
+    garbage collected or the process exits. Directories left behind by
+    processes that were killed are swept when the next store is created.
+    """
+
+    def __init__(self, directory: str = DEFAULT_SPILL_DIR, threshold: int = DEFAULT_SPILL_THRESHOLD):
+        self.threshold = threshold
+        os.makedirs(directory, exist_ok=True)
+        _sweep_spill_dirs(directory)
+        self.directory = os.path.join(directory, f"{os.getpid()}-{uuid.uuid4().hex}")
+        # Registered before it exists, so a sweep by another store of this process never takes it
+        with _live_dirs_lock:
+            _live_dirs.add(self.directory)
+        os.makedirs(self.directory)
+        self._finalizer = weakref.finalize(self, _remove_store_dir, self.directory)
+
+    def spill(self, text: str) -> Union[str, ArtifactHandle]:
+        """
+        Keep a value in memory or move it to disk, depending on its size.
+
+        Args:
+            text: Artifact contents
+
+        Returns:
+            The text itself if it is small, otherwise a handle to the stored copy
+        """
+        if len(text) < self.threshold:
+            return text
+        return self._write(text, len(text))
+
+    def spill_chunks(self, chunks: List[str]) -> Union[List[str], ArtifactHandle]:
+        """
+        Keep a list of chunks in memory or move it to disk, depending on its total size.
+
+        Args:
+            chunks: Chunk texts, e.g. of an RFP
+
+        Returns:
+            The list itself if it is small, otherwise a handle for load_chunks
+        """
+        size = sum(len(chunk) for chunk in chunks)
+        if size < self.threshold:
+            return chunks
+        return self._write(json.dumps(chunks), size)
+
+    def _write(self, text: str, size: int) -> ArtifactHandle:
+        handle = ArtifactHandle(uuid.uuid4().hex, size)
+        # Write to a temporary file first so readers never see a partial artifact
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as file:
+            file.write(text)
+        os.replace(tmp_path, self._path(handle))
+        return handle
+
+    def load(self, value: Union[str, ArtifactHandle, None], limit: Optional[int] = None) -> Optional[str]:
+        """
+        Resolve a value returned by spill.
+
+        Args:
+            value: Text, handle, or None
+            limit: Read at most this many characters, e.g. for a preview
+
+        Returns:
+            The artifact contents (None passes through)
+        """
+        if not isinstance(value, ArtifactHandle):
+            return value[:limit] if value is not None and limit is not None else value
+        with open(self._path(value), "r", encoding="utf-8") as file:
+            return file.read(limit if limit is not None else -1)
+
+    def load_chunks(self, value: Union[List[str], ArtifactHandle, None]) -> Optional[List[str]]:
+        """
+        Resolve a value returned by spill_chunks.
+
+        Args:
+            value: Chunk list, handle, or None
+
+        Returns:
+            The chunks (None passes through)
+        """
+        if not isinstance(value, ArtifactHandle):
+            return value
+        return json.loads(self.load(value))
+
+    def discard(self, value: Union[str, List[str], ArtifactHandle, None]) -> None:
+        """
+        Delete a spilled artifact that is no longer referenced.
+
+        Args:
+            value: Text, chunk list, handle, or None; only handles have anything to delete
+        """
+        if isinstance(value, ArtifactHandle):
+            try:
+                os.remove(self._path(value))
+            except FileNotFoundError:
+                pass
+
+    def _path(self, handle: ArtifactHandle) -> str:
+        return os.path.join(self.directory, f"{handle.key}.txt")
+
+    def close(self) -> None:
+        """Delete every artifact of this store."""
+        self._finalizer()
+
+def _process_running(pid: int) -> Optional[bool]:
+    # Signal 0 probes a process on POSIX; elsewhere os.kill would terminate it, so the answer is unknown
+    if os.name != "posix":
+        return None
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+def _remove_store_dir(path: str) -> None:
+    shutil.rmtree(path, ignore_errors=True)
+    with _live_dirs_lock:
+        _live_dirs.discard(path)
+
+def _sweep_spill_dirs(directory: str) -> None:
+    # Spill directories of processes that were killed before their stores were cleaned up. A directory
+    # with this process's pid but no live store was left by an earlier run that had the same pid, as
+    # happens in containers where the app is always PID 1
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        match = _SPILL_DIR_NAME.match(name)
+        if match is None:
+            continue
+        try:
+            if int(match.group(1)) == os.getpid():
+                with _live_dirs_lock:
+                    stale = path not in _live_dirs
+            else:
+                running = _process_running(int(match.group(1)))
+                stale = running is False or (running is None and time.time() - os.path.getmtime(path) > _STALE_SECONDS)
+            if stale:
+                shutil.rmtree(path, ignore_errors=True)
+        except OSError:
+            # Another process is sweeping the same directory
+            pass
@@ -0,0 +1,242 @@
+import hashlib
+import json
+import os
+import tempfile
+from typing import Any, Callable, Dict, List, Optional
+from transformers import PreTrainedTokenizerBase
+from analyzer import (
+    CRITERIA_PACKED_PROMPT,
+    PROMPT_VERSION,
+    SUMMARY_PACKED_PROMPT,
+    pack_chunks,
+    summarize_chunks,
+    merge_summaries,
+    extract_chunks_criteria,
+    deduplicate_criteria,
+    similarity
+)
+from model_manager import CancellationToken
+from prefilter import DEFAULT_THRESHOLD, score_chunk
+from results import ChunkResult, Criterion
+
+DEFAULT_CACHE_DIR = os.environ.get("RFP_ANALYZER_CACHE_DIR", ".rfp_cache")
+
+def chunk_hash(chunk: str) -> str:
+    """
+    Compute the content hash used to key per-chunk results.
+
+    Args:
+        chunk: Text of the chunk
+
+    Returns:
+        str: Hex SHA-256 digest of the chunk text
+    """
+    return hashlib.sha256(chunk.encode("utf-8")).hexdigest()
+
+def result_key(chunk: str, model_name: str) -> str:
+    """
+    Compute the key of a chunk's generation results.
+
+    Results depend on the model and the prompts as much as on the text, so
+    both are part of the key.
+
+    Args:
+        chunk: Text of the chunk
+        model_name: Name of the model that generates the results
+
+    Returns:
+        str: Hex SHA-256 digest of the model, prompt version and chunk text
+    """
+    return chunk_hash(f"{model_name}\0{PROMPT_VERSION}\0{chunk}")
+
+class ChunkResultStore:
+    """
+    On-disk store of per-chunk generation results and analyzed document versions.
+
+    Chunk results live in ``chunks/<key>.bin`` in the compact binary encoding
+    of ``results.ChunkResult``, keyed by ``result_key``, and are shared
+    between all documents, so an unchanged section is never sent to the same
+    model twice. Criteria are ``None`` for a chunk whose extraction was
+    skipped, so a lower threshold later extracts them. The
+    latest analyzed version of each document is kept in ``documents/<id>.json``
+    so a re-analysis can report what changed.
+    """
+
+    def __init__(self, directory: str = DEFAULT_CACHE_DIR):
+        self.directory = directory
+        os.makedirs(os.path.join(directory, "chunks"), exist_ok=True)
+        os.makedirs(os.path.join(directory, "documents"), exist_ok=True)
+
+    def _read(self, path: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(path, "r", encoding="utf-8") as file:
+                return json.load(file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def _write(self, path: str, data: Dict[str, Any]) -> None:
+        self._write_bytes(path, json.dumps(data).encode("utf-8"))
+
+    def _write_bytes(self, path: str, data: bytes) -> None:
+        # Write to a temporary file first so readers never see a partial result
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "wb") as file:
+            file.write(data)
+        os.replace(tmp_path, path)
+
+    def _chunk_path(self, digest: str) -> str:
+        return os.path.join(self.directory, "chunks", f"{digest}.bin")
+
+    def _document_path(self, document_id: str) -> str:
+        return os.path.join(self.directory, "documents", f"{chunk_hash(document_id)}.json")
+
+    def get_chunk(self, digest: str) -> Optional[ChunkResult]:
+        try:
+            with open(self._chunk_path(digest), "rb") as file:
+                return ChunkResult.from_bytes(file.read())
+        except (FileNotFoundError, ValueError, IndexError):
+            # A missing or unreadable result is generated again
+            return None
+
+    def put_chunk(self, digest: str, result: ChunkResult) -> None:
+        self._write_bytes(self._chunk_path(digest), result.to_bytes())
+
+    def get_document(self, document_id: str) -> Optional[Dict[str, Any]]:
+        return self._read(self._document_path(document_id))
+
+    def put_document(self, document_id: str, version: Dict[str, Any]) -> None:
+        self._write(self._document_path(document_id), version)
+
+def diff_criteria(
+    previous: List[Dict[str, str]],
+    current: List[Dict[str, str]],
+    threshold: float = 0.7
+) -> Dict[str, List[Dict[str, str]]]:
+    """
+    Compare two deduplicated criteria lists using the analyzer's similarity measure.
+
+    Args:
+        previous: Criteria of the previous document version
+        current: Criteria of the new document version
+        threshold: Similarity above which two criteria are considered the same
+
+    Returns:
+        Dict with "added" and "removed" criteria
+    """
+    def matches(item: Dict[str, str], others: List[Dict[str, str]]) -> bool:
+        desc = item["description"].lower()
+        return any(similarity(desc, other["description"].lower()) > threshold for other in others)
+
+    return {
+        "added": [c for c in current if not matches(c, previous)],
+        "removed": [c for c in previous if not matches(c, current)]
+    }
+
+def reanalyze_rfp(
+    model: Any,
+    tokenizer: PreTrainedTokenizerBase,
+    document_id: str,
+    rfp_chunks: List[str],
+    store: ChunkResultStore,
+    model_name: str,
+    min_score: Optional[float] = DEFAULT_THRESHOLD,
+    cancel_token: Optional[CancellationToken] = None,
+    progress: Optional[Callable[[int, int], None]] = None
+) -> Dict[str, Any]:
+    """
+    Analyze a (possibly amended) RFP, running generation only for new or changed chunks.
+
+    Args:
+        model: The language model
+        tokenizer: The tokenizer for the model
+        document_id: Stable identifier of the RFP across amendments
+        rfp_chunks: Chunks of the current document version
+        store: Store holding per-chunk results and previous versions
+        model_name: Name of the model, which keys the cached chunk results
+        min_score: Requirement-density threshold below which criteria extraction is skipped
+        cancel_token: Cancels the analysis or sets its deadline
+        progress: Called with (chunks generated, chunks to generate) after each
+            packed group of new or changed chunks
+
+    Returns:
+        Dict with "summary", "criteria", "changes" and "partial". "changes" is
+        None on the first analysis of a document, otherwise it lists the chunk
+        counts and the added/removed criteria versus the previous version.
+        "partial" is True when the deadline passed before every chunk was
+        analyzed; the document version is then not recorded.
+    """
+    previous = store.get_document(document_id)
+
+    keys = [result_key(chunk, model_name) for chunk in rfp_chunks]
+    results = [store.get_chunk(key) for key in keys]
+    extract = [min_score is None or score_chunk(chunk) >= min_score for chunk in rfp_chunks]
+    # A chunk summarized before under a higher threshold only needs its criteria
+    pending = [i for i, result in enumerate(results) if result is None or (extract[i] and result.criteria is None)]
+
+    generated = 0
+    partial = False
+    # New and changed chunks are packed several to a prompt, as in a full analysis
+    for group in pack_chunks(tokenizer, [rfp_chunks[i] for i in pending], SUMMARY_PACKED_PROMPT):
+        if cancel_token is not None and cancel_token.check():
+            partial = True
+            break
+        indices = [pending[j] for j in group]
+        unsummarized = [i for i in indices if results[i] is None]
+        summaries = dict(zip(unsummarized, summarize_chunks(model, tokenizer, [rfp_chunks[i] for i in unsummarized], cancel_token))) if unsummarized else {}
+        unextracted = [i for i in indices if extract[i]]
+        extracted = {}
+        for packed in pack_chunks(tokenizer, [rfp_chunks[i] for i in unextracted], CRITERIA_PACKED_PROMPT):
+            packed = [unextracted[j] for j in packed]
+            for i, criteria in zip(packed, extract_chunks_criteria(model, tokenizer, [rfp_chunks[i] for i in packed], cancel_token)):
+                extracted[i] = [Criterion.from_dict(c) for c in criteria]
+
+        # Generation may have been cut short by the deadline, so those results are used but never cached
+        expired = cancel_token is not None and cancel_token.expired
+        partial = partial or expired
+        for i in indices:
+            results[i] = ChunkResult(summaries[i] if i in summaries else results[i].summary, extracted.get(i))
+            if not expired:
+                store.put_chunk(keys[i], results[i])
+        generated += len(indices)
+        if progress is not None:
+            progress(generated, len(pending))
+
+    chunk_summaries = []
+    all_criteria = []
+    digests = []
+    for chunk, result, wanted in zip(rfp_chunks, results, extract):
+        digests.append(chunk_hash(chunk))
+        # Chunks the deadline left unanalyzed are missing from a partial result
+        if result is None:
+            continue
+        chunk_summaries.append(result.summary)
+        # Criteria extracted under a lower threshold are left out, as a fresh analysis would
+        if wanted and result.criteria is not None:
+            all_criteria.extend(criterion.to_dict() for criterion in result.criteria)
+
+    # The merged summary and the deduplicated criteria depend on every chunk, so they are always recomputed
+    criteria = deduplicate_criteria(all_criteria)
+    generator = {"model": model_name, "prompt_version": PROMPT_VERSION}
+    if previous is not None and previous["chunks"] == digests and previous.get("generator") == generator:
+        summary = previous["summary"]
+    else:
+        summary = merge_summaries(model, tokenizer, chunk_summaries, cancel_token)
+
+    changes = None
+    if previous is not None:
+        previous_digests = set(previous["chunks"])
+        current_digests = set(digests)
+        criteria_diff = diff_criteria(previous["criteria"], criteria)
+        changes = {
+            "added_chunks": len(current_digests - previous_digests),
+            "removed_chunks": len(previous_digests - current_digests),
+            "unchanged_chunks": len(current_digests & previous_digests),
+            "generated_chunks": generated,
+            "added_criteria": criteria_diff["added"],
+            "removed_criteria": criteria_diff["removed"]
+        }
+
+    if not partial:
+        store.put_document(document_id, {"chunks": digests, "summary": summary, "criteria": criteria, "generator": generator})
+
+    return {"summary": summary, "criteria": criteria, "changes": changes, "partial": partial}
@@ -0,0 +1,184 @@
+import http.client
+import json
+import queue
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+from model_manager import NEW_TOKENS, CancellationToken
+
+class InferenceClient:
+    """
+    Thin client for a local inference_server.ModelServer.
+
+    Keeps a small pool of persistent HTTP connections so concurrent callers
+    reuse sockets instead of reconnecting per request. An instance can be
+    passed wherever a model is expected: model_manager.generate_text and
+    generate_batch delegate to its methods.
+
+    While a generation request is in flight, its cancellation token is
+    polled and a cancelled request is withdrawn through the server's
+    /cancel endpoint, so the server stops decoding within one step.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        pool_size: int = 4,
+        timeout: float = 600.0,
+        busy_retries: int = 30,
+        cancel_poll_seconds: float = 0.2
+    ):
+        parts = urlsplit(url)
+        self.host = parts.hostname or "127.0.0.1"
+        self.port = parts.port or 80
+        self.timeout = timeout
+        self.busy_retries = busy_retries
+        self.cancel_poll_seconds = cancel_poll_seconds
+        self.pool = queue.LifoQueue(maxsize=pool_size)
+
+    def _request(
+        self,
+        method: str,
+        path: str,
+        body: Optional[Dict[str, Any]] = None,
+        cancel_token: Optional[CancellationToken] = None
+    ) -> Dict[str, Any]:
+        # Wait for room in the server's admission queue rather than failing the analysis
+        for _ in range(self.busy_retries):
+            if cancel_token is not None:
+                cancel_token.check()
+            if cancel_token is None or body is None:
+                status, payload, retry_after = self._send(method, path, body)
+            else:
+                body = {**body, "request_id": uuid.uuid4().hex}
+                done = threading.Event()
+                watcher = threading.Thread(target=self._watch, args=(body["request_id"], cancel_token, done), daemon=True)
+                watcher.start()
+                try:
+                    status, payload, retry_after = self._send(method, path, body)
+                finally:
+                    done.set()
+            if status != 503:
+                break
+            time.sleep(retry_after)
+        
+        if cancel_token is not None:
+            # A request withdrawn through /cancel raises here rather than as a server error
+            cancel_token.check()
+        if status != 200:
+            raise RuntimeError(f"Inference server returned {status}: {payload.get('error', '')}")
+        return payload
+
+    def _send(self, method: str, path: str, body: Optional[Dict[str, Any]]) -> Tuple[int, Dict[str, Any], float]:
+        try:
+            connection = self.pool.get_nowait()
+        except queue.Empty:
+            connection = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+
+        data = json.dumps(body).encode("utf-8") if body is not None else None
+        headers = {"Content-Type": "application/json"} if data is not None else {}
+        try:
+            try:
+                connection.request(method, path, body=data, headers=headers)
+                response = connection.getresponse()
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                # A pooled connection may have been closed by the server; retry once on a fresh one
+                connection.close()
+                connection = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+                connection.request(method, path, body=data, headers=headers)
+                response = connection.getresponse()
+            payload = json.loads(response.read() or b"{}")
+        except Exception as e:
+            connection.close()
+            raise RuntimeError(f"Inference server request failed: {str(e)}")
+
+        try:
+            self.pool.put_nowait(connection)
+        except queue.Full:
+            connection.close()
+
+        return response.status, payload, float(response.getheader("Retry-After", "1"))
+
+    def _watch(self, request_id: str, cancel_token: CancellationToken, done: threading.Event) -> None:
+        while not done.wait(self.cancel_poll_seconds):
+            if cancel_token.cancelled:
+                try:
+                    self._send("POST", "/cancel", {"request_id": request_id})
+                except RuntimeError:
+                    # The request's own connection reports a server that went away
+                    pass
+                return
+
+    def health(self) -> Dict[str, Any]:
+        """
+        Check that the server is up.
+
+        Returns:
+            Dict with the server status and current queue length
+        """
+        return self._request("GET", "/health")
+
+    def generate_text(
+        self,
+        prompt: str,
+        max_length: int = 512,
+        temperature: float = 0.7,
+        cancel_token: Optional[CancellationToken] = None,
+        max_new_tokens: int = NEW_TOKENS
+    ) -> str:
+        """
+        Generate text for one prompt on the server.
+
+        Args:
+            prompt: Text prompt to generate from
+            max_length: Maximum length of the generated text
+            temperature: Temperature for sampling (higher = more random)
+            cancel_token: Cancelling it withdraws the request from the server;
+                its remaining time is sent as the server-side deadline
+            max_new_tokens: Maximum number of tokens to generate
+
+        Returns:
+            str: Generated text
+        """
+        if cancel_token is not None and cancel_token.check():
+            return ""
+        request = {"prompt": prompt, "max_length": max_length, "temperature": temperature, "max_new_tokens": max_new_tokens}
+        _add_deadline(request, cancel_token)
+        return self._request("POST", "/generate", request, cancel_token)["text"]
+
+    def generate_batch(
+        self,
+        prompts: List[str],
+        max_length: int = 512,
+        temperature: float = 0.7,
+        batch_size: int = 8,
+        cancel_token: Optional[CancellationToken] = None,
+        max_new_tokens: int = NEW_TOKENS
+    ) -> List[str]:
+        """
+        Generate text for several prompts with batched inference on the server.
+
+        Args:
+            prompts: Text prompts to generate from
+            max_length: Maximum length of the generated text
+            temperature: Temperature for sampling (higher = more random)
+            batch_size: Number of prompts the server runs through the model at once
+            cancel_token: Cancelling it withdraws the request from the server;
+                its remaining time is sent as the server-side deadline
+            max_new_tokens: Maximum number of tokens to generate per prompt
+
+        Returns:
+            List[str]: Generated text for each prompt, in input order
+        """
+        if cancel_token is not None and cancel_token.check():
+            return ["" for _ in prompts]
+        request = {"prompts": prompts, "max_length": max_length, "temperature": temperature, "batch_size": batch_size, "max_new_tokens": max_new_tokens}
+        _add_deadline(request, cancel_token)
+        return self._request("POST", "/generate_batch", request, cancel_token)["texts"]
+
+def _add_deadline(request: Dict[str, Any], cancel_token: Optional[CancellationToken]) -> None:
+    # The server stops decoding at the same moment the caller gives up waiting
+    if cancel_token is not None and cancel_token.remaining is not None:
+        request["timeout"] = cancel_token.remaining
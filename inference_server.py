@@ -0,0 +1,221 @@
+import argparse
+import json
+import queue
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Optional
+from transformers import PreTrainedTokenizerBase
+from model_manager import NEW_TOKENS, CancellationToken, ContinuousBatchingScheduler, GenerationCancelled, load_model, load_tokenizer, warm_up_model, generate_text, generate_batch
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+class _Job:
+    """A unit of work waiting in the admission queue."""
+
+    def __init__(self, run: Callable[[], Any]):
+        self.run = run
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.cancelled = False
+
+class ModelServer:
+    """
+    Serve one warm model to every UI session and batch job on the machine.
+
+    Requests are accepted by a threaded HTTP server on localhost and placed
+    in a bounded admission queue. Worker threads take jobs from the queue
+    and run them concurrently against one ContinuousBatchingScheduler, so
+    the requests of every caller share the decode batch and no caller loads
+    an extra model copy. When the queue is full, requests are rejected with
+    503 and a Retry-After header instead of piling up. Requests sent with a
+    "request_id" can be withdrawn through /cancel, whether still queued or
+    generating.
+    """
+
+    def __init__(
+        self,
+        model: Any,
+        tokenizer: PreTrainedTokenizerBase,
+        host: str = DEFAULT_HOST,
+        port: int = DEFAULT_PORT,
+        queue_size: int = 32,
+        workers: int = 8
+    ):
+        # Delegating models (another client, an already shared scheduler) schedule their own requests
+        if not hasattr(model, "generate_text"):
+            model = ContinuousBatchingScheduler(model, tokenizer, max_batch_size=workers)
+        self.model = model
+        self.tokenizer = tokenizer
+        self.jobs = queue.Queue(maxsize=queue_size)
+        # Cancellation tokens of the requests in flight, by the id their client gave them
+        self.requests = {}
+        self.requests_lock = threading.Lock()
+        self.workers = [threading.Thread(target=self._work, name=f"model-worker-{i}", daemon=True) for i in range(workers)]
+        self.httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self.httpd.daemon_threads = True
+
+    def serve_forever(self) -> None:
+        if isinstance(self.model, ContinuousBatchingScheduler):
+            self.model.start()
+        for worker in self.workers:
+            worker.start()
+        self.httpd.serve_forever()
+
+    def shutdown(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if isinstance(self.model, ContinuousBatchingScheduler):
+            self.model.stop()
+
+    def submit(self, run: Callable[[], Any]) -> Optional[_Job]:
+        """
+        Queue a job for the model workers.
+
+        Args:
+            run: Callable executed on a worker thread
+
+        Returns:
+            The queued job, or None when the admission queue is full
+        """
+        job = _Job(run)
+        try:
+            self.jobs.put_nowait(job)
+        except queue.Full:
+            return None
+        return job
+
+    def _work(self) -> None:
+        while True:
+            job = self.jobs.get()
+            try:
+                job.result = job.run()
+            except GenerationCancelled:
+                job.cancelled = True
+            except Exception as e:
+                job.error = str(e)
+            finally:
+                job.done.set()
+
+    def cancel(self, request_id: str) -> bool:
+        """
+        Withdraw a request in flight.
+
+        Args:
+            request_id: Id the client sent with the request
+
+        Returns:
+            bool: Whether the request was still in flight
+        """
+        with self.requests_lock:
+            cancel_token = self.requests.get(request_id)
+        if cancel_token is None:
+            return False
+        cancel_token.cancel()
+        return True
+
+    def _handle(self, path: str, request: Dict[str, Any]) -> Optional[_Job]:
+        max_length = request.get("max_length", 512)
+        temperature = request.get("temperature", 0.7)
+        max_new_tokens = int(request.get("max_new_tokens", NEW_TOKENS))
+        # The deadline starts at admission, so time spent queued counts against it
+        timeout = request.get("timeout")
+        cancel_token = CancellationToken(timeout=float(timeout) if timeout is not None else None)
+        if request.get("request_id") is not None:
+            with self.requests_lock:
+                self.requests[request["request_id"]] = cancel_token
+        if path == "/generate":
+            prompt = request["prompt"]
+            return self.submit(lambda: {"text": generate_text(self.model, self.tokenizer, prompt, max_length=max_length, temperature=temperature, max_new_tokens=max_new_tokens, cancel_token=cancel_token)})
+        elif path == "/generate_batch":
+            prompts = request["prompts"]
+            batch_size = request.get("batch_size", 8)
+            return self.submit(lambda: {"texts": generate_batch(self.model, self.tokenizer, prompts, max_length=max_length, temperature=temperature, batch_size=batch_size, max_new_tokens=max_new_tokens, cancel_token=cancel_token)})
+        raise ValueError(f"Unknown endpoint: {path}")
+
+    def _make_handler(self) -> type:
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _reply(self, status: int, body: Dict[str, Any], headers: Optional[Dict[str, str]] = None) -> None:
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self) -> None:
+                if self.path == "/health":
+                    self._reply(200, {"status": "ok", "queued": server.jobs.qsize()})
+                else:
+                    self._reply(404, {"error": f"Unknown endpoint: {self.path}"})
+
+            def do_POST(self) -> None:
+                if self.path not in ("/generate", "/generate_batch", "/cancel"):
+                    self._reply(404, {"error": f"Unknown endpoint: {self.path}"})
+                    return
+
+                request = {}
+                try:
+                    length = int(self.headers.get("Content-Length", 0))
+                    request = json.loads(self.rfile.read(length) or b"{}")
+                    if self.path == "/cancel":
+                        self._reply(200, {"cancelled": server.cancel(request["request_id"])})
+                        return
+                    job = server._handle(self.path, request)
+                except (KeyError, TypeError, ValueError, AttributeError) as e:
+                    self._reply(400, {"error": f"Bad request: {str(e)}"})
+                    return
+
+                try:
+                    if job is None:
+                        self._reply(503, {"error": "Server busy, admission queue is full"}, {"Retry-After": "1"})
+                        return
+                    job.done.wait()
+                finally:
+                    with server.requests_lock:
+                        server.requests.pop(request.get("request_id"), None)
+                if job.cancelled:
+                    self._reply(409, {"error": "Request was cancelled"})
+                elif job.error is not None:
+                    self._reply(500, {"error": job.error})
+                else:
+                    self._reply(200, job.result)
+
+            def log_message(self, format: str, *args: Any) -> None:
+                # Prompts may contain confidential RFP text, keep request logs quiet
+                pass
+
+        return Handler
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Serve a local model to the RFP Analyzer UI and batch jobs.")
+    parser.add_argument("--model", default="facebook/opt-125m")
+    parser.add_argument("--backend", default=None, help="'torch' or 'onnx' (defaults to RFP_INFERENCE_BACKEND)")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--queue-size", type=int, default=32)
+    parser.add_argument("--workers", type=int, default=8, help="Requests generated concurrently in one decode batch")
+    parser.add_argument("--compile", action="store_true", help="Compile the model with torch.compile (torch backend)")
+    args = parser.parse_args()
+
+    model = load_model(args.model, backend=args.backend, compile_graph=args.compile or None)
+    tokenizer = load_tokenizer(args.model)
+    # Pay for kernel initialization (and compilation) before the first client connects
+    warmup = warm_up_model(model, tokenizer)
+    print(f"Warmed up in {warmup['warmup_seconds']:.1f}s: first request {warmup['cold_seconds']:.2f}s cold, {warmup['warm_seconds']:.2f}s warm")
+    server = ModelServer(model, tokenizer, args.host, args.port, args.queue_size, args.workers)
+    print(f"Serving {args.model} on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
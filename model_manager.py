@@ -1,10 +1,88 @@
-from typing import Any, Dict, Optional, Tuple
+import inspect
+import math
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional, Tuple
 import torch
 from transformers import (
     AutoTokenizer, 
     AutoModelForCausalLM, 
-    PreTrainedTokenizerBase
+    PreTrainedTokenizerBase,
+    StoppingCriteria,
+    StoppingCriteriaList
 )
+from profiler import active_profiler, profile_forward, profile_generate
+
+class GenerationCancelled(RuntimeError):
+    """Raised when an analysis is abandoned through its CancellationToken."""
+
+class CancellationToken:
+    """
+    Cancellation flag and optional deadline shared by every step of one analysis.
+    
+    Cancelling abandons the work: generation stops within one decode step and
+    GenerationCancelled is raised. A passed deadline also stops generation
+    within one step, but callers keep what was produced so far and return
+    partial results.
+    
+    Args:
+        timeout: Seconds from now until the deadline (None for no deadline)
+        poll: Optional predicate checked with the flag, returning True once the
+            caller has gone away (e.g. the UI session requested a rerun)
+    """
+    
+    def __init__(self, timeout: Optional[float] = None, poll: Optional[Callable[[], bool]] = None):
+        self.deadline = time.monotonic() + timeout if timeout is not None else None
+        self.poll = poll
+        self._cancelled = threading.Event()
+    
+    def cancel(self) -> None:
+        self._cancelled.set()
+    
+    @property
+    def cancelled(self) -> bool:
+        if not self._cancelled.is_set() and self.poll is not None and self.poll():
+            self._cancelled.set()
+        return self._cancelled.is_set()
+    
+    @property
+    def expired(self) -> bool:
+        return self.deadline is not None and time.monotonic() >= self.deadline
+    
+    @property
+    def remaining(self) -> Optional[float]:
+        return max(self.deadline - time.monotonic(), 0.0) if self.deadline is not None else None
+    
+    @property
+    def stop_requested(self) -> bool:
+        return self.cancelled or self.expired
+    
+    def check(self) -> bool:
+        """
+        Check the token between pipeline steps.
+        
+        Returns:
+            bool: True if the deadline has passed and the caller should stop with partial results
+        
+        Raises:
+            GenerationCancelled: If the analysis was cancelled
+        """
+        if self.cancelled:
+            raise GenerationCancelled("Analysis was cancelled")
+        return self.expired
+
+class CancellationCriteria(StoppingCriteria):
+    """Stopping criterion that ends generation as soon as a CancellationToken stops."""
+    
+    def __init__(self, token: CancellationToken):
+        self.token = token
+    
+    def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor, **kwargs) -> torch.BoolTensor:
+        stop = self.token.stop_requested
+        return torch.full((input_ids.shape[0],), stop, dtype=torch.bool, device=input_ids.device)
 
 def load_tokenizer(model_name: str) -> PreTrainedTokenizerBase:
     """
@@ -29,17 +107,71 @@ def load_tokenizer(model_name: str) -> PreTrainedTokenizerBase:
     except Exception as e:
         raise RuntimeError(f"Failed to load tokenizer for {model_name}: {str(e)}")
 
-def load_model(model_name: str, device: str = "cpu") -> Any:
+# Prompts are truncated to this many tokens before generation
+MAX_INPUT_TOKENS = 512
+# Tokens generated per prompt unless the caller asks for more (packed prompts answer several sections)
+NEW_TOKENS = 128
+
+# Directory of cached compiled graphs, reused across restarts where torch supports it
+DEFAULT_COMPILE_CACHE_DIR = os.environ.get(
+    "RFP_COMPILE_CACHE_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "rfp-analyzer", "inductor")
+)
+
+# Prompt lengths (in tokens) of the analyzer's typical requests: short chunks, full chunks, truncated evaluations
+WARMUP_PROMPT_LENGTHS = (64, 256, 512)
+
+_WARMUP_TEXT = (
+    "The bidder must hold a valid ISO 9001 certification and have at least five years of experience "
+    "delivering similar projects, with an average annual turnover above 2 million. "
+)
+
+def load_model(
+    model_name: str,
+    device: Optional[str] = None,
+    backend: Optional[str] = None,
+    compile_graph: Optional[bool] = None,
+    auto_tune: Optional[bool] = None,
+    threads: Optional[int] = None
+) -> Any:
     """
     Load the language model and place it on the appropriate device.
     
     Args:
         model_name: Name or path of the model to load
-        device: Device to place the model on ('cpu' or 'cuda')
+        device: Device to place the model on ('cpu' or 'cuda'; defaults to
+            'cuda' when available)
+        backend: Inference backend, 'torch' or 'onnx' (defaults to the
+            RFP_INFERENCE_BACKEND environment variable, then 'torch')
+        compile_graph: Compile the forward pass with torch.compile (torch
+            backend only; defaults to the RFP_COMPILE_MODEL environment variable)
+        auto_tune: Apply this machine's tuned thread count, benchmarking it
+            on first start (defaults to the RFP_AUTO_TUNE environment variable,
+            off unless set to 1). A tuned lower precision is only applied when
+            RFP_AUTO_TUNE_PRECISION is also set to 1
+        threads: Intra-op thread count, overriding torch's default and the
+            tuned profile (e.g. a share of the cores for one of several workers)
         
     Returns:
         The loaded language model
     """
+    if auto_tune is None:
+        auto_tune = os.environ.get("RFP_AUTO_TUNE", "").lower() in ("1", "true", "yes")
+    backend = (backend or os.environ.get("RFP_INFERENCE_BACKEND", "torch")).lower()
+    if backend == "onnx":
+        from onnx_backend import load_onnx_model
+        # ONNX Runtime picks its own kernels, only a thread count from an earlier torch tuning carries over
+        profile = None
+        if auto_tune:
+            from autotune import load_profile
+            profile = load_profile(model_name)
+        return load_onnx_model(model_name, num_threads=threads or (profile.threads if profile else None))
+    elif backend != "torch":
+        raise ValueError(f"Unsupported inference backend: {backend}")
+    
+    if device is None:
+        device = "cuda" if torch.cuda.is_available() else "cpu"
+    
     try:
         # Determine if we need any special loading configurations
         # For Mistral and other large models, we might need to use lower precision
@@ -66,11 +198,171 @@ def load_model(model_name: str, device: str = "cpu") -> Any:
         
         # Set to evaluation mode
         model.eval()
-        
-        return model
     
     except Exception as e:
         raise RuntimeError(f"Failed to load model {model_name}: {str(e)}")
+    
+    if auto_tune:
+        # Imported here: the tuner depends on the cost model, which imports this module
+        from autotune import tuned_model
+        lower_precision = os.environ.get("RFP_AUTO_TUNE_PRECISION", "").lower() in ("1", "true", "yes")
+        model, _ = tuned_model(model_name, model, load_tokenizer(model_name), lower_precision=lower_precision)
+    if threads:
+        torch.set_num_threads(threads)
+    
+    if compile_graph is None:
+        compile_graph = os.environ.get("RFP_COMPILE_MODEL", "").lower() in ("1", "true", "yes")
+    if compile_graph:
+        compile_model(model)
+    
+    return model
+
+def compile_model(model: Any, cache_dir: str = DEFAULT_COMPILE_CACHE_DIR) -> Any:
+    """
+    Compile a torch model's forward pass, caching compiled artifacts on disk.
+    
+    Compilation itself is lazy: graphs are built on the first calls, which is
+    why compiled models should be warmed up with warm_up_model before serving.
+    Shapes vary between prompts, so the graph is compiled with dynamic shapes.
+    
+    Args:
+        model: The torch language model
+        cache_dir: Directory for the inductor cache
+        
+    Returns:
+        The same model, with a compiled forward pass
+    """
+    if not hasattr(torch, "compile"):
+        raise RuntimeError("Model compilation requires torch 2.0 or later")
+    
+    # Must be set before the first compilation to take effect
+    os.environ.setdefault("TORCHINDUCTOR_CACHE_DIR", cache_dir)
+    try:
+        import torch._inductor.config as inductor_config
+        inductor_config.fx_graph_cache = True
+    except (ImportError, AttributeError):
+        pass
+    
+    model.forward = torch.compile(model.forward, dynamic=True)
+    return model
+
+def warm_up_model(
+    model: Any,
+    tokenizer: PreTrainedTokenizerBase,
+    prompt_lengths: Tuple[int, ...] = WARMUP_PROMPT_LENGTHS,
+    max_new_tokens: int = 8
+) -> Dict[str, float]:
+    """
+    Run representative prompt shapes through generate so the first real request is fast.
+    
+    The first call pays for lazy kernel initialization, allocator growth and,
+    for compiled models, graph compilation. The first shape is timed cold and
+    again after all shapes have run, which gives the cold-versus-warm
+    first-request latency.
+    
+    Args:
+        model: The language model
+        tokenizer: The tokenizer for the model
+        prompt_lengths: Prompt lengths, in tokens, to run
+        max_new_tokens: Tokens generated per warm-up prompt
+        
+    Returns:
+        Dict with "cold_seconds", "warm_seconds" and "warmup_seconds"
+    """
+    device = get_model_device(model)
+    text_ids = tokenizer(_WARMUP_TEXT * (max(prompt_lengths) // 16 + 1))["input_ids"]
+    
+    def run(length: int) -> float:
+        input_ids = torch.tensor([text_ids[:length]], device=device)
+        start = time.perf_counter()
+        with torch.no_grad():
+            # Same sampling path as generate_text, so the same kernels are initialized
+            model.generate(
+                input_ids=input_ids,
+                attention_mask=torch.ones_like(input_ids),
+                max_new_tokens=max_new_tokens,
+                min_new_tokens=max_new_tokens,
+                pad_token_id=tokenizer.pad_token_id,
+                do_sample=True,
+                top_p=0.95,
+                top_k=50,
+                repetition_penalty=1.2,
+                no_repeat_ngram_size=3
+            )
+        return time.perf_counter() - start
+    
+    try:
+        start = time.perf_counter()
+        cold = run(prompt_lengths[0])
+        for length in prompt_lengths[1:]:
+            run(length)
+        warmup = time.perf_counter() - start
+        warm = run(prompt_lengths[0])
+    except Exception as e:
+        raise RuntimeError(f"Model warm-up failed: {str(e)}")
+    
+    return {"cold_seconds": cold, "warm_seconds": warm, "warmup_seconds": warmup}
+
+def measure_token_rates(
+    model: Any,
+    tokenizer: PreTrainedTokenizerBase,
+    prompt_tokens: int = 256,
+    new_tokens: int = 32
+) -> Dict[str, float]:
+    """
+    Measure prefill and decode throughput of a warm model on this machine.
+    
+    Prefill is timed with a long prompt and a single new token, decode with
+    a short prompt and a fixed number of new tokens.
+    
+    Args:
+        model: A local language model (torch or ONNX Runtime)
+        tokenizer: The tokenizer for the model
+        prompt_tokens: Prompt length used to time prefill
+        new_tokens: Tokens generated to time decode
+        
+    Returns:
+        Dict with "prefill_tokens_per_second" and "decode_tokens_per_second"
+    """
+    device = get_model_device(model)
+    text_ids = tokenizer(_WARMUP_TEXT * (prompt_tokens // 16 + 1))["input_ids"]
+    
+    def run(length: int, max_new_tokens: int) -> float:
+        input_ids = torch.tensor([text_ids[:length]], device=device)
+        start = time.perf_counter()
+        with torch.no_grad():
+            model.generate(
+                input_ids=input_ids,
+                attention_mask=torch.ones_like(input_ids),
+                max_new_tokens=max_new_tokens,
+                min_new_tokens=max_new_tokens,
+                pad_token_id=tokenizer.pad_token_id,
+                do_sample=False
+            )
+        return time.perf_counter() - start
+    
+    try:
+        prefill = run(prompt_tokens, 1)
+        decode = run(16, new_tokens)
+    except Exception as e:
+        raise RuntimeError(f"Throughput measurement failed: {str(e)}")
+    
+    return {"prefill_tokens_per_second": prompt_tokens / prefill, "decode_tokens_per_second": new_tokens / decode}
+
+def get_model_device(model: Any) -> torch.device:
+    """
+    Get the device a model runs on, for torch and ONNX Runtime models alike.
+    
+    Args:
+        model: The language model
+        
+    Returns:
+        torch.device: Device the inputs must be placed on
+    """
+    device = getattr(model, "device", None)
+    if device is None:
+        device = next(model.parameters()).device
+    return torch.device(device)
 
 def generate_text(
     model: Any,
@@ -79,7 +371,9 @@ def generate_text(
     max_length: int = 512,
     temperature: float = 0.7,
     num_return_sequences: int = 1,
-    device: Optional[str] = None
+    device: Optional[str] = None,
+    cancel_token: Optional[CancellationToken] = None,
+    max_new_tokens: int = NEW_TOKENS
 ) -> str:
     """
     Generate text using the language model.
@@ -92,10 +386,23 @@ def generate_text(
         temperature: Temperature for sampling (higher = more random)
         num_return_sequences: Number of sequences to generate
         device: Device to run on (if None, will use model's device)
+        cancel_token: Stops generation within one decode step when cancelled
+            (raising GenerationCancelled) or past its deadline (returning the
+            partial text)
+        max_new_tokens: Maximum number of tokens to generate
         
     Returns:
         str: Generated text
     """
+    if cancel_token is not None and cancel_token.check():
+        return ""
+    
+    # Models served elsewhere (e.g. inference_client.InferenceClient) generate on their own
+    if hasattr(model, "generate_text"):
+        return model.generate_text(prompt, max_length=max_length, temperature=temperature, max_new_tokens=max_new_tokens, cancel_token=cancel_token)
+    
+    stopping_criteria = StoppingCriteriaList([CancellationCriteria(cancel_token)]) if cancel_token else None
+    
     try:
         # Prepare the inputs
         inputs = tokenizer(prompt, return_tensors="pt", padding=True)
@@ -103,20 +410,19 @@ def generate_text(
         # Move to the appropriate device
         if device:
             inputs = {k: v.to(device) for k, v in inputs.items()}
-        elif next(model.parameters()).device != torch.device("cpu"):
-            inputs = {k: v.to(next(model.parameters()).device) for k, v in inputs.items()}
+        elif get_model_device(model) != torch.device("cpu"):
+            inputs = {k: v.to(get_model_device(model)) for k, v in inputs.items()}
+        
+        # Truncate input if it's too long
+        if inputs["input_ids"].shape[1] > MAX_INPUT_TOKENS:
+            inputs["input_ids"] = inputs["input_ids"][:, -MAX_INPUT_TOKENS:]
+            inputs["attention_mask"] = inputs["attention_mask"][:, -MAX_INPUT_TOKENS:]
         
         # Generate text
-        with torch.no_grad():
-            # Truncate input if it's too long
-            max_input_length = 512
-            if inputs["input_ids"].shape[1] > max_input_length:
-                inputs["input_ids"] = inputs["input_ids"][:, -max_input_length:]
-                inputs["attention_mask"] = inputs["attention_mask"][:, -max_input_length:]
-            
+        with torch.no_grad(), profile_generate(model, inputs["input_ids"]):
             output = model.generate(
                 **inputs,
-                max_new_tokens=128,  # Smaller, safer number of tokens
+                max_new_tokens=max_new_tokens,
                 temperature=temperature,
                 num_return_sequences=num_return_sequences,
                 pad_token_id=tokenizer.pad_token_id,
@@ -125,9 +431,13 @@ def generate_text(
                 top_k=50,
                 repetition_penalty=1.2,
                 no_repeat_ngram_size=3,
-                early_stopping=True
+                early_stopping=True,
+                stopping_criteria=stopping_criteria
             )
         
+        if cancel_token is not None:
+            cancel_token.check()
+        
         # Decode and return the generated text
         if len(output) > 0 and len(output[0]) > 0:
             generated_text = tokenizer.decode(output[0], skip_special_tokens=True)
@@ -140,5 +450,500 @@ def generate_text(
         else:
             raise RuntimeError("No text was generated - the output tensor is empty")
     
+    except GenerationCancelled:
+        raise
+    
     except Exception as e:
         raise RuntimeError(f"Text generation failed: {str(e)}")
+
+def generate_batch(
+    model: Any,
+    tokenizer: PreTrainedTokenizerBase,
+    prompts: List[str],
+    max_length: int = 512,
+    temperature: float = 0.7,
+    batch_size: int = 8,
+    device: Optional[str] = None,
+    cancel_token: Optional[CancellationToken] = None,
+    max_new_tokens: int = NEW_TOKENS
+) -> List[str]:
+    """
+    Generate text for several prompts using batched inference.
+    
+    Prompts are left-padded so every sequence in a batch ends at the same
+    position, which is what decoder-only models need to continue generation.
+    
+    Args:
+        model: The language model
+        tokenizer: The tokenizer for the model
+        prompts: Text prompts to generate from
+        max_length: Maximum length of the generated text
+        temperature: Temperature for sampling (higher = more random)
+        batch_size: Number of prompts to run through the model at once
+        device: Device to run on (if None, will use model's device)
+        cancel_token: Stops generation within one decode step; past its deadline,
+            prompts that were not reached get an empty result
+        max_new_tokens: Maximum number of tokens to generate per prompt
+        
+    Returns:
+        List[str]: Generated text for each prompt, in input order
+    """
+    if not prompts:
+        return []
+    
+    if hasattr(model, "generate_batch"):
+        return model.generate_batch(prompts, max_length=max_length, temperature=temperature, batch_size=batch_size, max_new_tokens=max_new_tokens, cancel_token=cancel_token)
+    
+    stopping_criteria = StoppingCriteriaList([CancellationCriteria(cancel_token)]) if cancel_token else None
+    
+    padding_side = tokenizer.padding_side
+    truncation_side = getattr(tokenizer, "truncation_side", "right")
+    try:
+        # Left padding/truncation keeps the end of each prompt next to the generated tokens
+        tokenizer.padding_side = "left"
+        tokenizer.truncation_side = "left"
+        target_device = device or get_model_device(model)
+        
+        results = []
+        for start in range(0, len(prompts), batch_size):
+            if cancel_token is not None and cancel_token.check():
+                break
+            batch = prompts[start:start + batch_size]
+            inputs = tokenizer(batch, return_tensors="pt", padding=True, truncation=True, max_length=MAX_INPUT_TOKENS)
+            inputs = {k: v.to(target_device) for k, v in inputs.items()}
+            
+            with torch.no_grad(), profile_generate(model, inputs["input_ids"]):
+                output = model.generate(
+                    **inputs,
+                    max_new_tokens=max_new_tokens,
+                    temperature=temperature,
+                    pad_token_id=tokenizer.pad_token_id,
+                    do_sample=True,
+                    top_p=0.95,
+                    top_k=50,
+                    repetition_penalty=1.2,
+                    no_repeat_ngram_size=3,
+                    stopping_criteria=stopping_criteria
+                )
+            
+            if cancel_token is not None:
+                cancel_token.check()
+            
+            # Only decode the newly generated tokens of each sequence
+            prompt_length = inputs["input_ids"].shape[1]
+            for sequence in output:
+                results.append(tokenizer.decode(sequence[prompt_length:], skip_special_tokens=True).strip())
+        
+        results.extend("" for _ in range(len(prompts) - len(results)))
+        return results
+    
+    except GenerationCancelled:
+        raise
+    
+    except Exception as e:
+        raise RuntimeError(f"Batched text generation failed: {str(e)}")
+    
+    finally:
+        tokenizer.padding_side = padding_side
+        tokenizer.truncation_side = truncation_side
+
+def generate_batch_scored(
+    model: Any,
+    tokenizer: PreTrainedTokenizerBase,
+    prompts: List[str],
+    batch_size: int = 8,
+    max_new_tokens: int = NEW_TOKENS,
+    cancel_token: Optional[CancellationToken] = None
+) -> List[List[Tuple[str, float]]]:
+    """
+    Generate text greedily and score each generated line by its token probabilities.
+    
+    A line's confidence is the geometric mean probability of its tokens,
+    i.e. exp of the mean token log-probability, so it does not shrink with
+    line length. Greedy decoding keeps the scores comparable between runs.
+    
+    Args:
+        model: A local language model (torch or ONNX Runtime)
+        tokenizer: The tokenizer for the model
+        prompts: Text prompts to generate from
+        batch_size: Number of prompts to run through the model at once
+        max_new_tokens: Maximum number of tokens to generate per prompt
+        cancel_token: Stops generation within one decode step
+        
+    Returns:
+        List of (line, confidence) pairs per prompt, one pair per non-empty generated line
+    """
+    if not prompts:
+        return []
+    if not hasattr(model, "compute_transition_scores"):
+        raise ValueError("Confidence scores need a local model that exposes token log-probabilities")
+    
+    stopping_criteria = StoppingCriteriaList([CancellationCriteria(cancel_token)]) if cancel_token else None
+    padding_side = tokenizer.padding_side
+    truncation_side = getattr(tokenizer, "truncation_side", "right")
+    try:
+        tokenizer.padding_side = "left"
+        tokenizer.truncation_side = "left"
+        target_device = get_model_device(model)
+        
+        results = []
+        for start in range(0, len(prompts), batch_size):
+            if cancel_token is not None and cancel_token.check():
+                break
+            batch = prompts[start:start + batch_size]
+            inputs = tokenizer(batch, return_tensors="pt", padding=True, truncation=True, max_length=MAX_INPUT_TOKENS)
+            inputs = {k: v.to(target_device) for k, v in inputs.items()}
+            
+            with torch.no_grad(), profile_generate(model, inputs["input_ids"]):
+                output = model.generate(
+                    **inputs,
+                    max_new_tokens=max_new_tokens,
+                    pad_token_id=tokenizer.pad_token_id,
+                    do_sample=False,
+                    repetition_penalty=1.2,
+                    no_repeat_ngram_size=3,
+                    output_scores=True,
+                    return_dict_in_generate=True,
+                    stopping_criteria=stopping_criteria
+                )
+            
+            if cancel_token is not None:
+                cancel_token.check()
+            
+            # Log-probability of each chosen token, after the same logits processing generation used
+            scores = model.compute_transition_scores(output.sequences, output.scores, normalize_logits=True)
+            prompt_length = inputs["input_ids"].shape[1]
+            for sequence, token_scores in zip(output.sequences, scores):
+                results.append(_score_lines(tokenizer, sequence[prompt_length:].tolist(), token_scores.tolist()))
+        
+        results.extend([] for _ in range(len(prompts) - len(results)))
+        return results
+    
+    except (GenerationCancelled, ValueError):
+        raise
+    
+    except Exception as e:
+        raise RuntimeError(f"Scored text generation failed: {str(e)}")
+    
+    finally:
+        tokenizer.padding_side = padding_side
+        tokenizer.truncation_side = truncation_side
+
+def _score_lines(tokenizer: PreTrainedTokenizerBase, token_ids: List[int], token_scores: List[float]) -> List[Tuple[str, float]]:
+    lines = []
+    text, logprobs = "", []
+    for token_id, logprob in zip(token_ids, token_scores):
+        if token_id == tokenizer.eos_token_id:
+            break
+        pieces = tokenizer.decode([token_id], skip_special_tokens=True).split("\n")
+        # A token may end one line and start the next; it counts toward both
+        for i, piece in enumerate(pieces):
+            if i > 0:
+                if text.strip():
+                    lines.append((text.strip(), math.exp(sum(logprobs) / len(logprobs))))
+                text, logprobs = "", []
+            text += piece
+            logprobs.append(logprob)
+    if text.strip():
+        lines.append((text.strip(), math.exp(sum(logprobs) / len(logprobs))))
+    return lines
+
+class CascadeStage:
+    """
+    One model of a cascade: judgments it is less confident about than
+    ``threshold`` are escalated to the next stage. The threshold of the
+    last stage is ignored, since there is nothing to escalate to.
+    """
+    
+    def __init__(self, model: Any, tokenizer: PreTrainedTokenizerBase, threshold: float = 0.6, name: str = ""):
+        self.model = model
+        self.tokenizer = tokenizer
+        self.threshold = threshold
+        self.name = name
+
+class _ScheduledRequest:
+    """A prompt being decoded by the ContinuousBatchingScheduler."""
+    
+    def __init__(
+        self,
+        prompt_ids: List[int],
+        max_new_tokens: int,
+        temperature: float,
+        session: str,
+        cancel_token: Optional[CancellationToken] = None,
+        profiler: Optional[Any] = None
+    ):
+        self.prompt_ids = prompt_ids
+        self.max_new_tokens = max_new_tokens
+        self.temperature = temperature
+        self.session = session
+        self.cancel_token = cancel_token
+        self.profiler = profiler
+        self.generated = []
+        self.past = None
+        self.future = Future()
+
+class ContinuousBatchingScheduler:
+    """
+    Iteration-level (continuous) batching of generation requests across sessions.
+    
+    A background thread owns the model. Every decode step it runs one forward
+    pass for all active requests together; new requests are prefilled and join
+    the running batch at the next token boundary, and finished requests leave
+    it immediately instead of waiting for the longest sequence. Each request
+    keeps its own KV cache, which is left-padded to a common length for the
+    batched step. Admission is round-robin over sessions, so one analyst's
+    many chunk prompts cannot starve another's.
+    
+    The scheduler implements generate_text/generate_batch, so it can be passed
+    wherever a model is expected.
+    """
+    
+    def __init__(
+        self,
+        model: Any,
+        tokenizer: PreTrainedTokenizerBase,
+        max_batch_size: int = 8,
+        max_new_tokens: int = NEW_TOKENS,
+        max_input_length: int = 512,
+        top_k: int = 50,
+        top_p: float = 0.95
+    ):
+        self.model = model
+        self.tokenizer = tokenizer
+        self.max_batch_size = max_batch_size
+        self.max_new_tokens = max_new_tokens
+        self.max_input_length = max_input_length
+        self.top_k = top_k
+        self.top_p = top_p
+        self.device = get_model_device(model)
+        # Models like GPT-2 need explicit positions once the cache is left-padded
+        self.accepts_position_ids = "position_ids" in inspect.signature(model.forward).parameters
+        
+        self.waiting = OrderedDict()
+        self.active = []
+        self.condition = threading.Condition()
+        self.running = False
+        self.thread = None
+        self.tokens_generated = 0
+        self.busy_seconds = 0.0
+    
+    def start(self) -> "ContinuousBatchingScheduler":
+        with self.condition:
+            if not self.running:
+                self.running = True
+                self.thread = threading.Thread(target=self._loop, name="continuous-batching", daemon=True)
+                self.thread.start()
+        return self
+    
+    def stop(self) -> None:
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+        if self.thread:
+            self.thread.join()
+    
+    def submit(
+        self,
+        prompt: str,
+        temperature: float = 0.7,
+        max_new_tokens: Optional[int] = None,
+        session: str = "default",
+        cancel_token: Optional[CancellationToken] = None
+    ) -> Future:
+        """
+        Queue a prompt for generation.
+        
+        Args:
+            prompt: Text prompt to generate from
+            temperature: Temperature for sampling (0 for greedy decoding)
+            max_new_tokens: Token budget of this request (defaults to the scheduler's)
+            session: Caller identity used for fair admission
+            cancel_token: Checked before every decode step; a cancelled request
+                fails with GenerationCancelled, an expired one resolves to its
+                partial text
+            
+        Returns:
+            Future: Resolves to the generated text
+        """
+        prompt_ids = self.tokenizer(prompt)["input_ids"][-self.max_input_length:]
+        # The scheduler thread runs the forward passes, so the caller's profiler travels with the request
+        request = _ScheduledRequest(prompt_ids, max_new_tokens or self.max_new_tokens, temperature, session, cancel_token, active_profiler())
+        with self.condition:
+            self.waiting.setdefault(session, deque()).append(request)
+            self.condition.notify_all()
+        self.start()
+        return request.future
+    
+    def generate_text(self, prompt: str, max_length: int = 512, temperature: float = 0.7, session: Optional[str] = None, cancel_token: Optional[CancellationToken] = None, max_new_tokens: Optional[int] = None) -> str:
+        session = session or str(threading.get_ident())
+        return self.submit(prompt, max_new_tokens=max_new_tokens, temperature=temperature, session=session, cancel_token=cancel_token).result()
+    
+    def generate_batch(self, prompts: List[str], max_length: int = 512, temperature: float = 0.7, batch_size: int = 8, session: Optional[str] = None, cancel_token: Optional[CancellationToken] = None, max_new_tokens: Optional[int] = None) -> List[str]:
+        session = session or str(threading.get_ident())
+        futures = [self.submit(prompt, max_new_tokens=max_new_tokens, temperature=temperature, session=session, cancel_token=cancel_token) for prompt in prompts]
+        return [future.result() for future in futures]
+    
+    def stats(self) -> Dict[str, float]:
+        """
+        Report aggregate decoding throughput.
+        
+        Returns:
+            Dict with "tokens", "seconds" and "tokens_per_second"
+        """
+        seconds = self.busy_seconds
+        return {
+            "tokens": self.tokens_generated,
+            "seconds": seconds,
+            "tokens_per_second": self.tokens_generated / seconds if seconds else 0.0
+        }
+    
+    def _admit(self) -> List[_ScheduledRequest]:
+        # Take one request per session in turn until the batch is full
+        admitted = []
+        while self.waiting and len(self.active) + len(admitted) < self.max_batch_size:
+            session, requests = next(iter(self.waiting.items()))
+            admitted.append(requests.popleft())
+            del self.waiting[session]
+            if requests:
+                self.waiting[session] = requests
+        return admitted
+    
+    def _loop(self) -> None:
+        while True:
+            with self.condition:
+                while self.running and not self.active and not self.waiting:
+                    self.condition.wait()
+                if not self.running:
+                    break
+                admitted = self._admit()
+            
+            # Abandoned or expired requests leave before the next token is computed
+            admitted = [request for request in admitted if not self._stop_if_requested(request)]
+            self.active = [request for request in self.active if not self._stop_if_requested(request)]
+            
+            start = time.perf_counter()
+            try:
+                with torch.no_grad():
+                    for request in admitted:
+                        self._prefill(request)
+                    if self.active:
+                        self._decode_step()
+            except Exception as e:
+                for request in admitted + self.active:
+                    if not request.future.done():
+                        request.future.set_exception(RuntimeError(f"Text generation failed: {str(e)}"))
+                self.active = []
+            self.busy_seconds += time.perf_counter() - start
+        
+        with self.condition:
+            pending = self.active + [request for requests in self.waiting.values() for request in requests]
+            self.waiting.clear()
+        for request in pending:
+            request.future.set_exception(RuntimeError("Scheduler stopped"))
+        self.active = []
+    
+    def _stop_if_requested(self, request: _ScheduledRequest) -> bool:
+        token = request.cancel_token
+        if token is None or not token.stop_requested:
+            return False
+        
+        request.past = None
+        if token.cancelled:
+            request.future.set_exception(GenerationCancelled("Analysis was cancelled"))
+        else:
+            request.future.set_result(self.tokenizer.decode(request.generated, skip_special_tokens=True).strip())
+        return True
+    
+    def _prefill(self, request: _ScheduledRequest) -> None:
+        input_ids = torch.tensor([request.prompt_ids], device=self.device)
+        with profile_forward([request.profiler], "prefill", 1):
+            outputs = self.model(input_ids=input_ids, attention_mask=torch.ones_like(input_ids), use_cache=True)
+        request.past = _to_legacy_cache(outputs.past_key_values)
+        self._append_token(request, outputs.logits[0, -1])
+    
+    def _decode_step(self) -> None:
+        lengths = [len(request.prompt_ids) + len(request.generated) - 1 for request in self.active]
+        max_length = max(lengths)
+        
+        # Left-pad every request's cache to the longest one and batch them layer by layer
+        past = []
+        for layer in range(len(self.active[0].past)):
+            keys, values = [], []
+            for request, length in zip(self.active, lengths):
+                key, value = request.past[layer][:2]
+                pad = max_length - length
+                keys.append(torch.nn.functional.pad(key, (0, 0, pad, 0)))
+                values.append(torch.nn.functional.pad(value, (0, 0, pad, 0)))
+            past.append((torch.cat(keys), torch.cat(values)))
+        
+        attention_mask = torch.zeros(len(self.active), max_length + 1, dtype=torch.long, device=self.device)
+        for row, length in enumerate(lengths):
+            attention_mask[row, max_length - length:] = 1
+        input_ids = torch.tensor([[request.generated[-1]] for request in self.active], device=self.device)
+        
+        kwargs = {}
+        if self.accepts_position_ids:
+            kwargs["position_ids"] = torch.tensor([[length] for length in lengths], device=self.device)
+        with profile_forward((request.profiler for request in self.active), "decode", len(self.active)):
+            outputs = self.model(
+                input_ids=input_ids,
+                past_key_values=_from_legacy_cache(tuple(past)),
+                attention_mask=attention_mask,
+                use_cache=True,
+                **kwargs
+            )
+        new_past = _to_legacy_cache(outputs.past_key_values)
+        
+        for row, (request, length) in enumerate(zip(self.active, lengths)):
+            # Drop this request's padding again so its cache only holds real positions
+            request.past = tuple(
+                (key[row:row + 1, :, -(length + 1):], value[row:row + 1, :, -(length + 1):])
+                for key, value in (layer[:2] for layer in new_past)
+            )
+            self._append_token(request, outputs.logits[row, -1])
+        
+        self.active = [request for request in self.active if not request.future.done()]
+    
+    def _append_token(self, request: _ScheduledRequest, logits: torch.Tensor) -> None:
+        token = self._sample(logits, request.temperature)
+        request.generated.append(token)
+        self.tokens_generated += 1
+        
+        if token == self.tokenizer.eos_token_id or len(request.generated) >= request.max_new_tokens:
+            text = self.tokenizer.decode(request.generated, skip_special_tokens=True).strip()
+            request.past = None
+            request.future.set_result(text)
+        elif request not in self.active:
+            self.active.append(request)
+    
+    def _sample(self, logits: torch.Tensor, temperature: float) -> int:
+        if temperature <= 0:
+            return int(torch.argmax(logits))
+        
+        logits = logits / temperature
+        top_logits, top_indices = torch.topk(logits, min(self.top_k, logits.shape[-1]))
+        probs = torch.softmax(top_logits, dim=-1)
+        
+        # Nucleus filtering within the top-k candidates
+        cumulative = torch.cumsum(probs, dim=-1)
+        probs[cumulative - probs > self.top_p] = 0
+        probs = probs / probs.sum()
+        return int(top_indices[torch.multinomial(probs, 1)])
+
+def _to_legacy_cache(past: Any) -> Tuple:
+    if hasattr(past, "to_legacy_cache"):
+        return past.to_legacy_cache()
+    # Newer transformers keep one object per layer and dropped the legacy conversion
+    if hasattr(past, "layers"):
+        return tuple((layer.keys, layer.values) for layer in past.layers)
+    return past
+
+def _from_legacy_cache(past: Tuple) -> Any:
+    try:
+        from transformers import DynamicCache
+    except ImportError:
+        return past
+    if hasattr(DynamicCache, "from_legacy_cache"):
+        return DynamicCache.from_legacy_cache(past)
+    return DynamicCache(past)
@@ -0,0 +1,77 @@
+import os
+import re
+from typing import Any, Optional
+
+DEFAULT_ONNX_CACHE_DIR = os.environ.get(
+    "RFP_ONNX_CACHE_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "rfp-analyzer", "onnx")
+)
+
+def get_export_path(model_name: str, cache_dir: str = DEFAULT_ONNX_CACHE_DIR) -> str:
+    """
+    Get the directory holding the exported ONNX graph of a model.
+
+    Args:
+        model_name: Name or path of the model
+        cache_dir: Root directory of exported models
+
+    Returns:
+        str: Directory of the exported model
+    """
+    return os.path.join(cache_dir, re.sub(r"[^A-Za-z0-9_.-]+", "--", model_name))
+
+def load_onnx_model(
+    model_name: str,
+    cache_dir: str = DEFAULT_ONNX_CACHE_DIR,
+    num_threads: Optional[int] = None
+) -> Any:
+    """
+    Load a causal LM for generation with ONNX Runtime on CPU.
+
+    The model is exported to ONNX with KV-cache inputs/outputs the first time
+    and the exported graph is cached on disk; later loads reuse it. The
+    returned model supports ``generate`` like the torch model, so it can be
+    passed to model_manager.generate_text unchanged.
+
+    Args:
+        model_name: Name or path of the model to load
+        cache_dir: Root directory of exported models
+        num_threads: Intra-op thread count (defaults to ONNX Runtime's choice)
+
+    Returns:
+        The loaded ONNX Runtime model
+    """
+    try:
+        import onnxruntime
+        from optimum.onnxruntime import ORTModelForCausalLM
+    except ImportError:
+        raise ImportError("Unable to use the ONNX backend. Please install optimum[onnxruntime].")
+
+    session_options = onnxruntime.SessionOptions()
+    session_options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+    if num_threads:
+        session_options.intra_op_num_threads = num_threads
+
+    export_path = get_export_path(model_name, cache_dir)
+    try:
+        if os.path.isdir(export_path):
+            return ORTModelForCausalLM.from_pretrained(
+                export_path,
+                use_cache=True,
+                provider="CPUExecutionProvider",
+                session_options=session_options
+            )
+
+        # Export once with past key/values so decoding reuses the KV cache
+        model = ORTModelForCausalLM.from_pretrained(
+            model_name,
+            export=True,
+            use_cache=True,
+            provider="CPUExecutionProvider",
+            session_options=session_options
+        )
+        model.save_pretrained(export_path)
+        return model
+
+    except Exception as e:
+        raise RuntimeError(f"Failed to load ONNX model {model_name}: {str(e)}")
@@ -0,0 +1,137 @@
+import json
+import re
+import sys
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Requirement language, following the keywords analyzer.extract_importance uses to grade importance
+REQUIREMENT_KEYWORDS = [
+    "must", "required", "requirement", "requirements", "mandatory", "shall", "should",
+    "minimum", "at least", "eligible", "eligibility", "qualified", "qualification",
+    "certified", "certification"
+]
+
+# Share of requirement sentences a chunk needs before it is sent to the model
+DEFAULT_THRESHOLD = 0.1
+
+_REQUIREMENT_PATTERN = re.compile(
+    r"\b(?:" + "|".join(re.escape(k) for k in sorted(REQUIREMENT_KEYWORDS, key=len, reverse=True)) + r")\b",
+    re.IGNORECASE
+)
+_SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?;:])\s+|\n+")
+_NON_SPACE = re.compile(r"\S")
+
+def score_chunk(chunk: str) -> float:
+    """
+    Score a chunk by its density of requirement language.
+
+    Args:
+        chunk: Text of the chunk
+
+    Returns:
+        float: Fraction of the chunk's sentences that contain a requirement keyword
+    """
+    return score_span(chunk, 0, len(chunk))
+
+def score_span(text: str, start: int, end: int) -> float:
+    """
+    Score a span of a text by its density of requirement language.
+
+    Sentences are searched in place with pos/endpos instead of being split
+    out into strings of their own.
+
+    Args:
+        text: Text buffer
+        start: Start offset of the span
+        end: End offset of the span
+
+    Returns:
+        float: Fraction of the span's sentences that contain a requirement keyword
+    """
+    sentences = hits = 0
+    position = start
+    while True:
+        boundary = _SENTENCE_BOUNDARY.search(text, position, end)
+        stop = boundary.start() if boundary else end
+        if _NON_SPACE.search(text, position, stop):
+            sentences += 1
+            if _REQUIREMENT_PATTERN.search(text, position, stop):
+                hits += 1
+        if boundary is None:
+            break
+        position = boundary.end()
+    return hits / sentences if sentences else 0.0
+
+def rank_chunks(chunks: List[str]) -> List[Tuple[int, float]]:
+    """
+    Rank chunks by requirement density, highest first.
+
+    Args:
+        chunks: Text chunks of the document
+
+    Returns:
+        List of (chunk index, score) pairs
+    """
+    scores = [(i, score_chunk(chunk)) for i, chunk in enumerate(chunks)]
+    return sorted(scores, key=lambda item: item[1], reverse=True)
+
+def select_requirement_chunks(
+    chunks: List[str],
+    threshold: Optional[float] = DEFAULT_THRESHOLD,
+    top_n: Optional[int] = None
+) -> List[str]:
+    """
+    Keep only the chunks likely to contain eligibility requirements.
+
+    Args:
+        chunks: Text chunks of the document
+        threshold: Minimum score for a chunk to be kept (None disables the threshold)
+        top_n: Keep at most this many of the highest-scoring chunks (None keeps all)
+
+    Returns:
+        List[str]: Selected chunks, in document order
+    """
+    return [chunks[i] for i in _select_indices(chunks, threshold, top_n)]
+
+def _select_indices(chunks: List[str], threshold: Optional[float], top_n: Optional[int]) -> List[int]:
+    ranked = rank_chunks(chunks)
+    if threshold is not None:
+        ranked = [(i, score) for i, score in ranked if score >= threshold]
+    if top_n is not None:
+        ranked = ranked[:top_n]
+    return sorted(i for i, _ in ranked)
+
+def measure_recall(
+    samples: Iterable[Tuple[str, bool]],
+    threshold: Optional[float] = DEFAULT_THRESHOLD,
+    top_n: Optional[int] = None
+) -> Dict[str, float]:
+    """
+    Measure the prefilter against chunks labeled by whether they contain requirements.
+
+    Args:
+        samples: (chunk text, contains requirements) pairs
+        threshold: Threshold passed to select_requirement_chunks
+        top_n: Top-N limit passed to select_requirement_chunks
+
+    Returns:
+        Dict with "recall", "precision" and "kept" (fraction of chunks sent to the model)
+    """
+    samples = list(samples)
+    kept = set(_select_indices([chunk for chunk, _ in samples], threshold, top_n))
+
+    true_positives = sum(1 for i, (_, label) in enumerate(samples) if label and i in kept)
+    positives = sum(1 for _, label in samples if label)
+    return {
+        "recall": true_positives / positives if positives else 1.0,
+        "precision": true_positives / len(kept) if kept else 1.0,
+        "kept": len(kept) / len(samples) if samples else 0.0
+    }
+
+if __name__ == "__main__":
+    # Usage: python prefilter.py labeled.jsonl [threshold]
+    # Each line of the file is {"text": "...", "has_requirements": true|false}
+    with open(sys.argv[1], "r", encoding="utf-8") as file:
+        rows = [json.loads(line) for line in file if line.strip()]
+    labeled = [(row["text"], bool(row["has_requirements"])) for row in rows]
+    threshold = float(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_THRESHOLD
+    print(json.dumps(measure_recall(labeled, threshold=threshold), indent=2))
@@ -0,0 +1,278 @@
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterable, Iterator, Optional
+
+DEFAULT_PROFILE_DIR = os.environ.get(
+    "RFP_PROFILE_DIR",
+    os.path.join(os.environ.get("RFP_ANALYZER_CACHE_DIR", ".rfp_cache"), "profiles")
+)
+# 200 samples a second keeps the sampler's share of the GIL well under a percent
+DEFAULT_SAMPLE_INTERVAL = float(os.environ.get("RFP_PROFILE_INTERVAL", 0.005))
+# Operator-level torch traces are large; only the first few generate calls of a run get one
+DEFAULT_TRACED_GENERATE_CALLS = int(os.environ.get("RFP_PROFILE_TORCH_CALLS", 2))
+_MAX_STACK_DEPTH = 128
+
+# Chrome trace rows
+_PIPELINE_TID = 1
+_MODEL_TID = 2
+_TORCH_TID = 3
+
+# The profiler of the analysis running in this thread; Streamlit runs each session in its own thread.
+# Work handed to another thread is only attributed when it carries the profiler along (see
+# active_profiler); document parsing in worker processes shows up as the submitting thread's wait
+_ACTIVE: ContextVar[Optional["PipelineProfiler"]] = ContextVar("rfp_profiler", default=None)
+
+def begin_stage(name: str) -> None:
+    """
+    Mark the start of a pipeline stage, ending the previous one.
+
+    Does nothing unless an analysis is being profiled in this thread.
+
+    Args:
+        name: Stage name, e.g. "parse", "summarize" or "report"
+    """
+    profiler = _ACTIVE.get()
+    if profiler is not None:
+        profiler.begin_stage(name)
+
+@contextmanager
+def profile_generate(model: Any, input_ids: Any) -> Iterator[None]:
+    """
+    Record a model.generate call of a profiled analysis.
+
+    Args:
+        model: The model about to generate
+        input_ids: The batch of prompt token ids
+    """
+    profiler = _ACTIVE.get()
+    if profiler is None:
+        yield
+        return
+    with profiler.generate(model, input_ids):
+        yield
+
+def active_profiler() -> Optional["PipelineProfiler"]:
+    """
+    Returns:
+        The profiler of the analysis running in this thread, for work that will run on another one
+    """
+    return _ACTIVE.get()
+
+@contextmanager
+def profile_forward(profilers: Iterable[Optional["PipelineProfiler"]], phase: str, batch_size: int) -> Iterator[None]:
+    """
+    Record a forward pass run on a shared thread on behalf of profiled analyses.
+
+    Args:
+        profilers: Profilers of the requests in the pass (None for unprofiled ones)
+        phase: "prefill" or "decode"
+        batch_size: Number of sequences in the pass
+    """
+    profilers = [profiler for profiler in dict.fromkeys(profilers) if profiler is not None]
+    start = {profiler: profiler.begin_forward(phase) for profiler in profilers}
+    try:
+        yield
+    finally:
+        for profiler in profilers:
+            profiler.end_forward(phase, start[profiler], batch_size)
+
+def _frame_name(code: Any) -> str:
+    # Collapsed stacks are ';'-separated, one stack and its count per line
+    return f"{code.co_name} ({os.path.basename(code.co_filename)})".replace(";", ":")
+
+class PipelineProfiler:
+    """
+    Low-overhead profile of one analysis, from parsing to the report.
+
+    A background thread samples the Python stack of the profiled thread at a
+    fixed interval, prefixed with the current pipeline stage and, during
+    generation, whether the model is in prefill or decode. Stage boundaries,
+    generate calls and every forward pass are recorded as spans, and the
+    first generate calls also run under the torch profiler for an
+    operator-level trace. The profile may span several sessions (Streamlit
+    reruns): uploads are parsed in one run and analyzed in a later one.
+    """
+
+    def __init__(
+        self,
+        interval: float = DEFAULT_SAMPLE_INTERVAL,
+        traced_generate_calls: int = DEFAULT_TRACED_GENERATE_CALLS
+    ):
+        self.interval = interval
+        self.traced_generate_calls = traced_generate_calls
+        self.run_id = time.strftime("%Y%m%d-%H%M%S") + "-" + uuid.uuid4().hex[:6]
+        self.origin = time.perf_counter()
+        self.samples = Counter()
+        self.events = []
+        self.stage = None
+        self.stage_start = 0.0
+        self.phase = None
+        self.generate_calls = 0
+        self.thread_id = None
+        self._stop = threading.Event()
+        self._sampler = None
+
+    def _now_us(self) -> float:
+        return (time.perf_counter() - self.origin) * 1e6
+
+    def _span(self, name: str, tid: int, start_us: float, end_us: float, args: Optional[Dict[str, Any]] = None) -> None:
+        event = {"name": name, "ph": "X", "pid": 1, "tid": tid, "ts": start_us, "dur": max(end_us - start_us, 0.0)}
+        if args:
+            event["args"] = args
+        self.events.append(event)
+
+    @contextmanager
+    def session(self) -> Iterator["PipelineProfiler"]:
+        """Profile the calling thread until the block exits."""
+        self.thread_id = threading.get_ident()
+        self._stop.clear()
+        self._sampler = threading.Thread(target=self._sample, name="rfp-profiler", daemon=True)
+        self._sampler.start()
+        token = _ACTIVE.set(self)
+        try:
+            yield self
+        finally:
+            _ACTIVE.reset(token)
+            self.end_stage()
+            self._stop.set()
+            self._sampler.join()
+
+    def _sample(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None and len(stack) < _MAX_STACK_DEPTH:
+                if frame.f_code.co_filename != __file__:
+                    stack.append(_frame_name(frame.f_code))
+                frame = frame.f_back
+            prefix = [f"[{self.stage or 'other'}]"] + ([f"[{self.phase}]"] if self.phase else [])
+            self.samples[";".join(prefix + stack[::-1])] += 1
+
+    def begin_stage(self, name: str) -> None:
+        self.end_stage()
+        self.stage = name
+        self.stage_start = self._now_us()
+
+    def end_stage(self) -> None:
+        if self.stage is not None:
+            self._span(self.stage, _PIPELINE_TID, self.stage_start, self._now_us())
+            self.stage = None
+
+    @contextmanager
+    def generate(self, model: Any, input_ids: Any) -> Iterator[None]:
+        """Record one generate call, its forward passes and, for the first calls, its torch operators."""
+        shape = tuple(getattr(input_ids, "shape", ()))
+        args = {"batch_size": shape[0] if shape else None, "prompt_tokens": shape[1] if len(shape) > 1 else None}
+        forwards = []
+
+        def before_forward(module: Any, inputs: Any) -> None:
+            # Sessions sharing the model run forward passes on their own threads
+            if threading.get_ident() == self.thread_id:
+                self.phase = "prefill" if not forwards else "decode"
+                forwards.append([self.phase, self._now_us(), None])
+
+        def after_forward(module: Any, inputs: Any, output: Any) -> None:
+            if threading.get_ident() == self.thread_id and forwards:
+                forwards[-1][2] = self._now_us()
+
+        hooks = []
+        if hasattr(model, "register_forward_pre_hook"):
+            hooks = [model.register_forward_pre_hook(before_forward), model.register_forward_hook(after_forward)]
+
+        torch_profile = None
+        if self.generate_calls < self.traced_generate_calls:
+            try:
+                from torch.profiler import ProfilerActivity, profile
+                torch_profile = profile(activities=[ProfilerActivity.CPU])
+                torch_profile.__enter__()
+            except Exception:
+                # Another profiler is running or this build has none; the sampled profile still covers the call
+                torch_profile = None
+        self.generate_calls += 1
+
+        start = self._now_us()
+        try:
+            yield
+        finally:
+            end = self._now_us()
+            for hook in hooks:
+                hook.remove()
+            self.phase = None
+            if torch_profile is not None:
+                torch_profile.__exit__(None, None, None)
+                self._add_torch_events(torch_profile, start)
+
+            args["forward_passes"] = len(forwards)
+            self._span("generate", _MODEL_TID, start, end, args)
+            for phase, forward_start, forward_end in forwards:
+                self._span(phase, _MODEL_TID, forward_start, forward_end or end)
+
+    def begin_forward(self, phase: str) -> float:
+        """Tag samples with the phase of a forward pass another thread runs for this analysis."""
+        self.phase = phase
+        return self._now_us()
+
+    def end_forward(self, phase: str, start_us: float, batch_size: int) -> None:
+        self.phase = None
+        self._span(phase, _MODEL_TID, start_us, self._now_us(), {"batch_size": batch_size})
+
+    def _add_torch_events(self, torch_profile: Any, offset_us: float) -> None:
+        # Operator times are relative to the start of the torch trace, which began with the generate span
+        for event in torch_profile.events():
+            self._span(event.name, _TORCH_TID, offset_us + event.time_range.start, offset_us + event.time_range.end)
+
+    def stage_seconds(self) -> Dict[str, float]:
+        """
+        Returns:
+            Dict of wall time per pipeline stage, in seconds
+        """
+        seconds = {}
+        for event in self.events:
+            if event["tid"] == _PIPELINE_TID:
+                seconds[event["name"]] = seconds.get(event["name"], 0.0) + event["dur"] / 1e6
+        return seconds
+
+    def chrome_trace(self) -> Dict[str, Any]:
+        names = {_PIPELINE_TID: "pipeline stages", _MODEL_TID: "model.generate", _TORCH_TID: "torch operators"}
+        metadata = [
+            {"name": "thread_name", "ph": "M", "pid": 1, "tid": tid, "args": {"name": name}}
+            for tid, name in names.items()
+        ]
+        return {"traceEvents": metadata + sorted(self.events, key=lambda e: e["ts"]), "displayTimeUnit": "ms"}
+
+    def collapsed_stacks(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
+
+    def write(self, directory: str = DEFAULT_PROFILE_DIR) -> Dict[str, str]:
+        """
+        Write the flamegraph input and the Chrome trace of this run.
+
+        Args:
+            directory: Directory of profile files
+
+        Returns:
+            Dict with the paths of the "flamegraph" (collapsed stacks, for
+            flamegraph.pl or speedscope) and "trace" (for chrome://tracing
+            or Perfetto) files
+        """
+        os.makedirs(directory, exist_ok=True)
+        paths = {
+            "flamegraph": os.path.join(directory, f"{self.run_id}.collapsed"),
+            "trace": os.path.join(directory, f"{self.run_id}.trace.json")
+        }
+        contents = {"flamegraph": self.collapsed_stacks(), "trace": json.dumps(self.chrome_trace())}
+        for kind, path in paths.items():
+            # Write to a temporary file first so a partial profile is never left behind
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as file:
+                file.write(contents[kind])
+            os.replace(tmp_path, path)
+        return paths
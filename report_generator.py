@@ -1,121 +1,73 @@
-from typing import Dict, List
+from typing import Any, Dict, List, Optional, TextIO
+from html import escape
+from string import Template
 import datetime
+import io
 
-def generate_report(
-    summary: str,
-    criteria: List[Dict[str, str]],
-    evaluation: str,
-    verdict: Dict[str, str]
-) -> str:
-    """
-    Generate an HTML report summarizing the RFP analysis.
-    
-    Args:
-        summary: RFP summary
-        criteria: List of eligibility criteria
-        evaluation: Company evaluation against criteria
-        verdict: Final verdict with decision and reasoning
-        
-    Returns:
-        str: HTML report
-    """
-    # Determine verdict class for styling
-    verdict_class = ""
-    if verdict["decision"] == "ELIGIBLE":
-        verdict_class = "eligible"
-    elif verdict["decision"] == "NOT ELIGIBLE":
-        verdict_class = "not-eligible"
-    else:
-        verdict_class = "unclear"
-    
-    # Format criteria into HTML
-    criteria_html = ""
-    for i, criterion in enumerate(criteria):
-        importance_class = criterion["importance"].lower().replace("-", "")
-        criteria_html += f"""
-        <div class="criterion {importance_class}">
-            <span class="number">{i+1}</span>
-            <div class="content">
-                <p>{criterion["description"]}</p>
-                <span class="badge {importance_class}">{criterion["importance"]}</span>
-            </div>
-        </div>
-        """
-    
-    # Current date/time for the report
-    now = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    
-    # Build the HTML report
-    html = f"""<!DOCTYPE html>
-<html lang="en">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>RFP Eligibility Analysis Report</title>
-    <style>
-        body {{
+# Stylesheet shared by all reports, inlined or written once with write_stylesheet
+REPORT_STYLE = """        body {
             font-family: Arial, sans-serif;
             line-height: 1.6;
             color: #333;
             max-width: 1000px;
             margin: 0 auto;
             padding: 20px;
-        }}
-        header {{
+        }
+        header {
             text-align: center;
             margin-bottom: 30px;
             padding-bottom: 20px;
             border-bottom: 1px solid #ddd;
-        }}
-        h1, h2, h3 {{
+        }
+        h1, h2, h3 {
             color: #2c3e50;
-        }}
-        .timestamp {{
+        }
+        .timestamp {
             color: #7f8c8d;
             font-size: 0.9em;
             margin-top: 10px;
-        }}
-        .section {{
+        }
+        .section {
             margin-bottom: 30px;
             padding: 20px;
             background-color: #f9f9f9;
             border-radius: 5px;
-        }}
-        .verdict {{
+        }
+        .verdict {
             padding: 20px;
             border-radius: 5px;
             margin: 30px 0;
             text-align: center;
-        }}
-        .eligible {{
+        }
+        .eligible {
             background-color: #d4edda;
             border: 1px solid #c3e6cb;
             color: #155724;
-        }}
-        .not-eligible {{
+        }
+        .not-eligible {
             background-color: #f8d7da;
             border: 1px solid #f5c6cb;
             color: #721c24;
-        }}
-        .unclear {{
+        }
+        .unclear {
             background-color: #fff3cd;
             border: 1px solid #ffeeba;
             color: #856404;
-        }}
-        .decision {{
+        }
+        .decision {
             font-size: 1.8em;
             font-weight: bold;
             margin-bottom: 15px;
-        }}
-        .criterion {{
+        }
+        .criterion {
             display: flex;
             margin-bottom: 15px;
             background-color: white;
             padding: 15px;
             border-radius: 5px;
             box-shadow: 0 1px 3px rgba(0,0,0,0.1);
-        }}
-        .number {{
+        }
+        .number {
             background-color: #3498db;
             color: white;
             width: 25px;
@@ -125,72 +77,497 @@ def generate_report(
             align-items: center;
             justify-content: center;
             margin-right: 15px;
-        }}
-        .content {{
+        }
+        .content {
             flex-grow: 1;
-        }}
-        .badge {{
+        }
+        .badge {
             display: inline-block;
             padding: 3px 8px;
             font-size: 0.8em;
             border-radius: 3px;
             margin-top: 5px;
-        }}
-        .critical {{
+        }
+        .critical {
             background-color: #f8d7da;
             color: #721c24;
-        }}
-        .important {{
+        }
+        .important {
             background-color: #cce5ff;
             color: #004085;
-        }}
-        .nicetohave {{
+        }
+        .nicetohave {
             background-color: #d1ecf1;
             color: #0c5460;
-        }}
-        pre {{
+        }
+        .matrix {
+            width: 100%;
+            border-collapse: collapse;
+            background-color: white;
+        }
+        .matrix th, .matrix td {
+            padding: 8px;
+            border: 1px solid #ddd;
+            text-align: left;
+        }
+        .matrix .status {
+            text-align: center;
+            font-weight: bold;
+        }
+        .fullymeets {
+            background-color: #d4edda;
+            color: #155724;
+        }
+        .doesnotmeet {
+            background-color: #f8d7da;
+            color: #721c24;
+        }
+        .new {
+            background-color: #fff3cd;
+            color: #856404;
+            font-weight: bold;
+        }
+        .removed {
+            text-decoration: line-through;
+            color: #7f8c8d;
+        }
+        pre {
             white-space: pre-wrap;
             background-color: #f8f9fa;
             padding: 15px;
             border-radius: 5px;
             border-left: 4px solid #007bff;
-        }}
-    </style>
+        }
+"""
+
+# Templates are compiled once at import and filled per report
+_DOCUMENT_START = Template("""<!DOCTYPE html>
+<html lang="en">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>$title</title>
+$stylesheet
 </head>
 <body>
     <header>
-        <h1>RFP Eligibility Analysis Report</h1>
-        <p class="timestamp">Generated on: {now}</p>
+        <h1>$title</h1>
+        <p class="timestamp">Generated on: $now</p>
     </header>
+""")
+
+_INLINE_STYLESHEET = "    <style>\n" + REPORT_STYLE + "    </style>"
 
+_LINKED_STYLESHEET = Template('    <link rel="stylesheet" href="$href">')
+
+_DOCUMENT_END = """
+    <footer>
+        <p><strong>Note:</strong> This analysis was performed using a local language model. While efforts have been made to ensure accuracy, manual verification of the results is recommended.</p>
+    </footer>
+</body>
+</html>
+"""
+
+_SUMMARY_SECTION = Template("""
     <div class="section">
         <h2>RFP Summary</h2>
-        <p>{summary}</p>
+        <p>$summary</p>
+    </div>
+""")
+
+_CRITERION = Template("""
+        <div class="criterion $importance_class">
+            <span class="number">$number</span>
+            <div class="content">
+                <p>$description</p>
+                <span class="badge $importance_class">$importance</span>$new_badge
+            </div>
+        </div>
+        """)
+
+_CHANGES_SECTION = Template("""
+    <div class="section">
+        <h2>Changes Since Previous Version</h2>
+        <p>$added_chunks new or changed sections, $removed_chunks removed, $unchanged_chunks unchanged.</p>
+        <p>$added_criteria new criteria (marked NEW below), $removed_criteria criteria no longer present.</p>
+        <ul>$removed_html</ul>
+    </div>
+""")
+
+_REMOVED_CRITERION = Template('<li class="removed">$description ($importance)</li>')
+
+_EVALUATION_SECTION = Template("""
+    <div class="section">
+        <h2>Company Evaluation</h2>
+        <pre>$evaluation</pre>
+    </div>
+""")
+
+_VERDICT = Template("""
+    <div class="verdict $verdict_class">$heading
+        <div class="decision">$decision</div>
+        <p>$reasoning</p>
     </div>
+""")
+
+_MATRIX_ROW = Template("""
+            <tr>
+                <td>$number. $description <span class="badge $importance_class">$importance</span>$new_badge</td>
+                $cells
+            </tr>""")
+
+_MATRIX_CELL = Template('<td class="status $status_class">$status</td>')
 
+_PORTFOLIO_ROW = Template("""
+            <tr>
+                <td>$name</td>
+                <td>$company</td>
+                <td class="status $verdict_class">$decision</td>
+                <td>$criteria</td>
+                <td>$reasoning</td>
+            </tr>""")
+
+_PORTFOLIO_TOTALS = Template("""
+    <div class="section">
+        <h2>Portfolio Totals</h2>
+        <p>$total RFP verdicts: $eligible eligible, $not_eligible not eligible, $unclear unclear.</p>
+    </div>
+""")
+
+_NEW_BADGE = ' <span class="badge new">NEW</span>'
+
+def get_verdict_class(decision: str) -> str:
+    """
+    Map a verdict decision to the CSS class used to style it.
+    
+    Args:
+        decision: Verdict decision ("ELIGIBLE", "NOT ELIGIBLE", ...)
+        
+    Returns:
+        str: CSS class name
+    """
+    if decision == "ELIGIBLE":
+        return "eligible"
+    elif decision == "NOT ELIGIBLE":
+        return "not-eligible"
+    else:
+        return "unclear"
+
+def write_stylesheet(path: str) -> None:
+    """
+    Write the report stylesheet to a file so reports can link to it.
+    
+    Args:
+        path: Destination path of the CSS file
+    """
+    with open(path, "w", encoding="utf-8") as file:
+        file.write(REPORT_STYLE)
+
+def format_criteria_html(criteria: List[Dict[str, str]], added: Optional[List[Dict[str, str]]] = None) -> str:
+    """
+    Format the eligibility criteria as numbered report entries.
+    
+    Args:
+        criteria: List of eligibility criteria
+        added: Criteria that are new since the previous document version
+        
+    Returns:
+        str: HTML fragment with one entry per criterion
+    """
+    added_descriptions = {c["description"] for c in added or []}
+    return "".join(
+        _CRITERION.substitute(
+            importance_class=_importance_class(criterion["importance"]),
+            number=i + 1,
+            description=escape(criterion["description"]),
+            importance=escape(criterion["importance"]),
+            new_badge=_NEW_BADGE if criterion["description"] in added_descriptions else ""
+        )
+        for i, criterion in enumerate(criteria)
+    )
+
+def format_changes_html(changes: Optional[Dict[str, Any]]) -> str:
+    """
+    Format the differences versus the previous version of an amended RFP.
+    
+    Args:
+        changes: Change summary returned by incremental.reanalyze_rfp, or None
+        
+    Returns:
+        str: HTML section, or an empty string when there is no previous version
+    """
+    if not changes:
+        return ""
+    
+    removed_html = "".join(
+        _REMOVED_CRITERION.substitute(description=escape(c["description"]), importance=escape(c["importance"]))
+        for c in changes["removed_criteria"]
+    )
+    return _CHANGES_SECTION.substitute(
+        added_chunks=changes["added_chunks"],
+        removed_chunks=changes["removed_chunks"],
+        unchanged_chunks=changes["unchanged_chunks"],
+        added_criteria=len(changes["added_criteria"]),
+        removed_criteria=len(changes["removed_criteria"]),
+        removed_html=removed_html
+    )
+
+def write_report(
+    sink: TextIO,
+    summary: str,
+    criteria: List[Dict[str, str]],
+    evaluation: str,
+    verdict: Dict[str, str],
+    changes: Optional[Dict[str, Any]] = None,
+    stylesheet_href: Optional[str] = None
+) -> None:
+    """
+    Stream an HTML report summarizing the RFP analysis to a file-like sink.
+    
+    Args:
+        sink: Text file-like object the report is written to
+        summary: RFP summary
+        criteria: List of eligibility criteria
+        evaluation: Company evaluation against criteria
+        verdict: Final verdict with decision and reasoning
+        changes: Optional differences versus the previous version of the RFP
+        stylesheet_href: Link to a shared stylesheet instead of inlining it
+    """
+    _write_document_start(sink, "RFP Eligibility Analysis Report", stylesheet_href)
+    sink.write(_SUMMARY_SECTION.substitute(summary=escape(summary)))
+    sink.write(format_changes_html(changes))
+    
+    sink.write("""
     <div class="section">
         <h2>Eligibility Criteria</h2>
         <p>The following criteria were extracted from the RFP document:</p>
         <div class="criteria-list">
-            {criteria_html}
+            """)
+    sink.write(format_criteria_html(criteria, changes["added_criteria"] if changes else None))
+    sink.write("""
         </div>
     </div>
+""")
+    
+    sink.write(_EVALUATION_SECTION.substitute(evaluation=escape(evaluation)))
+    sink.write(_format_verdict_html(verdict))
+    sink.write(_DOCUMENT_END)
+
+def generate_report(
+    summary: str,
+    criteria: List[Dict[str, str]],
+    evaluation: str,
+    verdict: Dict[str, str],
+    changes: Optional[Dict[str, Any]] = None,
+    stylesheet_href: Optional[str] = None
+) -> str:
+    """
+    Generate an HTML report summarizing the RFP analysis.
+    
+    Args:
+        summary: RFP summary
+        criteria: List of eligibility criteria
+        evaluation: Company evaluation against criteria
+        verdict: Final verdict with decision and reasoning
+        changes: Optional differences versus the previous version of the RFP
+        stylesheet_href: Link to a shared stylesheet instead of inlining it
+        
+    Returns:
+        str: HTML report
+    """
+    sink = io.StringIO()
+    write_report(sink, summary, criteria, evaluation, verdict, changes, stylesheet_href)
+    return sink.getvalue()
 
+def write_multi_profile_report(
+    sink: TextIO,
+    summary: str,
+    criteria: List[Dict[str, str]],
+    matrix: Dict[str, List[str]],
+    verdicts: Dict[str, Dict[str, str]],
+    changes: Optional[Dict[str, Any]] = None,
+    stylesheet_href: Optional[str] = None
+) -> None:
+    """
+    Stream an HTML report screening one RFP against several company profiles.
+    
+    Args:
+        sink: Text file-like object the report is written to
+        summary: RFP summary
+        criteria: List of eligibility criteria
+        matrix: Per-company list of criterion statuses, aligned with criteria
+        verdicts: Per-company verdict with decision and reasoning
+        changes: Optional differences versus the previous version of the RFP
+        stylesheet_href: Link to a shared stylesheet instead of inlining it
+    """
+    companies = list(matrix)
+    added_descriptions = {c["description"] for c in changes["added_criteria"]} if changes else set()
+    
+    _write_document_start(sink, "RFP Multi-Profile Eligibility Report", stylesheet_href)
+    sink.write(_SUMMARY_SECTION.substitute(summary=escape(summary)))
+    sink.write(format_changes_html(changes))
+    
+    # Criteria x company matrix
+    header_html = "".join(f"<th>{escape(name)}</th>" for name in companies)
+    sink.write(f"""
     <div class="section">
-        <h2>Company Evaluation</h2>
-        <pre>{evaluation}</pre>
+        <h2>Eligibility Matrix</h2>
+        <p>Each extracted criterion evaluated against every company profile:</p>
+        <table class="matrix">
+            <tr><th>Criterion</th>{header_html}</tr>""")
+    for i, criterion in enumerate(criteria):
+        cells = "".join(
+            _MATRIX_CELL.substitute(status_class=matrix[name][i].lower().replace(" ", ""), status=matrix[name][i])
+            for name in companies
+        )
+        sink.write(_MATRIX_ROW.substitute(
+            number=i + 1,
+            description=escape(criterion["description"]),
+            importance_class=_importance_class(criterion["importance"]),
+            importance=escape(criterion["importance"]),
+            new_badge=_NEW_BADGE if criterion["description"] in added_descriptions else "",
+            cells=cells
+        ))
+    sink.write("""
+        </table>
     </div>
-
-    <div class="verdict {verdict_class}">
-        <div class="decision">{verdict["decision"]}</div>
-        <p>{verdict["reasoning"]}</p>
+""")
+    
+    # One verdict block per company
+    sink.write("""
+    <div class="section">
+        <h2>Verdicts</h2>""")
+    for name in companies:
+        sink.write(_format_verdict_html(verdicts[name], heading=name))
+    sink.write("""
     </div>
+""")
+    sink.write(_DOCUMENT_END)
 
-    <footer>
-        <p><strong>Note:</strong> This analysis was performed using a local language model. While efforts have been made to ensure accuracy, manual verification of the results is recommended.</p>
-    </footer>
-</body>
-</html>
-"""
+def generate_multi_profile_report(
+    summary: str,
+    criteria: List[Dict[str, str]],
+    matrix: Dict[str, List[str]],
+    verdicts: Dict[str, Dict[str, str]],
+    changes: Optional[Dict[str, Any]] = None,
+    stylesheet_href: Optional[str] = None
+) -> str:
+    """
+    Generate an HTML report screening one RFP against several company profiles.
     
-    return html
+    Args:
+        summary: RFP summary
+        criteria: List of eligibility criteria
+        matrix: Per-company list of criterion statuses, aligned with criteria
+        verdicts: Per-company verdict with decision and reasoning
+        changes: Optional differences versus the previous version of the RFP
+        stylesheet_href: Link to a shared stylesheet instead of inlining it
+        
+    Returns:
+        str: HTML report
+    """
+    sink = io.StringIO()
+    write_multi_profile_report(sink, summary, criteria, matrix, verdicts, changes, stylesheet_href)
+    return sink.getvalue()
+
+class PortfolioReportWriter:
+    """
+    Stream a portfolio report summarizing the verdicts of many RFPs.
+    
+    Each verdict (one per RFP and company profile) becomes one table row
+    written as soon as it is added, so only running totals are kept in
+    memory, never the per-RFP reports.
+    
+    Usage:
+        with open("portfolio.html", "w") as sink, PortfolioReportWriter(sink) as portfolio:
+            for name, criteria, verdict in results:
+                portfolio.add(name, verdict, len(criteria))
+    """
+    
+    def __init__(self, sink: TextIO, title: str = "RFP Portfolio Report", stylesheet_href: Optional[str] = None):
+        self.sink = sink
+        self.counts = {"eligible": 0, "not-eligible": 0, "unclear": 0}
+        self.closed = False
+        
+        _write_document_start(sink, title, stylesheet_href)
+        sink.write("""
+    <div class="section">
+        <h2>Verdicts</h2>
+        <table class="matrix">
+            <tr><th>RFP</th><th>Company</th><th>Decision</th><th>Criteria</th><th>Reasoning</th></tr>""")
+    
+    def add(
+        self,
+        name: str,
+        verdict: Dict[str, str],
+        criteria_count: int,
+        company: str = "",
+        report_href: Optional[str] = None
+    ) -> None:
+        """
+        Write the row of one RFP verdict.
+        
+        Args:
+            name: RFP name or identifier
+            verdict: Verdict with decision and reasoning
+            criteria_count: Number of eligibility criteria extracted from the RFP
+            company: Company profile the verdict is for
+            report_href: Link to the RFP's own report
+        """
+        verdict_class = get_verdict_class(verdict["decision"])
+        self.counts[verdict_class] += 1
+        self.sink.write(_PORTFOLIO_ROW.substitute(
+            name=f'<a href="{escape(report_href)}">{escape(name)}</a>' if report_href else escape(name),
+            company=escape(company),
+            verdict_class=verdict_class,
+            decision=escape(verdict["decision"]),
+            criteria=criteria_count,
+            reasoning=escape(verdict["reasoning"])
+        ))
+    
+    def close(self) -> None:
+        """
+        Write the totals and the end of the document.
+        """
+        if self.closed:
+            return
+        self.closed = True
+        self.sink.write("""
+        </table>
+    </div>
+""")
+        self.sink.write(_PORTFOLIO_TOTALS.substitute(
+            total=sum(self.counts.values()),
+            eligible=self.counts["eligible"],
+            not_eligible=self.counts["not-eligible"],
+            unclear=self.counts["unclear"]
+        ))
+        self.sink.write(_DOCUMENT_END)
+    
+    def __enter__(self) -> "PortfolioReportWriter":
+        return self
+    
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+def _importance_class(importance: str) -> str:
+    return importance.lower().replace("-", "").replace(" ", "")
+
+def _format_verdict_html(verdict: Dict[str, str], heading: Optional[str] = None) -> str:
+    return _VERDICT.substitute(
+        verdict_class=get_verdict_class(verdict["decision"]),
+        heading=f"\n        <h3>{escape(heading)}</h3>" if heading else "",
+        decision=escape(verdict["decision"]),
+        reasoning=escape(verdict["reasoning"])
+    )
+
+def _write_document_start(sink: TextIO, title: str, stylesheet_href: Optional[str]) -> None:
+    if stylesheet_href:
+        stylesheet = _LINKED_STYLESHEET.substitute(href=escape(stylesheet_href))
+    else:
+        stylesheet = _INLINE_STYLESHEET
+    sink.write(_DOCUMENT_START.substitute(
+        title=escape(title),
+        stylesheet=stylesheet,
+        now=datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    ))
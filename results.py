@@ -0,0 +1,364 @@
+import re
+import struct
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import BinaryIO, Dict, Iterator, List, Optional, Tuple
+
+class Importance(Enum):
+    """Importance of an eligibility criterion. Members are singletons, so runs share them."""
+    CRITICAL = "Critical"
+    IMPORTANT = "Important"
+    NICE_TO_HAVE = "Nice-to-have"
+
+    @classmethod
+    def parse(cls, label: str) -> "Importance":
+        """
+        Map a free-text importance label to a member, like analyzer.normalize_importance.
+
+        Args:
+            label: Importance label produced by the model or a dict-based criterion
+
+        Returns:
+            Importance: Matching member, IMPORTANT when the label is not recognized
+        """
+        label = label.lower()
+        if any(k in label for k in ("critical", "required", "must", "mandatory")): return cls.CRITICAL
+        if any(k in label for k in ("important", "should")): return cls.IMPORTANT
+        if any(k in label for k in ("nice", "prefer", "optional")): return cls.NICE_TO_HAVE
+        return cls.IMPORTANT
+
+class Status(Enum):
+    """Outcome of evaluating a company against one criterion."""
+    FULLY_MEETS = "FULLY MEETS"
+    DOES_NOT_MEET = "DOES NOT MEET"
+    UNCLEAR = "UNCLEAR"
+
+@dataclass(slots=True)
+class Criterion:
+    description: str
+    importance: Importance
+
+    @classmethod
+    def from_dict(cls, item: Dict[str, str]) -> "Criterion":
+        return cls(item["description"], Importance.parse(item["importance"]))
+
+    def to_dict(self) -> Dict[str, str]:
+        return {"description": self.description, "importance": self.importance.value}
+
+@dataclass(slots=True)
+class CriterionEvaluation:
+    status: Status = Status.UNCLEAR
+    text: str = ""
+
+@dataclass(slots=True)
+class Verdict:
+    decision: str
+    reasoning: str
+
+    @classmethod
+    def from_dict(cls, item: Dict[str, str]) -> "Verdict":
+        return cls(item["decision"], item["reasoning"])
+
+    def to_dict(self) -> Dict[str, str]:
+        return {"decision": self.decision, "reasoning": self.reasoning}
+
+@dataclass(slots=True)
+class ParsedEvaluation:
+    """
+    Result of one pass over a free-text evaluation.
+
+    ``items`` is aligned with the evaluated criteria. The counters keep the
+    line-based rules determine_verdict has always applied.
+    """
+    items: List[CriterionEvaluation]
+    critical_fails: int = 0
+    important_fails: int = 0
+    fully_met: int = 0
+
+@dataclass(slots=True)
+class Screening:
+    """
+    Progress of a critical-first screening of one company profile.
+
+    ``items`` is aligned with the criteria; criteria that were not evaluated
+    because the screening stopped at a knockout are None.
+    """
+    items: List[Optional[CriterionEvaluation]]
+    knockout: Optional[int] = None
+
+    @property
+    def complete(self) -> bool:
+        return all(item is not None for item in self.items)
+
+@dataclass(slots=True)
+class ChunkResult:
+    """Generation results of one RFP chunk; criteria are None when extraction was skipped."""
+    summary: str
+    criteria: Optional[List[Criterion]]
+
+    def to_bytes(self) -> bytes:
+        out = bytearray(_CHUNK_MAGIC)
+        _write_str(out, self.summary)
+        if self.criteria is None:
+            out.append(0)
+        else:
+            out.append(1)
+            _write_criteria(out, self.criteria)
+        return bytes(out)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "ChunkResult":
+        if data[:len(_CHUNK_MAGIC)] != _CHUNK_MAGIC:
+            raise ValueError("Not an encoded chunk result (bad header)")
+        view = memoryview(data)
+        summary, pos = _read_str(view, len(_CHUNK_MAGIC))
+        criteria = _read_criteria(view, pos + 1)[0] if view[pos] else None
+        return cls(summary, criteria)
+
+@dataclass(slots=True)
+class AnalysisRun:
+    summary: str
+    criteria: List[Criterion]
+    evaluation: str
+    verdict: Verdict
+    evaluations: List[CriterionEvaluation] = field(default_factory=list)
+    # Names of the RFP and company profile, so a file of runs stands on its own
+    rfp: str = ""
+    company: str = ""
+
+    @classmethod
+    def from_results(
+        cls,
+        summary: str,
+        criteria: List[Dict[str, str]],
+        evaluation: str,
+        verdict: Dict[str, str],
+        rfp: str = "",
+        company: str = ""
+    ) -> "AnalysisRun":
+        """
+        Build a run from the dict/str results returned by the analyzer functions.
+
+        Args:
+            summary: RFP summary
+            criteria: List of eligibility criteria
+            evaluation: Company evaluation against criteria
+            verdict: Final verdict with decision and reasoning
+            rfp: Name of the RFP
+            company: Name of the company profile
+
+        Returns:
+            AnalysisRun: Typed run with the evaluation parsed per criterion
+        """
+        return cls(
+            summary=summary,
+            criteria=[Criterion.from_dict(c) for c in criteria],
+            evaluation=evaluation,
+            verdict=Verdict.from_dict(verdict),
+            evaluations=parse_evaluation(evaluation, len(criteria)).items,
+            rfp=rfp,
+            company=company
+        )
+
+    def to_bytes(self) -> bytes:
+        """
+        Serialize the run to the compact binary format.
+
+        Returns:
+            bytes: Encoded run
+        """
+        out = bytearray(_MAGIC)
+        _write_str(out, self.rfp)
+        _write_str(out, self.company)
+        _write_str(out, self.summary)
+        _write_criteria(out, self.criteria)
+        _write_str(out, self.evaluation)
+        _write_varint(out, len(self.evaluations))
+        for item in self.evaluations:
+            out.append(_STATUS_CODES[item.status])
+            _write_str(out, item.text)
+        _write_str(out, self.verdict.decision)
+        _write_str(out, self.verdict.reasoning)
+        return bytes(out)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "AnalysisRun":
+        """
+        Deserialize a run encoded with to_bytes.
+
+        Args:
+            data: Encoded run
+
+        Returns:
+            AnalysisRun: Decoded run
+        """
+        if data[:len(_MAGIC)] != _MAGIC:
+            raise ValueError("Not an encoded analysis run (bad header)")
+        view = memoryview(data)
+        pos = len(_MAGIC)
+
+        rfp, pos = _read_str(view, pos)
+        company, pos = _read_str(view, pos)
+        summary, pos = _read_str(view, pos)
+        criteria, pos = _read_criteria(view, pos)
+        evaluation, pos = _read_str(view, pos)
+        count, pos = _read_varint(view, pos)
+        evaluations = []
+        for _ in range(count):
+            status = _STATUSES[view[pos]]
+            text, pos = _read_str(view, pos + 1)
+            evaluations.append(CriterionEvaluation(status, text))
+        decision, pos = _read_str(view, pos)
+        reasoning, pos = _read_str(view, pos)
+
+        return cls(summary, criteria, evaluation, Verdict(decision, reasoning), evaluations, rfp, company)
+
+def parse_evaluation(evaluation: str, criteria_count: int) -> ParsedEvaluation:
+    """
+    Parse a free-text evaluation in a single pass over its lines.
+
+    Lines starting with a criterion number are attributed to that criterion;
+    the verdict counters look at every line, as determine_verdict always has.
+
+    Args:
+        evaluation: Evaluation text generated by the model
+        criteria_count: Number of criteria that were evaluated
+
+    Returns:
+        ParsedEvaluation: Per-criterion statuses and verdict counters
+    """
+    parsed = ParsedEvaluation([CriterionEvaluation() for _ in range(criteria_count)])
+    for line in evaluation.split('\n'):
+        lower = line.lower()
+        fails = "does not meet" in lower
+        meets = "fully meets" in lower
+        if fails:
+            if "critical" in lower: parsed.critical_fails += 1
+            if "important" in lower: parsed.important_fails += 1
+        if meets:
+            parsed.fully_met += 1
+        if not (fails or meets):
+            continue
+
+        stripped = line.strip()
+        digits = len(stripped) - len(stripped.lstrip("0123456789"))
+        if not digits:
+            continue
+        number = int(stripped[:digits])
+        if 0 < number <= criteria_count:
+            parsed.items[number - 1] = CriterionEvaluation(Status.DOES_NOT_MEET if fails else Status.FULLY_MEETS, stripped)
+    return parsed
+
+def evaluation_reason(line: str) -> str:
+    """
+    Reduce an evaluation line to its justification, dropping the number and status label.
+
+    Args:
+        line: One criterion's line of a model evaluation
+
+    Returns:
+        str: The remaining explanation (may be empty)
+    """
+    return _STATUS_LABEL.sub("", line.lstrip("0123456789").lstrip(".):- ")).strip(" :-")
+
+def format_evaluation(criteria: List[Dict[str, str]], items: List[CriterionEvaluation]) -> str:
+    """
+    Render per-criterion judgments as a numbered evaluation.
+
+    Each line names the criterion with its importance and status, so
+    parse_evaluation and determine_verdict read it like a model evaluation.
+
+    Args:
+        criteria: Evaluated criteria
+        items: Judgment of each criterion, with a justification as text
+
+    Returns:
+        str: One line per criterion
+    """
+    lines = []
+    for number, (criterion, item) in enumerate(zip(criteria, items), 1):
+        line = f"{number}. {criterion['description']} - {criterion['importance']}: {item.status.value}"
+        lines.append(f"{line} ({item.text})" if item.text else line)
+    return "\n".join(lines)
+
+def write_runs(file: BinaryIO, runs: List[AnalysisRun]) -> None:
+    """
+    Append length-prefixed encoded runs to a binary file, e.g. for job hand-off.
+
+    Args:
+        file: Binary file object opened for writing
+        runs: Runs to write
+    """
+    for run in runs:
+        data = run.to_bytes()
+        file.write(_LENGTH.pack(len(data)))
+        file.write(data)
+
+def read_runs(file: BinaryIO) -> Iterator[AnalysisRun]:
+    """
+    Read runs written with write_runs, one at a time.
+
+    Args:
+        file: Binary file object opened for reading
+
+    Yields:
+        AnalysisRun: Decoded runs in file order
+    """
+    while True:
+        header = file.read(_LENGTH.size)
+        if not header:
+            return
+        (length,) = _LENGTH.unpack(header)
+        yield AnalysisRun.from_bytes(file.read(length))
+
+# Binary format: header, then varint-length-prefixed UTF-8 strings and one-byte enum codes
+_MAGIC = b"RFPR\x01"
+_CHUNK_MAGIC = b"RFPC\x01"
+_STATUS_LABEL = re.compile(r"\b(?:fully meets|does not meet)\b[\s:.-]*", re.IGNORECASE)
+_LENGTH = struct.Struct("<I")
+_IMPORTANCES = list(Importance)
+_IMPORTANCE_CODES = {member: code for code, member in enumerate(_IMPORTANCES)}
+_STATUSES = list(Status)
+_STATUS_CODES = {member: code for code, member in enumerate(_STATUSES)}
+
+def _write_varint(out: bytearray, value: int) -> None:
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+def _read_varint(view: memoryview, pos: int) -> Tuple[int, int]:
+    value = 0
+    shift = 0
+    while True:
+        byte = view[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+def _write_str(out: bytearray, text: str) -> None:
+    data = text.encode("utf-8")
+    _write_varint(out, len(data))
+    out += data
+
+def _read_str(view: memoryview, pos: int) -> Tuple[str, int]:
+    length, pos = _read_varint(view, pos)
+    end = pos + length
+    return str(view[pos:end], "utf-8"), end
+
+def _write_criteria(out: bytearray, criteria: List[Criterion]) -> None:
+    _write_varint(out, len(criteria))
+    for criterion in criteria:
+        out.append(_IMPORTANCE_CODES[criterion.importance])
+        _write_str(out, criterion.description)
+
+def _read_criteria(view: memoryview, pos: int) -> Tuple[List[Criterion], int]:
+    count, pos = _read_varint(view, pos)
+    criteria = []
+    for _ in range(count):
+        importance = _IMPORTANCES[view[pos]]
+        description, pos = _read_str(view, pos + 1)
+        criteria.append(Criterion(description, importance))
+    return criteria, pos
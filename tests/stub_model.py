@@ -0,0 +1,80 @@
+import re
+from model_manager import NEW_TOKENS
+
+_SECTION = re.compile(r"\[Section \d+\]\n")
+_CRITERION = re.compile(r"^(\d+)\. (.*) - (?:Critical|Important|Nice-to-have)$", re.MULTILINE)
+_SENTENCE = re.compile(r"[^.]*\bmust\b[^.]*", re.IGNORECASE)
+
+class WordTokenizer:
+    """Counts whitespace-separated words as tokens."""
+
+    def __call__(self, text, add_special_tokens=True, **kwargs):
+        return {"input_ids": text.split()}
+
+class StubModel:
+    """
+    Answers the analyzer's prompts without a language model.
+
+    Summaries repeat the first words of a section, every sentence with "must"
+    is a Critical criterion, and a criterion is FULLY MEETS when the company
+    profile contains its description, otherwise DOES NOT MEET.
+    """
+
+    def __init__(self):
+        self.prompts = []
+
+    def answer(self, prompt):
+        if prompt.startswith("Evaluate"):
+            profile = prompt.split("Company Profile:", 1)[1].lower()
+            return "\n".join(
+                f"{n}. {'FULLY MEETS' if description.lower() in profile else 'DOES NOT MEET'} - {description}"
+                for n, description in _CRITERION.findall(prompt.split("Company Profile:", 1)[0])
+            )
+        if prompt.startswith("Extract"):
+            sections = self._sections(prompt, "Eligibility Criteria:")
+            answers = ["\n".join(f"{i + 1}. {s.strip()} - Critical" for i, s in enumerate(_SENTENCE.findall(section))) for section in sections]
+            return self._label(answers, prompt)
+        if prompt.startswith("Summarize"):
+            sections = self._sections(prompt, "Summaries:" if "Summaries:" in prompt else "Summary:")
+            return self._label([" ".join(section.split()[:6]) for section in sections], prompt)
+        return "Overall summary"
+
+    def _sections(self, prompt, answer_label):
+        body = prompt.rsplit(answer_label, 1)[0]
+        if "[Section 1]\n" in body:
+            return _SECTION.split(body)[1:]
+        return [re.split(r"\(RFP\):\n\n|RFP Section:\n", body, maxsplit=1)[1]]
+
+    def _label(self, answers, prompt):
+        # A packed prompt opens the answer with the first label
+        if "[Section 1]\n" not in prompt:
+            return answers[0]
+        return answers[0] + "".join(f"\n[Section {i + 1}]\n{answer}" for i, answer in enumerate(answers[1:], 1))
+
+    def generate_text(self, prompt, max_length=512, temperature=0.7, cancel_token=None, max_new_tokens=NEW_TOKENS):
+        self.prompts.append(prompt)
+        return self.answer(prompt)
+
+    def generate_batch(self, prompts, max_length=512, temperature=0.7, batch_size=8, cancel_token=None, max_new_tokens=NEW_TOKENS):
+        self.prompts.extend(prompts)
+        return [self.answer(prompt) for prompt in prompts]
+
+class CharTokenizer:
+    """Maps every character to one token of a 32-token vocabulary."""
+
+    eos_token_id = None
+    pad_token_id = None
+
+    def __call__(self, text, add_special_tokens=True, **kwargs):
+        return {"input_ids": [ord(c) % 32 for c in text]}
+
+    def decode(self, ids, skip_special_tokens=True):
+        return "".join(chr(ord("a") + i % 26) for i in ids)
+
+def tiny_model():
+    """A randomly initialized one-layer GPT-2 over CharTokenizer's vocabulary."""
+    import torch
+    from transformers import GPT2Config, GPT2LMHeadModel
+    torch.manual_seed(0)
+    config = GPT2Config(vocab_size=32, n_positions=128, n_embd=16, n_layer=1, n_head=2, bos_token_id=0, eos_token_id=0)
+    return GPT2LMHeadModel(config).eval()
@@ -0,0 +1,191 @@
+import pytest
+import analyzer
+from analyzer import (
+    MAX_PACKED_SECTIONS, build_criteria_matrix, complete_screenings, determine_verdicts, evaluate_companies_eligibility,
+    evaluate_with_cascade, extract_chunks_criteria, pack_chunks, screen_companies_eligibility, screening_evaluation,
+    summarize_chunks, CRITERIA_PACKED_PROMPT
+)
+from model_manager import NEW_TOKENS, CascadeStage
+from report_generator import generate_multi_profile_report
+from stub_model import StubModel, _CRITERION
+
+class WordTokenizer:
+    def __call__(self, text, add_special_tokens=True, **kwargs):
+        return {"input_ids": text.split()}
+
+class BudgetedModel:
+    """Answers every section of a packed prompt, stopping when it runs out of new tokens."""
+
+    def __init__(self, answer):
+        self.answer = answer
+        self.budgets = []
+
+    def generate_text(self, prompt, max_length=512, temperature=0.7, max_new_tokens=NEW_TOKENS, cancel_token=None):
+        self.budgets.append(max_new_tokens)
+        count = prompt.count("[Section ") - 1
+        words = []
+        for i in range(count):
+            # The prompt opens the answer with the first label
+            words += ([] if i == 0 else [f"[Section {i + 1}]"]) + self.answer.split()
+        return " ".join(words[:max_new_tokens])
+
+# An answer as long as an unpacked prompt may generate
+_ANSWER = " ".join(["word"] * (NEW_TOKENS - 2))
+
+@pytest.mark.parametrize("count", [2, MAX_PACKED_SECTIONS])
+def test_packed_summaries_answer_every_section(count):
+    model = BudgetedModel(_ANSWER)
+    summaries = summarize_chunks(model, WordTokenizer(), [f"chunk {i}" for i in range(count)])
+    assert len(summaries) == count
+    assert all(summaries)
+    assert model.budgets == [NEW_TOKENS * count]
+
+def test_packed_criteria_answer_every_section():
+    model = BudgetedModel("1. Description: ISO certified " + " ".join(["x"] * (NEW_TOKENS - 10)))
+    criteria = extract_chunks_criteria(model, WordTokenizer(), [f"chunk {i}" for i in range(3)])
+    assert len(criteria) == 3
+    assert all(criteria)
+
+def test_packing_is_capped_by_the_output_budget():
+    groups = pack_chunks(WordTokenizer(), ["short"] * (3 * MAX_PACKED_SECTIONS), CRITERIA_PACKED_PROMPT)
+    assert len(groups) == 3
+    assert all(len(group) == MAX_PACKED_SECTIONS for group in groups)
+
+CRITERIA = [
+    {"description": "The bidder must hold ISO 9001 certification", "importance": "Critical"},
+    {"description": "The bidder must have an office in Delhi", "importance": "Important"},
+    {"description": "The bidder must have 50 employees", "importance": "Nice-to-have"}
+]
+
+class BatchCountingModel(StubModel):
+    def __init__(self):
+        super().__init__()
+        self.batches = []
+
+    def generate_batch(self, prompts, **kwargs):
+        self.batches.append(len(prompts))
+        return super().generate_batch(prompts, **kwargs)
+
+def test_every_profile_is_evaluated_in_one_batched_pass():
+    model = BatchCountingModel()
+    profiles = {
+        "acme.txt": ["Acme: The bidder must hold ISO 9001 certification."],
+        "globex.txt": ["Globex: " + ", ".join(c["description"] for c in CRITERIA) + "."],
+        "initech.txt": ["Initech: The bidder must have 50 employees."]
+    }
+    evaluations = evaluate_companies_eligibility(model, WordTokenizer(), CRITERIA, profiles)
+    assert model.batches == [3]
+    assert [prompt.split("Company Profile:")[1].split()[0] for prompt in model.prompts] == ["Acme:", "Globex:", "Initech:"]
+
+    matrix = build_criteria_matrix(CRITERIA, evaluations)
+    assert matrix == {
+        "acme.txt": ["FULLY MEETS", "DOES NOT MEET", "DOES NOT MEET"],
+        "globex.txt": ["FULLY MEETS", "FULLY MEETS", "FULLY MEETS"],
+        "initech.txt": ["DOES NOT MEET", "DOES NOT MEET", "FULLY MEETS"]
+    }
+    verdicts = determine_verdicts(model, WordTokenizer(), CRITERIA, evaluations)
+    assert {name: verdict["decision"] for name, verdict in verdicts.items()} == {
+        "acme.txt": "NOT ELIGIBLE", "globex.txt": "ELIGIBLE", "initech.txt": "NOT ELIGIBLE"
+    }
+
+    report = generate_multi_profile_report("Summary", CRITERIA, matrix, verdicts)
+    # One column per company, in upload order, and one row per criterion
+    assert report.index("<th>acme.txt</th>") < report.index("<th>globex.txt</th>") < report.index("<th>initech.txt</th>")
+    assert report.count('<td class="status fullymeets">FULLY MEETS</td>') == 5
+    assert report.count('<td class="status doesnotmeet">DOES NOT MEET</td>') == 4
+
+SCREENING_CRITERIA = [
+    {"description": "The bidder must have 50 employees", "importance": "Nice-to-have"},
+    {"description": "The bidder must hold ISO 9001 certification", "importance": "Critical"},
+    {"description": "The bidder must have an office in Delhi", "importance": "Important"},
+    {"description": "Audited accounts must be submitted for three years", "importance": "Critical"}
+]
+SCREENING_PROFILES = {
+    "acme.txt": ["Acme: Audited accounts must be submitted for three years."],
+    "globex.txt": ["Globex: " + ", ".join(c["description"] for c in SCREENING_CRITERIA) + "."]
+}
+
+def evaluated(prompt):
+    return [line.rsplit(" - ", 1)[0].split(". ", 1)[1] for line in prompt.split("Company Profile:")[0].splitlines() if " - Critical" in line or " - Important" in line or " - Nice-to-have" in line]
+
+def test_screening_stops_a_profile_at_its_knockout():
+    model = BatchCountingModel()
+    screenings = screen_companies_eligibility(model, WordTokenizer(), SCREENING_CRITERIA, SCREENING_PROFILES)
+    # Critical criteria for both profiles, then the rest only for the profile still standing
+    assert model.batches == [2, 1, 1]
+    assert evaluated(model.prompts[0]) == [SCREENING_CRITERIA[1]["description"], SCREENING_CRITERIA[3]["description"]]
+
+    acme, globex = screenings["acme.txt"], screenings["globex.txt"]
+    assert acme.knockout == 1 and not acme.complete
+    assert [item and item.status.value for item in acme.items] == [None, "DOES NOT MEET", None, "FULLY MEETS"]
+    assert globex.knockout is None and globex.complete
+
+def test_completing_a_screening_matches_a_full_evaluation():
+    model = BatchCountingModel()
+    screenings = screen_companies_eligibility(model, WordTokenizer(), SCREENING_CRITERIA, SCREENING_PROFILES)
+    model.prompts, model.batches = [], []
+
+    complete_screenings(model, WordTokenizer(), SCREENING_CRITERIA, SCREENING_PROFILES, screenings)
+    # Only the criteria the screening skipped are asked, only for the profile that stopped
+    assert model.batches == [1]
+    assert evaluated(model.prompts[0]) == [SCREENING_CRITERIA[0]["description"], SCREENING_CRITERIA[2]["description"]]
+    assert all(screening.complete for screening in screenings.values())
+
+    evaluations = {name: screening_evaluation(SCREENING_CRITERIA, screening) for name, screening in screenings.items()}
+    full = evaluate_companies_eligibility(StubModel(), WordTokenizer(), SCREENING_CRITERIA, SCREENING_PROFILES)
+    assert build_criteria_matrix(SCREENING_CRITERIA, evaluations) == build_criteria_matrix(SCREENING_CRITERIA, full)
+    decisions = {name: verdict["decision"] for name, verdict in determine_verdicts(model, WordTokenizer(), SCREENING_CRITERIA, evaluations).items()}
+    assert decisions == {"acme.txt": "NOT ELIGIBLE", "globex.txt": "ELIGIBLE"}
+
+class ScoredModel(StubModel):
+    """
+    Scores each evaluation line with a fixed confidence per criterion.
+
+    A trusting model marks every criterion FULLY MEETS, except ones it
+    cannot judge, which get no status.
+    """
+
+    def __init__(self, confidences, trusting=False, unsure=()):
+        super().__init__()
+        self.confidences = confidences
+        self.trusting = trusting
+        self.unsure = unsure
+
+    def scored(self, prompt):
+        self.prompts.append(prompt)
+        if not self.trusting:
+            lines = self.answer(prompt).splitlines()
+        else:
+            lines = [
+                f"{n}. {description}" if description in self.unsure else f"{n}. FULLY MEETS - {description}"
+                for n, description in _CRITERION.findall(prompt.split("Company Profile:", 1)[0])
+            ]
+        return [(line, self.confidences.get(line.rsplit(" - ", 1)[-1].split(". ", 1)[-1], 0.1)) for line in lines]
+
+def test_cascade_escalates_unclear_and_low_confidence_judgments(monkeypatch):
+    monkeypatch.setattr(analyzer, "generate_batch_scored", lambda model, tokenizer, prompts, **kwargs: [model.scored(prompt) for prompt in prompts])
+    employees, iso, delhi, accounts = (c["description"] for c in SCREENING_CRITERIA)
+    small = ScoredModel({iso: 0.9, delhi: 0.99, employees: 0.6, accounts: 0.59}, trusting=True, unsure=(delhi,))
+    # The last stage's answer is final, however unsure it is
+    large = ScoredModel({})
+    stages = [CascadeStage(small, None, threshold=0.6, name="small"), CascadeStage(large, None, threshold=0.99, name="large")]
+
+    evaluations, stats = evaluate_with_cascade(stages, SCREENING_CRITERIA, SCREENING_PROFILES)
+    # At or above the threshold the small model's answer stands; unclear or below it, the large model is asked
+    assert [evaluated(prompt) for prompt in large.prompts] == [[delhi, accounts]] * 2
+    matrix = build_criteria_matrix(SCREENING_CRITERIA, evaluations)
+    assert matrix["acme.txt"] == ["FULLY MEETS", "FULLY MEETS", "DOES NOT MEET", "FULLY MEETS"]
+    assert matrix["globex.txt"] == ["FULLY MEETS"] * 4
+
+    assert [(s["name"], s["evaluated"], s["accepted"]) for s in stats["stages"]] == [("small", 8, 4), ("large", 4, 4)]
+    assert (stats["criteria"], stats["escalated"], stats["escalation_rate"]) == (8, 4, 0.5)
+
+def test_cascade_stops_when_nothing_is_escalated(monkeypatch):
+    monkeypatch.setattr(analyzer, "generate_batch_scored", lambda model, tokenizer, prompts, **kwargs: [model.scored(prompt) for prompt in prompts])
+    small, large = ScoredModel({}), ScoredModel({})
+    stages = [CascadeStage(small, None, threshold=0.0), CascadeStage(large, None)]
+    _, stats = evaluate_with_cascade(stages, SCREENING_CRITERIA, SCREENING_PROFILES)
+    assert large.prompts == []
+    assert stats["escalated"] == 0
+    # Without a run of the last stage there is nothing to extrapolate savings from
+    assert stats["seconds_saved"] is None
@@ -0,0 +1,78 @@
+import os
+import sys
+import pytest
+import streamlit as st
+from streamlit.testing.v1 import AppTest
+import model_manager
+from archive import AnalysisArchive
+from stub_model import StubModel, WordTokenizer
+
+APP = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")
+
+REQUIREMENTS = [
+    b"The bidder must hold ISO 9001 certification",
+    b"Audited accounts must be submitted for three years",
+    b"The bidder must have an office in Delhi",
+    b"The bidder must have 50 employees",
+    b"The bidder must have ten years of experience"
+]
+RFP = b". ".join(REQUIREMENTS) + b"."
+# Fails a critical criterion of the first screening group, so the fifth criterion is never evaluated
+PARTIAL_PROFILE = b"Acme: " + REQUIREMENTS[1] + b"."
+FULL_PROFILE = b"Globex: " + b", ".join(REQUIREMENTS) + b"."
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    # Every cache the app writes defaults to a path under the working directory
+    monkeypatch.chdir(tmp_path)
+    # The script runner installs the app as __main__, which spawned processes of later tests would re-run
+    monkeypatch.setitem(sys.modules, "__main__", sys.modules["__main__"])
+    monkeypatch.delenv("RFP_INFERENCE_SERVER", raising=False)
+    monkeypatch.delenv("RFP_CONTINUOUS_BATCHING", raising=False)
+    model = StubModel()
+    monkeypatch.setattr(model_manager, "load_model", lambda *args, **kwargs: model)
+    monkeypatch.setattr(model_manager, "load_tokenizer", lambda *args, **kwargs: WordTokenizer())
+    monkeypatch.setattr(model_manager, "warm_up_model", lambda *args, **kwargs: {"warmup_seconds": 2.5, "cold_seconds": 1.25, "warm_seconds": 0.05})
+    monkeypatch.setattr(model_manager, "measure_token_rates", lambda *args, **kwargs: {"prefill_tokens_per_second": 1e4, "decode_tokens_per_second": 1e3})
+    st.cache_resource.clear()
+    at = AppTest.from_file(APP, default_timeout=60)
+    at.run()
+    yield at
+    st.cache_resource.clear()
+
+def upload(at, profiles):
+    at.file_uploader(key="rfp_upload").set_value(("tender.txt", RFP, "text/plain"))
+    at.file_uploader(key="company_upload").set_value([(name, text, "text/plain") for name, text in profiles.items()])
+    at.run()
+
+def checkbox(at, label):
+    return next(box for box in at.checkbox if box.label.startswith(label))
+
+def button(at, label):
+    return next(b for b in at.button if b.label == label)
+
+def test_sidebar_reports_the_warm_up(app):
+    assert "Model warm-up took 2.5s: first request 1.25s cold, 0.05s warm." in [caption.value for caption in app.sidebar.caption]
+
+def test_completing_a_screening_archives_the_analysis(app):
+    upload(app, {"acme.txt": PARTIAL_PROFILE, "globex.txt": FULL_PROFILE})
+    checkbox(app, "Fast screening").check()
+    button(app, "Analyze Documents").click()
+    app.run()
+    assert not app.exception
+    assert not app.error
+    assert not all(screening.complete for screening in app.session_state.screenings.values())
+    profiles = {"acme.txt": [PARTIAL_PROFILE.decode()], "globex.txt": [FULL_PROFILE.decode()]}
+    # The incomplete screening is not archived
+    assert AnalysisArchive().find_analysis(app.session_state.rfp_chunks, profiles, "facebook/opt-125m", "screening") is None
+
+    button(app, "Complete the evaluation").click()
+    app.run()
+    assert not app.exception
+    assert not app.error, [e.value for e in app.error]
+    assert all(screening.complete for screening in app.session_state.screenings.values())
+    assert app.session_state.verdicts["globex.txt"]["decision"] != app.session_state.verdicts["acme.txt"]["decision"]
+
+    archived = AnalysisArchive().find_analysis(app.session_state.rfp_chunks, profiles, "facebook/opt-125m", "screening")
+    assert archived is not None
+    assert archived["verdicts"] == app.session_state.verdicts
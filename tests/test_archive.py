@@ -0,0 +1,29 @@
+import pytest
+from archive import AnalysisArchive
+
+RFP = ["The bidder shall hold ISO 9001 certification."]
+PROFILES = {"acme.txt": ["Acme is ISO 9001 certified."]}
+VERDICTS = {"acme.txt": {"decision": "ELIGIBLE", "reasoning": "All criteria met."}}
+
+@pytest.fixture
+def archive(tmp_path):
+    archive = AnalysisArchive(str(tmp_path / "archive.db"))
+    yield archive
+    archive.close()
+
+def save(archive, model_name="small", mode="model"):
+    return archive.save_analysis(
+        "rfp.pdf", RFP, "Summary", [{"description": "ISO 9001", "importance": "Critical"}],
+        PROFILES, {"acme.txt": "1. ISO 9001: Met"}, VERDICTS, model_name, mode
+    )
+
+def test_analysis_is_reused_by_the_same_model_and_mode(archive):
+    analysis_id = save(archive)
+    found = archive.find_analysis(RFP, {"renamed.txt": PROFILES["acme.txt"]}, "small", "model")
+    assert found["analysis_id"] == analysis_id
+    assert found["verdicts"] == {"renamed.txt": VERDICTS["acme.txt"]}
+
+@pytest.mark.parametrize("model_name, mode", [("large", "model"), ("small", "rules"), ("small", "screening")])
+def test_analysis_by_another_model_or_mode_is_not_reused(archive, model_name, mode):
+    save(archive)
+    assert archive.find_analysis(RFP, PROFILES, model_name, mode) is None
@@ -0,0 +1,73 @@
+from functools import partial
+from types import SimpleNamespace
+import autotune
+from autotune import HardwareInfo, candidate_settings, load_profile, max_batch_size, tune_model, tuned_model
+from cost_model import CostModel
+from model_manager import MAX_INPUT_TOKENS, NEW_TOKENS
+
+def hardware(simd=(), cuda=False, memory_mb=16384):
+    return HardwareInfo(cpu_model="Test CPU", logical_cores=8, physical_cores=4, memory_mb=memory_mb, simd=list(simd), cuda=cuda)
+
+def test_float32_on_physical_cores_by_default():
+    assert candidate_settings(hardware(simd=["avx512_bf16", "avx512_vnni"])) == [(4, "float32")]
+
+def test_lower_precisions_need_native_instructions():
+    assert candidate_settings(hardware(simd=["avx2"]), lower_precision=True) == [(4, "float32"), (8, "float32")]
+    assert candidate_settings(hardware(simd=["amx_bf16", "avx_vnni"]), lower_precision=True) == [
+        (4, "float32"), (4, "bfloat16"), (4, "int8"), (8, "float32"), (8, "bfloat16"), (8, "int8")
+    ]
+    assert candidate_settings(hardware(cuda=True), lower_precision=True) == [(4, "float32"), (4, "float16")]
+
+def test_lower_precisions_are_skipped_when_a_copy_does_not_fit():
+    # Converting copies the weights, which may use at most half the memory
+    machine = hardware(simd=["amx_bf16"], memory_mb=1024)
+    assert candidate_settings(machine, model_bytes=256 * 2**20, lower_precision=True) == [(4, "float32"), (4, "bfloat16"), (8, "float32"), (8, "bfloat16")]
+    assert candidate_settings(machine, model_bytes=257 * 2**20, lower_precision=True) == [(4, "float32")]
+
+def test_batch_size_is_bounded_by_kv_cache_memory():
+    model = SimpleNamespace(config=SimpleNamespace(num_hidden_layers=2, hidden_size=64))
+    per_sequence = 2 * 2 * 64 * (MAX_INPUT_TOKENS + NEW_TOKENS) * 4
+    # A quarter of the memory holds the KV cache of the batch
+    memory_mb = 4 * 4 * per_sequence / 2**20
+    assert max_batch_size(model, hardware(memory_mb=memory_mb), "float32") == 4
+    assert max_batch_size(model, hardware(memory_mb=memory_mb), "bfloat16") == 8
+    assert max_batch_size(model, hardware(memory_mb=memory_mb * 0.99), "float32") == 2
+    assert max_batch_size(model, hardware(memory_mb=1), "float32") == 1
+    assert max_batch_size(model, hardware(memory_mb=2**30), "float32") == 32
+
+def test_tuned_profile_is_persisted_and_reused(tmp_path, monkeypatch, capsys):
+    machine = hardware()
+    benchmarked = []
+
+    def benchmark(model, tokenizer, threads, precision):
+        benchmarked.append((threads, precision))
+        return {"threads": threads, "precision": precision, "prefill_tokens_per_second": 500.0, "decode_tokens_per_second": 20.0, "seconds": 1.0}
+
+    monkeypatch.setattr(autotune, "load_profile", partial(load_profile, directory=str(tmp_path)))
+    monkeypatch.setattr(autotune, "tune_model", partial(tune_model, directory=str(tmp_path)))
+    monkeypatch.setattr(autotune, "detect_hardware", lambda: machine)
+    monkeypatch.setattr(autotune, "benchmark_settings", benchmark)
+    monkeypatch.setattr(autotune, "CostModel", lambda name: CostModel(name, str(tmp_path / "cost_model.json")))
+    monkeypatch.setattr(autotune, "apply_profile", lambda model, profile, lower_precision=False: model)
+    model = SimpleNamespace(config=SimpleNamespace(num_hidden_layers=1, hidden_size=16))
+
+    _, profile = tuned_model("org/model", model, None)
+    assert benchmarked == [(4, "float32")]
+    assert profile.tuning_seconds > 0
+    # Library code leaves reporting to its callers
+    assert capsys.readouterr().out == ""
+
+    assert load_profile("org/model", machine, str(tmp_path)) == profile
+    _, reused = tuned_model("org/model", model, None)
+    assert reused == profile
+    assert benchmarked == [(4, "float32")]
+    assert load_profile("org/other", machine, str(tmp_path)) is None
+
+def test_profiles_without_tuning_time_still_load(tmp_path):
+    machine = hardware()
+    path = autotune.profile_path("org/model", machine, str(tmp_path))
+    with open(path, "w", encoding="utf-8") as file:
+        file.write('{"device": "cpu", "threads": 4, "precision": "float32", "batch_size": 8, "chunk_size": 1000, '
+                   '"prefill_tokens_per_second": 400.0, "decode_tokens_per_second": 15.0}')
+    profile = load_profile("org/model", machine, str(tmp_path))
+    assert (profile.batch_size, profile.tuning_seconds) == (8, 0.0)
@@ -0,0 +1,90 @@
+import datetime
+import pytest
+from capability import CompanyFacts, Rule, evaluate_rule, extract_company_facts, parse_rule
+from results import Status
+
+def test_revenue_skips_growth_percentages():
+    facts = extract_company_facts("Our revenue grew 25% last year to USD 3 million.")
+    assert facts.revenue == 3e6
+    assert facts.revenue_currency == "usd"
+
+def test_revenue_in_several_currencies_is_left_to_the_model():
+    facts = extract_company_facts("Turnover of INR 40 crore in India. Revenue of USD 2 million in the US.")
+    assert facts.revenue is None
+
+def test_time_window_is_not_experience():
+    facts = extract_company_facts("No contract was terminated in the last 3 years of operations.", today=datetime.date(2026, 1, 1))
+    assert facts.years_experience is None
+
+def test_rule_ignores_financial_year():
+    rule = parse_rule("Revenue of the 2023 financial year must exceed USD 1 million")
+    assert rule == Rule("revenue", minimum=1e6, strict=True, currency="usd")
+
+@pytest.mark.parametrize("description", [
+    "Not blacklisted in the last 3 years of operations",
+    "Bidder should have 5 years of experience",
+    "Turnover growth of at least 10% per year",
+])
+def test_unanchored_or_ambiguous_criteria_need_the_model(description):
+    assert parse_rule(description) is None
+
+@pytest.mark.parametrize("description, minimum, strict", [
+    ("Minimum 5 years of experience", 5, False),
+    ("At least 10 years experience", 10, False),
+    ("More than 3 years of experience", 3, True),
+    ("7+ years of industry experience", 7, False),
+])
+def test_experience_thresholds(description, minimum, strict):
+    assert parse_rule(description) == Rule("years_experience", minimum=minimum, strict=strict)
+
+def test_currency_must_match():
+    rule = parse_rule("Average annual turnover of at least INR 50 lakhs")
+    assert rule.currency == "inr"
+    assert evaluate_rule(rule, CompanyFacts(revenue=3e6, revenue_currency="usd")) is None
+    assert evaluate_rule(rule, CompanyFacts(revenue=3e6)) is None
+    assert evaluate_rule(rule, CompanyFacts(revenue=6e6, revenue_currency="inr")).status == Status.FULLY_MEETS
+
+def test_revenue_without_currency_is_not_decided():
+    rule = parse_rule("Annual turnover above 2 million")
+    assert rule is not None and rule.currency is None
+    assert evaluate_rule(rule, CompanyFacts(revenue=1e6)) is None
+
+@pytest.mark.parametrize("description, rule", [
+    ("Turnover not more than INR 5 crore", Rule("revenue", maximum=5e7, currency="inr")),
+    ("Annual turnover should not exceed INR 5 crore", Rule("revenue", maximum=5e7, currency="inr")),
+    ("Turnover must not be more than INR 5 crore", Rule("revenue", maximum=5e7, currency="inr")),
+    ("Annual turnover below INR 5 crore", Rule("revenue", maximum=5e7, strict=True, currency="inr")),
+    ("Not more than 50 employees", Rule("headcount", maximum=50)),
+    ("Up to 50 employees", Rule("headcount", maximum=50)),
+    ("Less than 50 employees", Rule("headcount", maximum=50, strict=True)),
+    ("Maximum of 10 years of experience", Rule("years_experience", maximum=10)),
+    ("Turnover not less than INR 5 crore", Rule("revenue", minimum=5e7, currency="inr")),
+])
+def test_upper_bounds(description, rule):
+    assert parse_rule(description) == rule
+
+def test_upper_bound_is_not_inverted():
+    rule = parse_rule("Turnover not more than INR 5 crore")
+    assert evaluate_rule(rule, extract_company_facts("Turnover of INR 3 crore")).status is Status.FULLY_MEETS
+    judgment = evaluate_rule(rule, extract_company_facts("Turnover of INR 30 crore"))
+    assert judgment.status is Status.DOES_NOT_MEET
+    assert "required at most 50,000,000 INR" in judgment.text
+
+def test_every_required_certification_must_be_held():
+    rule = parse_rule("Must hold ISO 9001 and ISO 27001")
+    assert rule == Rule("certifications", members=("iso 9001", "iso 27001"))
+    assert evaluate_rule(rule, extract_company_facts("We are ISO 9001 certified.")) is None
+    assert evaluate_rule(rule, extract_company_facts("We hold ISO 9001 and ISO 27001.")).status is Status.FULLY_MEETS
+
+def test_alternative_certifications_need_the_model():
+    assert parse_rule("Must hold ISO 9001 or ISO 27001") is None
+
+@pytest.mark.parametrize("description", [
+    "Minimum 5 years of experience in healthcare projects",
+    "Minimum 5 years of healthcare experience",
+    "At least 5 years of relevant experience",
+    "At least 20 certified engineers",
+    "At least 50 employees in India",
+])
+def test_qualified_thresholds_need_the_model(description):
+    assert parse_rule(description) is None
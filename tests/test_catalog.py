@@ -0,0 +1,45 @@
+import pytest
+from catalog import CriteriaCatalog
+
+@pytest.fixture
+def catalog(tmp_path):
+    return CriteriaCatalog(str(tmp_path))
+
+@pytest.mark.parametrize("first, second", [
+    ("Minimum 5 years experience", "Minimum 10 years experience"),
+    ("ISO 9001 certified", "ISO 14001 certified"),
+    ("Turnover above 2 million", "Turnover above 50 million"),
+    ("The bidder must have a registered office in Delhi", "The bidder must have a registered office in Mumbai"),
+    ("The bidder must not be blacklisted by any government agency", "The bidder must be blacklisted by any government agency"),
+    ("The bidder shouldn't be blacklisted by any government agency", "The bidder should be blacklisted by any government agency"),
+])
+def test_criteria_differing_in_a_number_stay_separate(catalog, first, second):
+    ids, added = catalog.canonicalize([
+        {"description": first, "importance": "Critical"},
+        {"description": second, "importance": "Critical"}
+    ])
+    assert ids[0] != ids[1]
+    assert added == 2
+
+def test_rewordings_with_the_same_quantities_are_merged(catalog):
+    ids, added = catalog.canonicalize([
+        {"description": "Minimum 5 years of experience in similar projects", "importance": "Critical"},
+        {"description": "Minimum 5 yrs of experience in similar projects", "importance": "Critical"}
+    ])
+    assert ids[0] == ids[1]
+    assert added == 1
+
+def test_currency_must_match(catalog):
+    ids, _ = catalog.canonicalize([
+        {"description": "Annual turnover above USD 2 million", "importance": "Critical"},
+        {"description": "Annual turnover above INR 2 million", "importance": "Critical"}
+    ])
+    assert ids[0] != ids[1]
+
+def test_capitalized_sentence_start_is_not_a_name(catalog):
+    ids, added = catalog.canonicalize([
+        {"description": "Bidder must have a registered office in Delhi", "importance": "Critical"},
+        {"description": "The bidder must have a registered office in Delhi", "importance": "Critical"}
+    ])
+    assert ids[0] == ids[1]
+    assert added == 1
@@ -0,0 +1,101 @@
+from types import SimpleNamespace
+import pytest
+import cost_model
+from analyzer import summarize_rfp
+from cost_model import CostModel, ProgressTracker, choose_sizes
+from stub_model import StubModel, WordTokenizer
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+class SlowStubModel(StubModel):
+    """Takes a fixed time per call on a fake clock."""
+
+    def __init__(self, clock, seconds_per_call):
+        super().__init__()
+        self.clock = clock
+        self.seconds_per_call = seconds_per_call
+
+    def generate_text(self, prompt, **kwargs):
+        self.clock.now += self.seconds_per_call
+        return super().generate_text(prompt, **kwargs)
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cost_model, "time", SimpleNamespace(perf_counter=clock))
+    return clock
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "cost_model.json")
+
+CHUNKS = [" ".join(f"clause{i} word{j}" for j in range(300)) + "." for i in range(6)]
+
+def test_a_slow_stage_calibrates_later_predictions(clock, path):
+    model = CostModel("stub", path)
+    model.set_rates({"prefill_tokens_per_second": 1000.0, "decode_tokens_per_second": 50.0})
+    estimates = model.predict_analysis([len(c) for c in CHUNKS], [len(c) for c in CHUNKS], [3000])
+    summarize = estimates[0]
+    updates = []
+    tracker = ProgressTracker(model, estimates, lambda fraction, eta, message: updates.append((fraction, eta)))
+
+    stub = SlowStubModel(clock, seconds_per_call=summarize.seconds)
+    tracker.start_stage("summarize")
+    summarize_rfp(stub, WordTokenizer(), CHUNKS, progress=tracker.advance)
+    tracker.finish_stage()
+    elapsed = clock.now
+
+    # Progress only moves forward, and the ETA assumes the rest runs as slowly as this stage did
+    fractions = [fraction for fraction, _ in updates]
+    assert fractions == sorted(fractions)
+    share = summarize.seconds / sum(e.seconds for e in estimates)
+    assert fractions[-1] == pytest.approx(share)
+    assert updates[-1][1] == pytest.approx((1 - share) / share * elapsed)
+
+    # The stage took several times its prediction; a third of the error is corrected per run, and it persists
+    scale = 0.7 + 0.3 * elapsed / summarize.seconds
+    reloaded = CostModel("stub", path)
+    assert reloaded.scales == {"summarize": pytest.approx(scale)}
+    assert reloaded.runs == 1
+    assert reloaded.predict_analysis([len(c) for c in CHUNKS], [len(c) for c in CHUNKS], [3000])[0].seconds == pytest.approx(summarize.seconds * scale)
+    assert reloaded.predict_analysis([len(c) for c in CHUNKS], [len(c) for c in CHUNKS], [3000])[1] == estimates[1]
+
+def test_repeated_runs_converge_on_the_measured_time(path):
+    model = CostModel("stub", path)
+    for _ in range(20):
+        estimate = model.predict("evaluate", [3000, 3000], batch_size=2)
+        model.observe(estimate, 2.5 * estimate.seconds / model.scales.get("evaluate", 1.0))
+    assert model.scales["evaluate"] == pytest.approx(2.5, rel=1e-3)
+
+def test_cut_short_and_empty_stages_do_not_calibrate(clock, path):
+    model = CostModel("stub", path)
+    estimates = [model.predict("summarize", [1000]), model.predict("merge", [])]
+    tracker = ProgressTracker(model, estimates, lambda *args: None)
+    tracker.start_stage("summarize")
+    clock.now += 100
+    tracker.finish_stage(observe=False)
+    tracker.start_stage("merge")
+    clock.now += 100
+    tracker.finish_stage()
+    assert (model.scales, model.runs) == ({}, 0)
+    assert CostModel("stub", path).runs == 0
+
+def test_rates_are_kept_per_model(path):
+    CostModel("small", path).set_rates({"prefill_tokens_per_second": 900.0, "decode_tokens_per_second": 30.0})
+    small, large = CostModel("small", path), CostModel("large", path)
+    assert small.measured and (small.prefill_tokens_per_second, small.decode_tokens_per_second) == (900.0, 30.0)
+    assert not large.measured
+
+def test_smallest_sizes_meeting_the_target_are_chosen(path):
+    model = CostModel("stub", path)
+    fastest = choose_sizes(model, 120000, [3000], target_seconds=0)
+    assert not fastest["meets_target"]
+    relaxed = choose_sizes(model, 120000, [3000], target_seconds=fastest["seconds"] * 10)
+    assert relaxed["meets_target"]
+    assert (relaxed["chunk_size"], relaxed["batch_size"]) == (500, 1)
+    assert relaxed["seconds"] <= fastest["seconds"] * 10
@@ -0,0 +1,169 @@
+import random
+import sys
+import types
+import zipfile
+import pytest
+from xml.etree import ElementTree
+from docx import Document
+from docx.table import Table
+from docx.text.paragraph import Paragraph
+from document_processor import (
+    chunk_text, chunk_text_stream, iter_docx_blocks, iter_package_chunks, iter_text_segments, normalize_whitespace, parse_documents
+)
+
+_PIECES = ["word", "Word", "exam", "ple", "ISO-9001", "-", ".", "!", "?", " ", " ", " ", "  ", "\n", "\r\n", "\t", "-\n", "- \n  ", "\n\n", " . "]
+
+def random_text(rng, length):
+    return "".join(rng.choice(_PIECES) for _ in range(length))
+
+@pytest.mark.parametrize("seed", range(200))
+def test_streamed_chunks_match_chunk_text(tmp_path, seed):
+    rng = random.Random(seed)
+    text = random_text(rng, rng.randint(0, 400))
+    path = tmp_path / "rfp.txt"
+    path.write_bytes(text.encode("ascii"))
+    window_size = rng.randint(1, 64)
+    max_chunk_size = rng.randint(1, 80)
+    
+    segments = list(iter_text_segments(str(path), window_size=window_size))
+    assert "".join(segments) == normalize_whitespace(text)
+    assert list(chunk_text_stream(segments, max_chunk_size=max_chunk_size)) == chunk_text(text, max_chunk_size=max_chunk_size)
+
+def test_overlong_unpunctuated_text_is_split_like_chunk_text():
+    rng = random.Random(0)
+    text = " ".join(rng.choice(["a", "bb", "ccc", "dddd"]) for _ in range(5000))
+    segments = [text[i:i + 97] for i in range(0, len(text), 97)]
+    assert list(chunk_text_stream(segments, max_chunk_size=10)) == chunk_text(text, max_chunk_size=10)
+
+@pytest.fixture
+def merged_docx(tmp_path):
+    document = Document()
+    document.add_paragraph("Eligibility criteria")
+    table = document.add_table(rows=4, cols=3)
+    for r, row in enumerate(table.rows):
+        for c, cell in enumerate(row.cells):
+            cell.text = f"r{r}c{c}"
+    # gridSpan: one cell across the first row's first two columns
+    table.cell(0, 0).merge(table.cell(0, 1)).text = "Criterion"
+    # vMerge: the last column of rows 1-3 is one cell
+    table.cell(1, 2).merge(table.cell(3, 2)).text = "Annexure A"
+    # Text left in a continuation cell is hidden by the merge
+    Paragraph(table._tbl.tr_lst[2].tc_lst[2].p_lst[0], table).add_run("hidden")
+    table.cell(2, 0).text = "Turnover"
+    table.cell(2, 0).add_paragraph("in INR crore")
+    table.cell(3, 1).text = ""
+    document.add_paragraph("   ")
+    document.add_paragraph("Bids close on 1 March.")
+    path = tmp_path / "merged.docx"
+    document.save(path)
+    return str(path)
+
+def python_docx_blocks(path):
+    # The body as python-docx reads it, each merged cell taken once
+    document = Document(path)
+    blocks = []
+    for element in document.element.body.iterchildren():
+        if element.tag.endswith("}p"):
+            blocks.append(Paragraph(element, document).text.strip())
+        elif element.tag.endswith("}tbl"):
+            seen = set()
+            for row in Table(element, document).rows:
+                texts = []
+                for cell in row.cells:
+                    if cell._tc in seen:
+                        continue
+                    seen.add(cell._tc)
+                    texts.append(" ".join(p.text.strip() for p in cell.paragraphs if p.text.strip()))
+                blocks.append(" | ".join(text for text in texts if text))
+    return [block for block in blocks if block]
+
+def test_docx_blocks_match_python_docx(merged_docx):
+    blocks = list(iter_docx_blocks(merged_docx))
+    assert blocks == python_docx_blocks(merged_docx)
+    assert blocks == [
+        "Eligibility criteria",
+        "Criterion | r0c2",
+        "r1c0 | r1c1 | Annexure A",
+        "Turnover in INR crore | r2c1",
+        "r3c0",
+        "Bids close on 1 March."
+    ]
+
+def test_docx_blocks_are_cleared_once_emitted(merged_docx, monkeypatch):
+    iterparse = ElementTree.iterparse
+    roots = []
+
+    def recording_iterparse(*args, **kwargs):
+        for event, elem in iterparse(*args, **kwargs):
+            if not roots:
+                roots.append(elem)
+            yield event, elem
+
+    monkeypatch.setattr(ElementTree, "iterparse", recording_iterparse)
+    with open(merged_docx, "rb") as file:
+        assert len(list(iter_docx_blocks(file))) == 6
+    # Only the section properties are left in the body
+    body = roots[0][0]
+    assert [child.tag.rsplit("}", 1)[1] for child in body] == ["sectPr"]
+
+def write_docx(path, paragraphs):
+    document = Document()
+    for paragraph in paragraphs:
+        document.add_paragraph(paragraph)
+    document.save(path)
+
+@pytest.fixture
+def package(tmp_path):
+    write_docx(tmp_path / "scope.docx", ["Scope of work.", "The bidder must hold ISO 9001 certification."])
+    nested = tmp_path / "annexures.zip"
+    with zipfile.ZipFile(nested, "w") as archive:
+        archive.writestr("annexure.txt", "Annexures are not parsed.")
+    path = tmp_path / "package.zip"
+    with zipfile.ZipFile(path, "w") as archive:
+        archive.writestr("notice.txt", "Tender notice. Bids close on 1 March.")
+        archive.writestr("forms/", "")
+        archive.write(tmp_path / "scope.docx", "forms/scope.docx")
+        archive.write(nested, "annexures.zip")
+        archive.writestr("__MACOSX/forms/._scope.docx", "metadata")
+        archive.writestr("forms/.DS_Store", "metadata")
+        archive.writestr("prices.xlsx", "unsupported")
+    return str(path)
+
+def test_package_chunks_are_tagged_in_archive_order(package):
+    chunks = list(iter_package_chunks(package, max_chunk_size=50, max_workers=2))
+    assert chunks == [
+        ("notice.txt", "Tender notice. Bids close on 1 March."),
+        ("forms/scope.docx", "Scope of work."),
+        ("forms/scope.docx", "The bidder must hold ISO 9001 certification.")
+    ]
+
+def test_nested_archives_are_not_expanded(package):
+    # A zip inside the package is skipped like any other unsupported member
+    assert "annexures.zip" not in {name for name, _ in iter_package_chunks(package, max_workers=1)}
+
+def test_failed_member_names_the_member(tmp_path):
+    path = tmp_path / "package.zip"
+    with zipfile.ZipFile(path, "w") as archive:
+        archive.writestr("notice.txt", "Tender notice.")
+        archive.writestr("broken.docx", "not a docx")
+    chunks = iter_package_chunks(str(path), max_workers=1)
+    assert next(chunks) == ("notice.txt", "Tender notice.")
+    with pytest.raises(RuntimeError, match="broken.docx"):
+        next(chunks)
+
+def test_parser_processes_do_not_run_the_main_script(tmp_path, monkeypatch):
+    # Streamlit installs the app script as __main__, which spawned processes would re-run
+    marker = tmp_path / "ran"
+    script = tmp_path / "app.py"
+    script.write_text(f"open({str(marker)!r}, 'w').close()\n", encoding="utf-8")
+    main = types.ModuleType("__main__")
+    main.__file__ = str(script)
+    monkeypatch.setitem(sys.modules, "__main__", main)
+    paths = []
+    for i in range(2):
+        paths.append(tmp_path / f"profile{i}.txt")
+        paths[-1].write_text(f"Company {i}.", encoding="utf-8")
+
+    assert parse_documents([str(path) for path in paths], max_workers=2) == ["Company 0.", "Company 1."]
+    assert sys.modules["__main__"] is main
+    assert not marker.exists()
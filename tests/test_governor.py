@@ -0,0 +1,54 @@
+import gc
+import os
+import subprocess
+import sys
+import pytest
+from governor import ArtifactStore
+
+def test_spilled_artifacts_are_removed_with_their_store(tmp_path):
+    store = ArtifactStore(str(tmp_path), threshold=10)
+    handle = store.spill("x" * 100)
+    assert store.load(handle) == "x" * 100
+    directory = store.directory
+    assert os.path.dirname(directory) == str(tmp_path)
+
+    del store
+    gc.collect()
+    assert not os.path.exists(directory)
+
+def test_close_removes_the_artifacts(tmp_path):
+    store = ArtifactStore(str(tmp_path), threshold=10)
+    store.spill("x" * 100)
+    store.close()
+    assert not os.path.exists(store.directory)
+
+@pytest.mark.skipif(os.name != "posix", reason="processes are only probed on POSIX")
+def test_directories_of_exited_processes_are_swept(tmp_path):
+    process = subprocess.Popen([sys.executable, "-c", "pass"])
+    process.wait()
+    stale = tmp_path / f"{process.pid}-0123abcd"
+    stale.mkdir()
+    (stale / "artifact.txt").write_text("left behind")
+
+    live = ArtifactStore(str(tmp_path))
+    ArtifactStore(str(tmp_path))
+    assert not stale.exists()
+    assert os.path.exists(live.directory)
+
+def test_directories_of_an_earlier_run_with_the_same_pid_are_swept(tmp_path):
+    # In a container the app has the same pid after every restart
+    stale = tmp_path / f"{os.getpid()}-0123abcd"
+    stale.mkdir()
+
+    live = ArtifactStore(str(tmp_path))
+    ArtifactStore(str(tmp_path))
+    assert not stale.exists()
+    assert os.path.exists(live.directory)
+
+def test_large_chunk_lists_are_spilled(tmp_path):
+    store = ArtifactStore(str(tmp_path), threshold=10)
+    assert store.spill_chunks(["short"]) == ["short"]
+    chunks = ["first chunk", "second chunk"]
+    handle = store.spill_chunks(chunks)
+    assert len(handle) == sum(len(chunk) for chunk in chunks)
+    assert store.load_chunks(handle) == chunks
@@ -0,0 +1,85 @@
+import re
+import pytest
+from incremental import ChunkResultStore, reanalyze_rfp
+from stub_model import WordTokenizer
+
+class CountingModel:
+    """Answers summary and criteria prompts, packed or not, and counts them."""
+
+    def __init__(self, name):
+        self.name = name
+        self.prompts = []
+
+    def generate_text(self, prompt, max_length=512, temperature=0.7, max_new_tokens=128, cancel_token=None):
+        self.prompts.append(prompt)
+        if prompt.startswith("Extract"):
+            answer = f"1. Description: Bidder must hold {self.name} certification\n2. Importance: Critical"
+        else:
+            answer = f"Summary by {self.name}"
+        # A packed prompt opens the answer with the first label
+        sections = len(re.findall(r"^\[Section \d+\]$", prompt, re.MULTILINE)) - 1
+        return "\n".join([answer] + [f"[Section {i}]\n{answer}" for i in range(2, sections + 1)])
+
+CHUNKS = ["The bidder shall have ISO 9001 certification.", "The bidder must submit audited accounts."]
+
+@pytest.fixture
+def store(tmp_path):
+    return ChunkResultStore(str(tmp_path))
+
+def test_results_are_not_reused_across_models(store):
+    first, second = CountingModel("small"), CountingModel("large")
+    reanalyze_rfp(first, WordTokenizer(), "rfp", CHUNKS, store, "small", min_score=None)
+    result = reanalyze_rfp(second, WordTokenizer(), "rfp", CHUNKS, store, "large", min_score=None)
+    # Both chunks are summarized in one packed prompt and extracted in another, then merged
+    assert len(second.prompts) == 3
+    assert "large" in result["summary"]
+
+def test_unchanged_chunks_are_reused_by_the_same_model(store):
+    reanalyze_rfp(CountingModel("small"), WordTokenizer(), "rfp", CHUNKS, store, "small", min_score=None)
+    model = CountingModel("small")
+    result = reanalyze_rfp(model, WordTokenizer(), "rfp", CHUNKS, store, "small", min_score=None)
+    assert model.prompts == []
+    assert result["changes"]["generated_chunks"] == 0
+
+def test_chunks_skipped_by_a_threshold_are_extracted_when_it_is_lowered(store):
+    first = CountingModel("small")
+    result = reanalyze_rfp(first, WordTokenizer(), "rfp", CHUNKS, store, "small", min_score=float("inf"))
+    assert result["criteria"] == []
+    assert not any(prompt.startswith("Extract") for prompt in first.prompts)
+
+    second = CountingModel("small")
+    result = reanalyze_rfp(second, WordTokenizer(), "rfp", CHUNKS, store, "small", min_score=None)
+    assert result["criteria"]
+    # Only the criteria are generated; the summaries are reused
+    assert [prompt.split()[0] for prompt in second.prompts] == ["Extract"]
+
+    third = CountingModel("small")
+    result = reanalyze_rfp(third, WordTokenizer(), "rfp", CHUNKS, store, "small", min_score=float("inf"))
+    assert result["criteria"] == []
+    assert third.prompts == []
+
+def test_chunk_results_are_stored_in_the_binary_format(store, tmp_path):
+    reanalyze_rfp(CountingModel("small"), WordTokenizer(), "rfp", CHUNKS, store, "small", min_score=None)
+    paths = list((tmp_path / "chunks").iterdir())
+    assert len(paths) == len(CHUNKS)
+    assert all(path.suffix == ".bin" and path.read_bytes().startswith(b"RFPC") for path in paths)
+
+    # An unreadable result is generated again rather than failing the analysis
+    paths[0].write_bytes(b"garbage")
+    model = CountingModel("small")
+    result = reanalyze_rfp(model, WordTokenizer(), "rfp", CHUNKS, store, "small", min_score=None)
+    assert len(model.prompts) == 2
+    assert result["criteria"]
+
+def test_only_changed_chunks_are_packed(store):
+    reanalyze_rfp(CountingModel("small"), WordTokenizer(), "rfp", CHUNKS, store, "small", min_score=None)
+    amended = CHUNKS + ["The bidder must have an office in Delhi.", "The bidder must have 50 employees."]
+    model = CountingModel("small")
+    progress = []
+    result = reanalyze_rfp(model, WordTokenizer(), "rfp", amended, store, "small", min_score=None, progress=lambda *args: progress.append(args))
+    summarize, extract = model.prompts[:2]
+    assert "[Section 2]" in summarize and "[Section 3]" not in summarize
+    assert all(chunk in summarize and chunk in extract for chunk in amended[2:])
+    assert not any(chunk in summarize for chunk in CHUNKS)
+    assert progress == [(2, 2)]
+    assert result["changes"]["generated_chunks"] == 2
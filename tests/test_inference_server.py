@@ -0,0 +1,152 @@
+import http.client
+import json
+import threading
+import time
+import pytest
+from inference_client import InferenceClient
+from inference_server import ModelServer
+from model_manager import CancellationToken, ContinuousBatchingScheduler, GenerationCancelled
+from stub_model import CharTokenizer, tiny_model
+
+class BlockingModel:
+    """Generates until its request is cancelled, like a decode loop with a stopping criterion."""
+
+    def __init__(self):
+        self.stopped = threading.Event()
+
+    def generate_text(self, prompt, max_length=512, temperature=0.7, max_new_tokens=128, cancel_token=None):
+        deadline = time.monotonic() + 5
+        while not cancel_token.stop_requested and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.stopped.set()
+        cancel_token.check()
+        return "finished"
+
+class GatedModel:
+    """Holds every request until the gate opens, counting the requests generating at once."""
+
+    def __init__(self):
+        self.gate = threading.Event()
+        self.lock = threading.Lock()
+        self.running = 0
+        self.peak = 0
+
+    def generate_text(self, prompt, max_length=512, temperature=0.7, max_new_tokens=128, cancel_token=None):
+        with self.lock:
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+        try:
+            self.gate.wait(5)
+            cancel_token.check()
+            return prompt.upper()
+        finally:
+            with self.lock:
+                self.running -= 1
+
+def start(model, tokenizer=None, **kwargs):
+    server = ModelServer(model, tokenizer, port=0, **kwargs)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def post(server, path, body):
+    connection = http.client.HTTPConnection("127.0.0.1", server.httpd.server_address[1], timeout=10)
+    connection.request("POST", path, body=json.dumps(body), headers={"Content-Type": "application/json"})
+    response = connection.getresponse()
+    return response.status, json.loads(response.read()), response.getheader("Retry-After")
+
+def wait_for(condition):
+    deadline = time.monotonic() + 5
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+@pytest.fixture
+def server():
+    server = start(BlockingModel())
+    yield server
+    server.shutdown()
+
+def test_cancelling_a_request_stops_it_on_the_server(server):
+    client = InferenceClient(f"http://127.0.0.1:{server.httpd.server_address[1]}", cancel_poll_seconds=0.05)
+    cancel_token = CancellationToken()
+    threading.Timer(0.2, cancel_token.cancel).start()
+
+    start = time.monotonic()
+    with pytest.raises(GenerationCancelled):
+        client.generate_text("prompt", cancel_token=cancel_token)
+    assert time.monotonic() - start < 2
+    assert server.model.stopped.wait(1)
+    assert server.requests == {}
+
+def test_unknown_requests_are_not_cancelled(server):
+    client = InferenceClient(f"http://127.0.0.1:{server.httpd.server_address[1]}")
+    assert client._request("POST", "/cancel", {"request_id": "unknown"}) == {"cancelled": False}
+
+def test_full_admission_queue_is_rejected_with_retry_after():
+    model = GatedModel()
+    server = start(model, workers=1, queue_size=1)
+    replies = {}
+    try:
+        for prompt in ("first", "second"):
+            threading.Thread(target=lambda p=prompt: replies.setdefault(p, post(server, "/generate", {"prompt": p})), daemon=True).start()
+            # The first request is generating before the second is queued behind it
+            wait_for(lambda: model.running == 1 and (prompt == "first" or server.jobs.qsize() == 1))
+
+        status, body, retry_after = post(server, "/generate", {"prompt": "third"})
+        assert status == 503
+        assert retry_after == "1"
+
+        model.gate.set()
+        wait_for(lambda: len(replies) == 2)
+        assert replies["first"][:2] == (200, {"text": "FIRST"})
+        assert replies["second"][:2] == (200, {"text": "SECOND"})
+    finally:
+        model.gate.set()
+        server.shutdown()
+
+def test_queued_request_can_be_cancelled():
+    model = GatedModel()
+    server = start(model, workers=1)
+    replies = {}
+    try:
+        threading.Thread(target=lambda: replies.setdefault("running", post(server, "/generate", {"prompt": "running"})), daemon=True).start()
+        wait_for(lambda: model.running == 1)
+        threading.Thread(target=lambda: replies.setdefault("queued", post(server, "/generate", {"prompt": "queued", "request_id": "q"})), daemon=True).start()
+        wait_for(lambda: "q" in server.requests)
+
+        assert post(server, "/cancel", {"request_id": "q"})[:2] == (200, {"cancelled": True})
+        model.gate.set()
+        wait_for(lambda: len(replies) == 2)
+        assert replies["queued"][0] == 409
+        assert replies["running"][:2] == (200, {"text": "RUNNING"})
+        assert server.requests == {}
+    finally:
+        model.gate.set()
+        server.shutdown()
+
+def test_requests_generate_concurrently():
+    model = GatedModel()
+    server = start(model, workers=2)
+    replies = []
+    try:
+        for prompt in ("first", "second"):
+            threading.Thread(target=lambda p=prompt: replies.append(post(server, "/generate", {"prompt": p})), daemon=True).start()
+        wait_for(lambda: model.running == 2)
+        model.gate.set()
+        wait_for(lambda: len(replies) == 2)
+        assert model.peak == 2
+    finally:
+        model.gate.set()
+        server.shutdown()
+
+def test_plain_model_is_served_through_the_scheduler():
+    server = start(tiny_model(), CharTokenizer())
+    try:
+        assert isinstance(server.model, ContinuousBatchingScheduler)
+        client = InferenceClient(f"http://127.0.0.1:{server.httpd.server_address[1]}")
+        prompts = ["hello", "a much longer prompt"]
+        alone = [client.generate_text(prompt, temperature=0, max_new_tokens=4) for prompt in prompts]
+        assert client.generate_batch(prompts, temperature=0, max_new_tokens=4) == alone
+        assert all(len(text) == 4 for text in alone)
+    finally:
+        server.shutdown()
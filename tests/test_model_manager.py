@@ -0,0 +1,33 @@
+import pytest
+from model_manager import warm_up_model
+from stub_model import CharTokenizer, tiny_model
+
+class RecordingModel:
+    """Records the prompt length and token budget of every generate call."""
+
+    def __init__(self, model, fail=False):
+        self.model = model
+        self.fail = fail
+        self.calls = []
+
+    def parameters(self):
+        return self.model.parameters()
+
+    def generate(self, input_ids, max_new_tokens, **kwargs):
+        if self.fail:
+            raise ValueError("out of memory")
+        self.calls.append((input_ids.shape[1], max_new_tokens))
+        return self.model.generate(input_ids=input_ids, max_new_tokens=max_new_tokens, **kwargs)
+
+def test_warm_up_runs_every_shape_and_times_the_first_twice():
+    model = RecordingModel(tiny_model())
+    report = warm_up_model(model, CharTokenizer(), prompt_lengths=(16, 64, 100), max_new_tokens=2)
+    assert model.calls == [(16, 2), (64, 2), (100, 2), (16, 2)]
+    assert set(report) == {"cold_seconds", "warm_seconds", "warmup_seconds"}
+    # The warm-up covers the cold run and the other shapes, not the warm run
+    assert 0 < report["cold_seconds"] <= report["warmup_seconds"]
+    assert report["warm_seconds"] > 0
+
+def test_warm_up_failure_is_reported():
+    with pytest.raises(RuntimeError, match="Model warm-up failed: out of memory"):
+        warm_up_model(RecordingModel(tiny_model(), fail=True), CharTokenizer(), prompt_lengths=(16,))
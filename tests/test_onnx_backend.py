@@ -0,0 +1,94 @@
+import os
+import sys
+import types
+import pytest
+import torch
+import model_manager
+import onnx_backend
+from autotune import RuntimeProfile
+from model_manager import generate_text, get_model_device, load_model
+from onnx_backend import get_export_path, load_onnx_model
+
+class FakeORTModel:
+    """Stands in for optimum's ORTModelForCausalLM: no parameters, a device and generate()."""
+
+    device = torch.device("cpu")
+    loads = []
+
+    def __init__(self, source, kwargs):
+        self.source, self.kwargs = source, kwargs
+
+    @classmethod
+    def from_pretrained(cls, source, **kwargs):
+        cls.loads.append(source)
+        return cls(source, kwargs)
+
+    def save_pretrained(self, path):
+        FakeORTModel.saved = path
+        os.makedirs(path)
+
+    def generate(self, input_ids, attention_mask, max_new_tokens, **kwargs):
+        return torch.cat([input_ids, torch.full((1, 2), 7)], dim=1)
+
+class TensorTokenizer:
+    pad_token_id = 0
+
+    def __call__(self, text, return_tensors=None, padding=False, **kwargs):
+        ids = torch.tensor([[ord(c) - ord("a") for c in text]])
+        return {"input_ids": ids, "attention_mask": torch.ones_like(ids)}
+
+    def decode(self, ids, skip_special_tokens=True):
+        return "".join(chr(ord("a") + int(i)) for i in ids)
+
+@pytest.fixture
+def optimum(monkeypatch):
+    FakeORTModel.loads = []
+    module = types.ModuleType("optimum.onnxruntime")
+    module.ORTModelForCausalLM = FakeORTModel
+    monkeypatch.setitem(sys.modules, "optimum.onnxruntime", module)
+    return module
+
+def test_backend_comes_from_the_environment(monkeypatch):
+    calls = []
+    monkeypatch.setattr(onnx_backend, "load_onnx_model", lambda name, num_threads=None: calls.append((name, num_threads)) or "ort")
+    monkeypatch.setenv("RFP_INFERENCE_BACKEND", "ONNX")
+    assert load_model("org/model", auto_tune=False) == "ort"
+    assert load_model("org/model", auto_tune=False, threads=3) == "ort"
+    assert calls == [("org/model", None), ("org/model", 3)]
+
+    # An explicit backend wins over the environment
+    monkeypatch.setattr(model_manager.AutoModelForCausalLM, "from_pretrained", lambda name: torch.nn.Linear(1, 1))
+    assert isinstance(load_model("org/model", device="cpu", backend="torch", auto_tune=False, compile_graph=False), torch.nn.Linear)
+    with pytest.raises(ValueError, match="Unsupported inference backend: tensorrt"):
+        load_model("org/model", backend="tensorrt")
+
+def test_onnx_backend_takes_the_tuned_thread_count(monkeypatch):
+    import autotune
+    profile = RuntimeProfile(device="cpu", threads=6, precision="float32", batch_size=8, chunk_size=1000,
+                             prefill_tokens_per_second=400.0, decode_tokens_per_second=15.0)
+    monkeypatch.setattr(autotune, "load_profile", lambda name: profile)
+    calls = []
+    monkeypatch.setattr(onnx_backend, "load_onnx_model", lambda name, num_threads=None: calls.append(num_threads))
+    load_model("org/model", backend="onnx", auto_tune=True)
+    load_model("org/model", backend="onnx", auto_tune=True, threads=2)
+    assert calls == [6, 2]
+
+def test_export_is_cached(tmp_path, optimum):
+    first = load_onnx_model("org/model", cache_dir=str(tmp_path), num_threads=4)
+    assert first.kwargs["export"] and first.kwargs["use_cache"]
+    assert first.kwargs["session_options"].intra_op_num_threads == 4
+    assert FakeORTModel.saved == get_export_path("org/model", str(tmp_path))
+
+    second = load_onnx_model("org/model", cache_dir=str(tmp_path))
+    assert "export" not in second.kwargs
+    assert FakeORTModel.loads == ["org/model", get_export_path("org/model", str(tmp_path))]
+
+def test_missing_optimum_is_reported(monkeypatch):
+    monkeypatch.setitem(sys.modules, "optimum.onnxruntime", None)
+    with pytest.raises(ImportError, match="optimum"):
+        load_onnx_model("org/model")
+
+def test_models_without_parameters_generate(optimum, tmp_path):
+    model = load_onnx_model("org/model", cache_dir=str(tmp_path))
+    assert get_model_device(model) == torch.device("cpu")
+    assert generate_text(model, TensorTokenizer(), "abc") == "hh"
@@ -0,0 +1,26 @@
+import json
+import os
+from prefilter import DEFAULT_THRESHOLD, measure_recall, select_requirement_chunks
+
+FIXTURE = os.path.join(os.path.dirname(__file__), "fixtures", "prefilter_labeled.jsonl")
+
+# Chunks whose requirements the prefilter drops are never seen by the model
+RECALL_FLOOR = 0.9
+
+def load_samples():
+    with open(FIXTURE, "r", encoding="utf-8") as file:
+        return [(row["text"], bool(row["has_requirements"])) for row in map(json.loads, filter(str.strip, file))]
+
+def test_recall_floor_at_default_threshold():
+    metrics = measure_recall(load_samples(), threshold=DEFAULT_THRESHOLD)
+    assert metrics["recall"] >= RECALL_FLOOR
+    # The floor must not be met by sending everything to the model
+    assert metrics["kept"] < 1.0
+
+def test_selected_chunks_cover_labeled_requirements():
+    samples = load_samples()
+    selected = set(select_requirement_chunks([text for text, _ in samples]))
+    requirements = [text for text, label in samples if label]
+    assert sum(1 for text in requirements if text in selected) / len(requirements) >= RECALL_FLOOR
+    # Boilerplate without requirement language stays out of the model's way
+    assert not any(text in selected for text, label in samples if not label)
@@ -0,0 +1,23 @@
+import threading
+from profiler import PipelineProfiler, active_profiler, profile_forward
+
+def test_forward_on_another_thread_is_attributed_to_its_analysis():
+    profiler = PipelineProfiler(interval=60)
+    with profiler.session():
+        carried = active_profiler()
+        # Like the continuous-batching scheduler: another thread runs the pass for the request
+        def run():
+            with profile_forward([carried, None, carried], "decode", 3):
+                assert profiler.phase == "decode"
+        worker = threading.Thread(target=run)
+        worker.start()
+        worker.join()
+    spans = [event for event in profiler.events if event["name"] == "decode"]
+    assert len(spans) == 1
+    assert spans[0]["args"] == {"batch_size": 3}
+    assert profiler.phase is None
+
+def test_no_profiler_outside_a_session():
+    assert active_profiler() is None
+    with profile_forward([None], "prefill", 1):
+        pass
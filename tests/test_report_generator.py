@@ -0,0 +1,48 @@
+import io
+from report_generator import PortfolioReportWriter, generate_report
+from results import AnalysisRun
+from work_queue import STYLESHEET_NAME, Job, write_portfolio, write_result
+
+CRITERIA = [{"description": "ISO 9001 <certification>", "importance": "Critical"}]
+
+def run(rfp, company, decision):
+    evaluation = f"1. ISO 9001 - Critical: {'FULLY MEETS' if decision == 'ELIGIBLE' else 'DOES NOT MEET'}"
+    return AnalysisRun.from_results("Summary", CRITERIA, evaluation, {"decision": decision, "reasoning": "Because"}, rfp=rfp, company=company)
+
+def test_reports_link_a_shared_stylesheet_instead_of_inlining_it():
+    verdict = {"decision": "ELIGIBLE", "reasoning": "All met"}
+    inline = generate_report("Summary", CRITERIA, "1. FULLY MEETS", verdict)
+    linked = generate_report("Summary", CRITERIA, "1. FULLY MEETS", verdict, stylesheet_href="report.css")
+    assert "<style>" in inline and "report.css" not in inline
+    assert '<link rel="stylesheet" href="report.css">' in linked and "<style>" not in linked
+    assert "&lt;certification&gt;" in linked
+
+def test_portfolio_rows_are_streamed_with_totals():
+    sink = io.StringIO()
+    with PortfolioReportWriter(sink) as portfolio:
+        portfolio.add("rfp-1.pdf", {"decision": "ELIGIBLE", "reasoning": "ok"}, 3, "acme")
+        written = len(sink.getvalue())
+        assert "rfp-1.pdf" in sink.getvalue()
+        portfolio.add("rfp-2.pdf", {"decision": "NOT ELIGIBLE", "reasoning": "<no>"}, 5, "acme")
+        assert len(sink.getvalue()) > written
+    html = sink.getvalue()
+    assert "2 RFP verdicts: 1 eligible, 1 not eligible, 0 unclear." in html
+    assert "&lt;no&gt;" in html
+    assert html.rstrip().endswith("</html>")
+
+def test_portfolio_of_work_queue_results(tmp_path):
+    results = tmp_path / "results"
+    write_result(str(results), Job(1, "/rfps/a.pdf", [], 1), [run("/rfps/a.pdf", "acme.pdf", "ELIGIBLE")])
+    write_result(str(results), Job(2, "/rfps/b.pdf", [], 1), [run("/rfps/b.pdf", "acme.pdf", "NOT ELIGIBLE"), run("/rfps/b.pdf", "globex.pdf", "ELIGIBLE")])
+    output = tmp_path / "out" / "portfolio.html"
+
+    assert write_portfolio(str(results), str(output), reports=True) == 3
+    html = output.read_text(encoding="utf-8")
+    assert "3 RFP verdicts: 2 eligible, 1 not eligible, 0 unclear." in html
+    assert f'href="{STYLESHEET_NAME}"' in html
+    assert '<a href="00000002.html">b.pdf</a>' in html
+    assert (tmp_path / "out" / STYLESHEET_NAME).exists()
+    # The job with two profiles gets the matrix report; both share the stylesheet
+    multi = (tmp_path / "out" / "00000002.html").read_text(encoding="utf-8")
+    assert "globex.pdf" in multi and f'href="{STYLESHEET_NAME}"' in multi and "<style>" not in multi
+    assert "<style>" not in (tmp_path / "out" / "00000001.html").read_text(encoding="utf-8")
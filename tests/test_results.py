@@ -0,0 +1,41 @@
+import io
+from results import AnalysisRun, ChunkResult, Criterion, Importance, Status, read_runs, write_runs
+from work_queue import Job, write_result
+
+CRITERIA = [
+    {"description": "ISO 9001 certification", "importance": "Critical"},
+    {"description": "Ten years of experience", "importance": "Important"},
+    {"description": "Office in Delhi", "importance": "nice to have"}
+]
+EVALUATION = "1. ISO 9001 - Critical: FULLY MEETS (certificate attached)\n2. Experience - Important: DOES NOT MEET (founded 2020)"
+
+def run(company):
+    return AnalysisRun.from_results(
+        "Summary", CRITERIA, EVALUATION, {"decision": "NOT ELIGIBLE", "reasoning": "Too young"},
+        rfp="tenders/rfp-17.pdf", company=company
+    )
+
+def test_runs_round_trip_through_the_binary_format():
+    original = run("acme.pdf")
+    decoded = AnalysisRun.from_bytes(original.to_bytes())
+    assert decoded == original
+    assert [item.status for item in decoded.evaluations] == [Status.FULLY_MEETS, Status.DOES_NOT_MEET, Status.UNCLEAR]
+    assert [criterion.to_dict() for criterion in decoded.criteria][2] == {"description": "Office in Delhi", "importance": "Nice-to-have"}
+    # Importance members are shared, not copied per run
+    assert decoded.criteria[0].importance is Importance.CRITICAL
+
+def test_runs_are_read_back_one_at_a_time():
+    buffer = io.BytesIO()
+    write_runs(buffer, [run("acme.pdf"), run("globex.pdf")])
+    buffer.seek(0)
+    assert [decoded.company for decoded in read_runs(buffer)] == ["acme.pdf", "globex.pdf"]
+
+def test_chunk_results_keep_skipped_extraction_apart_from_no_criteria():
+    for result in (ChunkResult("Summary", None), ChunkResult("Summary", []), ChunkResult("Summary", [Criterion("ISO", Importance.CRITICAL)])):
+        assert ChunkResult.from_bytes(result.to_bytes()) == result
+
+def test_work_queue_results_are_written_as_runs(tmp_path):
+    path = write_result(str(tmp_path), Job(7, "rfp.pdf", ["acme.pdf"], 1), [run("acme.pdf")])
+    with open(path, "rb") as file:
+        assert list(read_runs(file)) == [run("acme.pdf")]
+    assert not [name for name in (tmp_path).iterdir() if name.suffix == ".tmp"]
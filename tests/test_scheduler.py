@@ -0,0 +1,37 @@
+import pytest
+from model_manager import ContinuousBatchingScheduler
+from stub_model import CharTokenizer, tiny_model
+
+@pytest.fixture
+def scheduler():
+    scheduler = ContinuousBatchingScheduler(tiny_model(), CharTokenizer(), max_new_tokens=4).start()
+    yield scheduler
+    scheduler.stop()
+
+def test_batched_requests_match_single_requests(scheduler):
+    # Prompts of different lengths share padded decode steps
+    prompts = ["hello", "a much longer prompt"]
+    alone = [scheduler.generate_text(prompt, temperature=0) for prompt in prompts]
+    assert scheduler.generate_batch(prompts, temperature=0) == alone
+    assert all(len(text) == 4 for text in alone)
+
+def test_admission_is_round_robin_over_sessions(monkeypatch):
+    scheduler = ContinuousBatchingScheduler(tiny_model(), CharTokenizer(), max_batch_size=2, max_new_tokens=4)
+    prefill = scheduler._prefill
+    admitted = []
+
+    def recording_prefill(request):
+        admitted.append(request.session)
+        prefill(request)
+
+    monkeypatch.setattr(scheduler, "_prefill", recording_prefill)
+    try:
+        # Holding the lock keeps the scheduler thread from admitting until everything is queued
+        with scheduler.condition:
+            futures = [scheduler.submit(f"bulk {i}", temperature=0, session="a") for i in range(4)]
+            futures += [scheduler.submit(f"quick {i}", temperature=0, session="b") for i in range(2)]
+        assert all(len(future.result(timeout=60)) == 4 for future in futures)
+    finally:
+        scheduler.stop()
+    # The second session's requests do not wait behind the first session's backlog
+    assert admitted == ["a", "b", "a", "b", "a", "a"]
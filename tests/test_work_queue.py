@@ -0,0 +1,138 @@
+import multiprocessing
+import os
+import time
+import pytest
+import work_queue
+from model_manager import CancellationToken, GenerationCancelled
+from results import read_runs
+from stub_model import StubModel, WordTokenizer
+from work_queue import LeaseKeeper, WorkQueue, run_worker
+
+RFP = "The bidder must hold ISO 9001 certification. Audited accounts must be submitted for three years."
+PROFILE = "Acme: The bidder must hold ISO 9001 certification."
+
+@pytest.fixture
+def files(tmp_path):
+    rfps = []
+    for i in range(6):
+        path = tmp_path / f"rfp{i}.txt"
+        path.write_text(RFP, encoding="utf-8")
+        rfps.append(str(path))
+    profile = tmp_path / "acme.txt"
+    profile.write_text(PROFILE, encoding="utf-8")
+    return rfps, [str(profile)]
+
+def stub_analysis(monkeypatch):
+    # Analyses run the real pipeline on the stub model
+    monkeypatch.setattr(work_queue, "load_model", lambda *args, **kwargs: StubModel())
+    monkeypatch.setattr(work_queue, "load_tokenizer", lambda *args, **kwargs: WordTokenizer())
+    monkeypatch.setattr(work_queue, "load_profile", lambda *args, **kwargs: None)
+
+def test_expired_lease_is_reclaimed(tmp_path, files):
+    queue = WorkQueue(str(tmp_path / "queue.db"), lease_seconds=0.05)
+    queue.enqueue(files[0][:1], files[1])
+    job = queue.claim("a")
+    assert queue.claim("b") is None
+
+    time.sleep(0.1)
+    reclaimed = queue.claim("b")
+    assert reclaimed.id == job.id
+    assert reclaimed.attempts == 2
+    # The first worker's late result is left to the new owner
+    assert not queue.heartbeat(job.id, "a")
+    assert not queue.complete(job.id, "a", "late")
+    assert queue.complete(job.id, "b", "result")
+    assert queue.counts()["done"] == 1
+
+def test_heartbeats_keep_the_lease(tmp_path, files):
+    queue = WorkQueue(str(tmp_path / "queue.db"), lease_seconds=0.3)
+    queue.enqueue(files[0][:1], files[1])
+    job = queue.claim("a")
+    cancel_token = CancellationToken()
+    with LeaseKeeper(queue, job, "a", cancel_token):
+        time.sleep(0.8)
+        assert queue.claim("b") is None
+    assert not cancel_token.cancelled
+
+    time.sleep(0.4)
+    assert queue.claim("b").id == job.id
+
+def test_lost_lease_cancels_the_analysis(tmp_path, files):
+    queue = WorkQueue(str(tmp_path / "queue.db"), lease_seconds=0.3)
+    queue.enqueue(files[0][:1], files[1])
+    job = queue.claim("a")
+    cancel_token = CancellationToken()
+    with LeaseKeeper(queue, job, "a", cancel_token):
+        queue.release(job.id, "a")
+        queue.claim("b")
+        time.sleep(0.2)
+    assert cancel_token.cancelled
+
+def test_jobs_fail_after_max_attempts(tmp_path, files):
+    queue = WorkQueue(str(tmp_path / "queue.db"), lease_seconds=0.1, max_attempts=2)
+    queue.enqueue(files[0][:2], files[1])
+    first, second = queue.claim("a"), queue.claim("a")
+
+    # One job's workers die twice, the other's analysis fails twice
+    time.sleep(0.15)
+    assert queue.claim("b").id == first.id
+    queue.fail(second.id, "a", "boom")
+    assert queue.claim("b").id == second.id
+    queue.fail(second.id, "b", "boom")
+    time.sleep(0.15)
+    assert queue.claim("c") is None
+    assert queue.counts() == {"pending": 0, "leased": 0, "done": 0, "failed": 2}
+
+def test_cancelled_job_is_released_at_once(tmp_path, files, monkeypatch):
+    stub_analysis(monkeypatch)
+    analyze = work_queue.analyze_rfp_file
+    calls = []
+
+    def cancelled_once(*args, **kwargs):
+        calls.append(args[2])
+        if len(calls) == 1:
+            raise GenerationCancelled("Analysis was cancelled")
+        return analyze(*args, **kwargs)
+
+    monkeypatch.setattr(work_queue, "analyze_rfp_file", cancelled_once)
+    queue_path = str(tmp_path / "queue.db")
+    WorkQueue(queue_path).enqueue(files[0][:1], files[1])
+    # With an hour-long lease, the second try only happens if the first released the job
+    completed = run_worker(queue_path, str(tmp_path / "results"), lease_seconds=3600, poll_seconds=0.01, exit_when_empty=True)
+    assert completed == 1
+    assert calls == files[0][:1] * 2
+    assert WorkQueue(queue_path).counts()["done"] == 1
+
+def stub_worker(queue_path, results_dir, completed_path):
+    # Runs in a spawned process, which does not inherit the test's monkeypatching
+    work_queue.load_model = lambda *args, **kwargs: StubModel()
+    work_queue.load_tokenizer = lambda *args, **kwargs: WordTokenizer()
+    work_queue.load_profile = lambda *args, **kwargs: None
+    completed = run_worker(queue_path, results_dir, lease_seconds=30, poll_seconds=0.05, exit_when_empty=True)
+    with open(completed_path, "w", encoding="utf-8") as file:
+        file.write(str(completed))
+
+def test_local_workers_drain_one_queue(tmp_path, files):
+    queue_path, results_dir = str(tmp_path / "queue.db"), str(tmp_path / "results")
+    rfps, profiles = files
+    WorkQueue(queue_path).enqueue(rfps, profiles)
+
+    context = multiprocessing.get_context("spawn")
+    processes = [
+        context.Process(target=stub_worker, args=(queue_path, results_dir, str(tmp_path / f"worker{i}"))) for i in range(2)
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(120)
+        assert process.exitcode == 0
+
+    # Every job was completed by exactly one worker
+    completed = [int((tmp_path / f"worker{i}").read_text()) for i in range(2)]
+    assert sum(completed) == len(rfps)
+    assert WorkQueue(queue_path).counts() == {"pending": 0, "leased": 0, "done": len(rfps), "failed": 0}
+    assert sorted(os.listdir(results_dir)) == [f"{i:08d}.runs" for i in range(1, len(rfps) + 1)]
+    with open(os.path.join(results_dir, "00000001.runs"), "rb") as file:
+        runs = list(read_runs(file))
+    assert [run.company for run in runs] == ["acme.txt"]
+    assert runs[0].rfp == rfps[0]
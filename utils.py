@@ -95,3 +95,47 @@ def format_verdict(verdict: Dict[str, str]) -> str:
     """
     
     return html
+
+def format_criteria_matrix(criteria: List[Dict[str, str]], matrix: Dict[str, List[str]]) -> str:
+    """
+    Format a criteria x company evaluation matrix into an HTML table.
+    
+    Args:
+        criteria: List of criteria with descriptions and importance
+        matrix: Per-company list of criterion statuses, aligned with criteria
+        
+    Returns:
+        str: HTML-formatted matrix
+    """
+    if not criteria:
+        return "No eligibility criteria were identified."
+    
+    companies = list(matrix)
+    html = '<table style="width: 100%; border-collapse: collapse; margin: 20px 0;">'
+    html += '<tr><th style="text-align: left; padding: 8px;">Criterion</th>'
+    for name in companies:
+        html += f'<th style="padding: 8px;">{name}</th>'
+    html += '</tr>'
+    
+    for i, criterion in enumerate(criteria):
+        html += f'<tr><td style="padding: 8px;">{criterion["description"]} <b>({criterion["importance"]})</b></td>'
+        for name in companies:
+            status = matrix[name][i]
+            
+            # Determine color based on status
+            if status == "FULLY MEETS":
+                color = "#155724"  # Green for met
+                bg_color = "#d4edda"
+            elif status == "DOES NOT MEET":
+                color = "#721c24"  # Red for not met
+                bg_color = "#f8d7da"
+            else:
+                color = "#856404"  # Yellow for unclear
+                bg_color = "#fff3cd"
+            
+            html += f'<td style="padding: 8px; text-align: center; color: {color}; background-color: {bg_color};">{status}</td>'
+        html += '</tr>'
+    
+    html += '</table>'
+    
+    return html
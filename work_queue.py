@@ -0,0 +1,549 @@
+import argparse
+import json
+import multiprocessing
+import os
+import socket
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+from transformers import PreTrainedTokenizerBase
+from analyzer import (
+    summarize_rfp,
+    extract_eligibility_criteria,
+    evaluate_companies_eligibility,
+    determine_verdicts,
+    build_criteria_matrix
+)
+from autotune import detect_hardware, load_profile
+from cost_model import CostModel, choose_sizes
+from document_processor import CHARS_PER_PAGE, count_pages, iter_document_chunks, iter_package_chunks, parse_document
+from incremental import DEFAULT_CACHE_DIR
+from model_manager import CancellationToken, GenerationCancelled, load_model, load_tokenizer
+from report_generator import PortfolioReportWriter, write_multi_profile_report, write_report, write_stylesheet
+from results import AnalysisRun, read_runs, write_runs
+
+DEFAULT_QUEUE_PATH = os.environ.get("RFP_QUEUE_PATH", os.path.join(DEFAULT_CACHE_DIR, "queue.db"))
+DEFAULT_RESULTS_DIR = os.environ.get("RFP_RESULTS_DIR", os.path.join(DEFAULT_CACHE_DIR, "results"))
+DEFAULT_LEASE_SECONDS = float(os.environ.get("RFP_LEASE_SECONDS", 300))
+# Written next to the portfolio and linked from it and every per-RFP report
+STYLESHEET_NAME = "report.css"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    rfp_path TEXT NOT NULL,
+    profile_paths TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    worker TEXT,
+    lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    result_path TEXT,
+    seconds REAL,
+    error TEXT,
+    created REAL NOT NULL,
+    updated REAL NOT NULL,
+    UNIQUE (rfp_path, profile_paths)
+);
+CREATE INDEX IF NOT EXISTS jobs_claim ON jobs (status, lease_expires);
+"""
+
+@dataclass(slots=True)
+class Job:
+    id: int
+    rfp_path: str
+    profile_paths: List[str]
+    attempts: int
+
+class WorkQueue:
+    """
+    SQLite work queue shared by batch workers on one or more machines.
+
+    A worker claims a pending job under a lease and must renew it with
+    heartbeats while it works. If a worker dies, its lease expires and the
+    job goes to the next worker that asks, up to ``max_attempts`` claims.
+    Claims run in an immediate transaction, so two workers never hold the
+    same live lease.
+
+    The database must live on a file system with working file locks, e.g. a
+    local disk for several worker processes or an NFS mount with locking
+    enabled for several machines.
+    """
+
+    def __init__(self, path: str = DEFAULT_QUEUE_PATH, lease_seconds: float = DEFAULT_LEASE_SECONDS, max_attempts: int = 3):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        # Autocommit mode; claims open their own immediate transaction
+        self.connection = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self.connection.row_factory = sqlite3.Row
+        try:
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.executescript(_SCHEMA)
+        except sqlite3.OperationalError as e:
+            self.connection.close()
+            raise RuntimeError(f"Unable to open the work queue: {str(e)}")
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def enqueue(self, rfp_paths: List[str], profile_paths: List[str]) -> int:
+        """
+        Add RFPs to the queue, each to be evaluated against the same company profiles.
+
+        Args:
+            rfp_paths: RFP documents, readable by every worker at the same path
+            profile_paths: Company profile documents
+
+        Returns:
+            int: Number of jobs added; RFPs already queued with these profiles are skipped
+        """
+        now = time.time()
+        profiles = json.dumps([os.path.abspath(path) for path in profile_paths])
+        with self.lock:
+            before = self.connection.total_changes
+            self.connection.execute("BEGIN")
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO jobs (rfp_path, profile_paths, created, updated) VALUES (?, ?, ?, ?)",
+                ((os.path.abspath(path), profiles, now, now) for path in rfp_paths)
+            )
+            self.connection.execute("COMMIT")
+            return self.connection.total_changes - before
+
+    def claim(self, worker: str) -> Optional[Job]:
+        """
+        Lease the next pending job, or a job whose lease has expired.
+
+        Args:
+            worker: Identifier of the claiming worker
+
+        Returns:
+            The claimed job, or None when nothing is available
+        """
+        now = time.time()
+        with self.lock:
+            # Take the write lock up front so no other worker can claim between the select and the update
+            self.connection.execute("BEGIN IMMEDIATE")
+            try:
+                # Jobs whose worker died without failing them are given up after max_attempts
+                self.connection.execute(
+                    "UPDATE jobs SET status = 'failed', error = 'Lease expired too many times', updated = ? "
+                    "WHERE status = 'leased' AND lease_expires < ? AND attempts >= ?",
+                    (now, now, self.max_attempts)
+                )
+                row = self.connection.execute(
+                    "SELECT id, rfp_path, profile_paths, attempts FROM jobs "
+                    "WHERE status = 'pending' OR (status = 'leased' AND lease_expires < ?) "
+                    "ORDER BY id LIMIT 1",
+                    (now,)
+                ).fetchone()
+                if row is not None:
+                    self.connection.execute(
+                        "UPDATE jobs SET status = 'leased', worker = ?, lease_expires = ?, attempts = attempts + 1, updated = ? WHERE id = ?",
+                        (worker, now + self.lease_seconds, now, row["id"])
+                    )
+                self.connection.execute("COMMIT")
+            except BaseException:
+                self.connection.execute("ROLLBACK")
+                raise
+
+        if row is None:
+            return None
+        return Job(row["id"], row["rfp_path"], json.loads(row["profile_paths"]), row["attempts"] + 1)
+
+    def heartbeat(self, job_id: int, worker: str) -> bool:
+        """
+        Renew the lease of a job.
+
+        Args:
+            job_id: Id of the leased job
+            worker: Identifier of the worker holding the lease
+
+        Returns:
+            bool: False if the lease was lost to another worker
+        """
+        now = time.time()
+        with self.lock:
+            cursor = self.connection.execute(
+                "UPDATE jobs SET lease_expires = ?, updated = ? WHERE id = ? AND worker = ? AND status = 'leased'",
+                (now + self.lease_seconds, now, job_id, worker)
+            )
+            return cursor.rowcount == 1
+
+    def complete(self, job_id: int, worker: str, result_path: str, seconds: Optional[float] = None) -> bool:
+        """
+        Mark a job done.
+
+        Args:
+            job_id: Id of the leased job
+            worker: Identifier of the worker holding the lease
+            result_path: Where the result was written
+            seconds: How long the analysis took
+
+        Returns:
+            bool: False if the lease had been lost, in which case the job is left to its new owner
+        """
+        with self.lock:
+            cursor = self.connection.execute(
+                "UPDATE jobs SET status = 'done', result_path = ?, seconds = ?, error = NULL, updated = ? "
+                "WHERE id = ? AND worker = ? AND status = 'leased'",
+                (result_path, seconds, time.time(), job_id, worker)
+            )
+            return cursor.rowcount == 1
+
+    def fail(self, job_id: int, worker: str, error: str) -> None:
+        """
+        Give a job back after an error; it is retried until max_attempts claims have failed.
+
+        Args:
+            job_id: Id of the leased job
+            worker: Identifier of the worker holding the lease
+            error: Error message to record
+        """
+        with self.lock:
+            self.connection.execute(
+                "UPDATE jobs SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+                "error = ?, worker = NULL, lease_expires = NULL, updated = ? "
+                "WHERE id = ? AND worker = ? AND status = 'leased'",
+                (self.max_attempts, error, time.time(), job_id, worker)
+            )
+
+    def release(self, job_id: int, worker: str) -> bool:
+        """
+        Give a job back untried, e.g. after its analysis was cancelled; the claim does not count as an attempt.
+
+        Args:
+            job_id: Id of the leased job
+            worker: Identifier of the worker holding the lease
+
+        Returns:
+            bool: False if the lease had already been lost
+        """
+        with self.lock:
+            cursor = self.connection.execute(
+                "UPDATE jobs SET status = 'pending', attempts = attempts - 1, worker = NULL, lease_expires = NULL, updated = ? "
+                "WHERE id = ? AND worker = ? AND status = 'leased'",
+                (time.time(), job_id, worker)
+            )
+            return cursor.rowcount == 1
+
+    def counts(self) -> Dict[str, int]:
+        """
+        Count jobs by status.
+
+        Returns:
+            Dict with "pending", "leased", "done" and "failed"
+        """
+        with self.lock:
+            rows = self.connection.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        counts = {"pending": 0, "leased": 0, "done": 0, "failed": 0}
+        counts.update({status: count for status, count in rows})
+        return counts
+
+class LeaseKeeper:
+    """
+    Renews a job's lease from a background thread while the job runs.
+
+    If the lease is lost, e.g. because this worker stalled past the lease
+    and another worker took the job, the analysis is cancelled through its
+    cancellation token instead of finishing work nobody will use.
+    """
+
+    def __init__(self, queue: WorkQueue, job: Job, worker: str, cancel_token: CancellationToken):
+        self.queue = queue
+        self.job = job
+        self.worker = worker
+        self.cancel_token = cancel_token
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, name=f"lease-{job.id}", daemon=True)
+
+    def _run(self) -> None:
+        while not self.stopped.wait(self.queue.lease_seconds / 3):
+            try:
+                if not self.queue.heartbeat(self.job.id, self.worker):
+                    self.cancel_token.cancel()
+                    return
+            except sqlite3.Error:
+                # A busy database is retried at the next beat; the lease has slack for two misses
+                pass
+
+    def __enter__(self) -> "LeaseKeeper":
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.stopped.set()
+        self.thread.join()
+
+def analyze_rfp_file(
+    model: Any,
+    tokenizer: PreTrainedTokenizerBase,
+    rfp_path: str,
+    profile_paths: List[str],
+    max_chunk_size: int = 1000,
+    batch_size: int = 8,
+    cancel_token: Optional[CancellationToken] = None
+) -> List[AnalysisRun]:
+    """
+    Run the full analysis of one RFP against company profiles, as the app does.
+
+    Args:
+        model: The language model
+        tokenizer: The tokenizer for the model
+        rfp_path: RFP document or zip package
+        profile_paths: Company profile documents
+        max_chunk_size: Maximum number of characters per chunk
+        batch_size: Number of profiles evaluated in one batched pass
+        cancel_token: Cancels the analysis
+
+    Returns:
+        List[AnalysisRun]: One run per company profile, named by its file name
+    """
+    if rfp_path.lower().endswith(".zip"):
+        rfp_chunks = [chunk for _, chunk in iter_package_chunks(rfp_path, max_chunk_size=max_chunk_size)]
+    else:
+        rfp_chunks = list(iter_document_chunks(rfp_path, max_chunk_size=max_chunk_size))
+    company_profiles = {os.path.basename(path): [parse_document(path)] for path in profile_paths}
+
+    summary = summarize_rfp(model, tokenizer, rfp_chunks, cancel_token=cancel_token)
+    criteria = extract_eligibility_criteria(model, tokenizer, rfp_chunks, cancel_token=cancel_token)
+    evaluations = evaluate_companies_eligibility(model, tokenizer, criteria, company_profiles, batch_size=batch_size, cancel_token=cancel_token)
+    verdicts = determine_verdicts(model, tokenizer, criteria, evaluations)
+    return [
+        AnalysisRun.from_results(summary, criteria, evaluations[name], verdicts[name], rfp=rfp_path, company=name)
+        for name in company_profiles
+    ]
+
+def write_result(results_dir: str, job: Job, runs: List[AnalysisRun]) -> str:
+    """
+    Write a job's runs atomically, in the binary format of results.write_runs.
+
+    Args:
+        results_dir: Shared results directory
+        job: The completed job
+        runs: Analysis runs of the job, one per company profile
+
+    Returns:
+        str: Path of the result file, readable with results.read_runs
+    """
+    os.makedirs(results_dir, exist_ok=True)
+    path = os.path.join(results_dir, f"{job.id:08d}.runs")
+    # A worker that lost its lease may write the same job again; replacing keeps the file whole either way
+    fd, tmp_path = tempfile.mkstemp(dir=results_dir, suffix=".tmp")
+    with os.fdopen(fd, "wb") as file:
+        write_runs(file, runs)
+    os.replace(tmp_path, path)
+    return path
+
+def write_run_report(sink: Any, runs: List[AnalysisRun], stylesheet_href: Optional[str] = None) -> None:
+    """
+    Stream the report of one job's runs, as the app would show it.
+
+    Args:
+        sink: File-like object the HTML is written to
+        runs: Runs of one RFP, one per company profile
+        stylesheet_href: Link to a shared stylesheet instead of inlining it
+    """
+    criteria = [criterion.to_dict() for criterion in runs[0].criteria]
+    if len(runs) == 1:
+        write_report(sink, runs[0].summary, criteria, runs[0].evaluation, runs[0].verdict.to_dict(), stylesheet_href=stylesheet_href)
+    else:
+        matrix = build_criteria_matrix(criteria, {run.company: run.evaluation for run in runs})
+        verdicts = {run.company: run.verdict.to_dict() for run in runs}
+        write_multi_profile_report(sink, runs[0].summary, criteria, matrix, verdicts, stylesheet_href=stylesheet_href)
+
+def write_portfolio(results_dir: str, output_path: str, reports: bool = False) -> int:
+    """
+    Write a portfolio report of every job result in a results directory.
+
+    Result files are read one at a time, so the portfolio of a backlog of
+    thousands of RFPs never holds more than one job's runs in memory. The
+    stylesheet is written once next to the portfolio and linked from it.
+
+    Args:
+        results_dir: Results directory of the workers
+        output_path: Path of the portfolio HTML file
+        reports: Also write each job's report next to the portfolio, linked from its rows
+
+    Returns:
+        int: Number of verdicts in the portfolio
+    """
+    directory = os.path.dirname(os.path.abspath(output_path))
+    os.makedirs(directory, exist_ok=True)
+    write_stylesheet(os.path.join(directory, STYLESHEET_NAME))
+
+    count = 0
+    with open(output_path, "w", encoding="utf-8") as sink, PortfolioReportWriter(sink, stylesheet_href=STYLESHEET_NAME) as portfolio:
+        for name in sorted(os.listdir(results_dir)):
+            if not name.endswith(".runs"):
+                continue
+            with open(os.path.join(results_dir, name), "rb") as file:
+                runs = list(read_runs(file))
+            if not runs:
+                continue
+            report_href = None
+            if reports:
+                report_href = name[:-len(".runs")] + ".html"
+                with open(os.path.join(directory, report_href), "w", encoding="utf-8") as report:
+                    write_run_report(report, runs, STYLESHEET_NAME)
+            for run in runs:
+                portfolio.add(os.path.basename(run.rfp), run.verdict.to_dict(), len(run.criteria), run.company, report_href)
+                count += 1
+    return count
+
+def run_worker(
+    queue_path: str = DEFAULT_QUEUE_PATH,
+    results_dir: str = DEFAULT_RESULTS_DIR,
+    model_name: str = "facebook/opt-125m",
+    worker: Optional[str] = None,
+    lease_seconds: float = DEFAULT_LEASE_SECONDS,
+    poll_seconds: float = 5.0,
+    exit_when_empty: bool = False,
+    max_chunk_size: Optional[int] = None,
+    batch_size: Optional[int] = None,
+    target_seconds: Optional[float] = None,
+    threads: Optional[int] = None,
+    auto_tune: Optional[bool] = None
+) -> int:
+    """
+    Claim and analyze RFPs from the queue until stopped.
+
+    Args:
+        queue_path: Shared queue database
+        results_dir: Shared results directory
+        model_name: Model each worker loads for itself
+        worker: Worker identifier (defaults to host name, process id and a random suffix)
+        lease_seconds: Lease length; heartbeats renew it every third of it
+        poll_seconds: Wait between claims while the queue is empty
+        exit_when_empty: Stop once no job is pending or leased by another worker
+        max_chunk_size: Maximum number of characters per chunk (defaults to
+            the machine's tuned profile, then 1000)
+        batch_size: Number of profiles evaluated in one batched pass (defaults
+            to the machine's tuned profile, then 8)
+        target_seconds: Per-RFP latency target; when set, chunk and batch sizes
+            are chosen per job from the cost model instead
+        threads: Intra-op thread count of this worker's model (defaults to
+            torch's, or the tuned profile's)
+        auto_tune: Passed to load_model
+
+    Returns:
+        int: Number of jobs this worker completed
+    """
+    worker = worker or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+    queue = WorkQueue(queue_path, lease_seconds)
+    model = load_model(model_name, auto_tune=auto_tune, threads=threads)
+    tokenizer = load_tokenizer(model_name)
+    profile = load_profile(model_name)
+    max_chunk_size = max_chunk_size or (profile.chunk_size if profile else 1000)
+    batch_size = batch_size or (profile.batch_size if profile else 8)
+    cost_model = CostModel(model_name) if target_seconds is not None else None
+
+    completed = 0
+    try:
+        while True:
+            job = queue.claim(worker)
+            if job is None:
+                counts = queue.counts()
+                if exit_when_empty and counts["pending"] == 0 and counts["leased"] == 0:
+                    return completed
+                time.sleep(poll_seconds)
+                continue
+
+            cancel_token = CancellationToken()
+            start = time.perf_counter()
+            try:
+                sizes = {"chunk_size": max_chunk_size, "batch_size": batch_size}
+                if cost_model is not None:
+                    sizes = choose_sizes(
+                        cost_model,
+                        count_pages(job.rfp_path) * CHARS_PER_PAGE,
+                        [count_pages(path) * CHARS_PER_PAGE for path in job.profile_paths],
+                        target_seconds
+                    )
+                with LeaseKeeper(queue, job, worker, cancel_token):
+                    runs = analyze_rfp_file(
+                        model, tokenizer, job.rfp_path, job.profile_paths,
+                        max_chunk_size=sizes["chunk_size"], batch_size=sizes["batch_size"], cancel_token=cancel_token
+                    )
+            except GenerationCancelled:
+                # A job cancelled while this worker still holds the lease goes back to the queue now,
+                # not when the lease expires
+                if queue.release(job.id, worker):
+                    print(f"[{worker}] job {job.id} was cancelled, released it", flush=True)
+                else:
+                    print(f"[{worker}] lost the lease on job {job.id}, leaving it to its new owner", flush=True)
+                continue
+            except KeyboardInterrupt:
+                queue.release(job.id, worker)
+                raise
+            except Exception as e:
+                queue.fail(job.id, worker, str(e))
+                print(f"[{worker}] job {job.id} failed: {str(e)}", flush=True)
+                continue
+
+            seconds = time.perf_counter() - start
+            if queue.complete(job.id, worker, write_result(results_dir, job, runs), seconds):
+                completed += 1
+                print(f"[{worker}] job {job.id} done in {seconds:.1f}s: {job.rfp_path}", flush=True)
+    finally:
+        queue.close()
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Distributed batch screening of RFPs through a shared work queue.")
+    parser.add_argument("--queue", default=DEFAULT_QUEUE_PATH, help="Queue database shared by all workers")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    enqueue = commands.add_parser("enqueue", help="Queue RFPs for analysis")
+    enqueue.add_argument("rfps", nargs="+")
+    enqueue.add_argument("--profiles", nargs="+", required=True)
+
+    for name, description in (("worker", "Run one worker"), ("local", "Run several workers on this machine")):
+        command = commands.add_parser(name, help=description)
+        command.add_argument("--results", default=DEFAULT_RESULTS_DIR)
+        command.add_argument("--model", default="facebook/opt-125m")
+        command.add_argument("--lease-seconds", type=float, default=DEFAULT_LEASE_SECONDS)
+        command.add_argument("--exit-when-empty", action="store_true")
+        command.add_argument("--target-seconds", type=float, default=None,
+                             help="Choose chunk and batch sizes for this per-RFP latency (see cost_model.py)")
+    commands.choices["local"].add_argument("--workers", type=int, default=2)
+
+    commands.add_parser("status", help="Show job counts")
+
+    portfolio = commands.add_parser("portfolio", help="Write a portfolio report of the finished jobs")
+    portfolio.add_argument("--results", default=DEFAULT_RESULTS_DIR)
+    portfolio.add_argument("--output", default="portfolio.html")
+    portfolio.add_argument("--reports", action="store_true", help="Also write each RFP's report, linked from the portfolio")
+    args = parser.parse_args()
+
+    if args.command == "enqueue":
+        added = WorkQueue(args.queue).enqueue(args.rfps, args.profiles)
+        print(f"Queued {added} of {len(args.rfps)} RFPs")
+    elif args.command == "status":
+        print(", ".join(f"{count} {status}" for status, count in WorkQueue(args.queue).counts().items()))
+    elif args.command == "portfolio":
+        print(f"Wrote {write_portfolio(args.results, args.output, args.reports)} verdicts to {args.output}")
+    else:
+        options = dict(
+            queue_path=args.queue, results_dir=args.results, model_name=args.model, lease_seconds=args.lease_seconds,
+            exit_when_empty=args.exit_when_empty, target_seconds=args.target_seconds
+        )
+        if args.command == "worker":
+            run_worker(**options)
+        else:
+            # Each process loads its own model, as separate machines would, on its share of the cores; benchmarks
+            # running side by side would measure each other, so local workers only use an existing tuned profile's sizes
+            options.update(threads=max(1, detect_hardware().physical_cores // args.workers), auto_tune=False)
+            processes = [multiprocessing.Process(target=run_worker, kwargs=options) for _ in range(args.workers)]
+            for process in processes:
+                process.start()
+            for process in processes:
+                process.join()
+        print(", ".join(f"{count} {status}" for status, count in WorkQueue(args.queue).counts().items()))
+
+if __name__ == "__main__":
+    main()